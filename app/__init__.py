@@ -3,12 +3,14 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from .config import Config
+from .database import RoutingSession
 from flask_mail import Mail
 from dotenv import load_dotenv
+import logging
 import os
 
 # Only one instance of each extension
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})  # replica-aware, see database.py
 login_manager = LoginManager()
 login_manager.login_view = "main.login"  # route name for login page
 mail = Mail()  # Initialize once
@@ -16,9 +18,17 @@ mail = Mail()  # Initialize once
 # Load environment variables from .env
 load_dotenv()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)  # overrides, e.g. from the test suite
+
+    # Level-gated logging for the app and its modules (LOG_LEVEL=DEBUG for detail)
+    log_level = getattr(logging, str(app.config.get("LOG_LEVEL", "INFO")).upper(), logging.INFO)
+    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logging.getLogger(__name__).setLevel(log_level)
+    app.logger.setLevel(log_level)
 
     # Mail configuration using environment variables
     app.config['MAIL_SERVER'] = 'smtp.gmail.com'
@@ -29,14 +39,76 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.environ.get("SURVEYZIM_APP_PASSWORD")
 
     # Initialize extensions
+    from . import database
+    database.configure(app)  # pool settings and the optional read replica
     db.init_app(app)
+    database.init_app(app, db)
     login_manager.init_app(app)
     Migrate(app, db)
     mail.init_app(app)
 
+    from .metrics import metrics
+    metrics.init_app(app, db)
+
+    from .assets import asset_pipeline
+    asset_pipeline.init_app(app)
+
+    from .ingestion import ingestor
+    ingestor.init_app(app)
+
+    from .counters import reconciler
+    reconciler.init_app(app)
+
+    from .survey_cache import survey_cache
+    survey_cache.init_app(app)
+
+    from .page_cache import page_cache
+    page_cache.init_app(app)
+
+    from . import answers
+    answers.init_app(app)
+
+    from . import tallies
+    tallies.init_app(app)
+
+    from .crosstab import crosstab_cache
+    crosstab_cache.init_app(app)
+
+    from .charts import chart_renderer
+    chart_renderer.init_app(app)
+
+    from .rollups import compactor
+    compactor.init_app(app)
+
+    from .text_index import indexer
+    indexer.init_app(app)
+
+    from .sketches import buffer as sketch_buffer
+    sketch_buffer.init_app(app)
+
+    from .export_store import export_store
+    export_store.init_app(app)
+
+    from .export_jobs import export_jobs
+    export_jobs.init_app(app)
+
+    from .emails import email_renderer
+    email_renderer.init_app(app)
+
+    from .mailer import mail_dispatcher
+    mail_dispatcher.init_app(app)
+
+    from .invitations import invitation_sender
+    invitation_sender.init_app(app)
+
+    from .logos import logo_pipeline
+    logo_pipeline.init_app(app)
+
     # Import models here AFTER db.init_app to avoid circular imports
     from .models.user import User
     from .models.survey import Survey, Question
+    from .models.mail import OutboxMessage
+    from .models.invitation import InvitationBatch, Invitation
 
     # Register the user_loader inside create_app
     @login_manager.user_loader
@@ -0,0 +1,202 @@
+# analytics.py
+"""
+Per-question response analytics on NumPy.
+
+A survey's answers are pulled from the normalized answer table in one query
+and turned into flat arrays per question: option indexes for
+multiple_choice/dropdown, integer values for linear_scale and one bitmask per
+respondent for checkbox questions. Counts, percentages, mean/median/stdev
+and histograms are then computed with vectorized passes over those arrays
+(no per-response Python loop), which keeps a 100k-response survey well
+under a second.
+
+survey_analytics() returns plain dicts and lists so the result can go
+straight to a template or jsonify().
+"""
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import select, func
+
+from . import db
+
+CHOICE_TYPES = ("multiple_choice", "dropdown")
+
+
+# -----------------------------
+# Loading
+# -----------------------------
+def load_answer_arrays(survey_id, question_ids=None):
+    """
+    Return {question_id: (response_ids, values)} as NumPy int64 arrays for
+    every non-text answer of the survey (or just of `question_ids`).
+    `values` holds the option id for choice/checkbox questions and the
+    picked number for linear_scale ones.
+    """
+    from .models.survey import Answer
+
+    stmt = (
+        select(Answer.question_id, Answer.response_id,
+               func.coalesce(Answer.option_id, Answer.numeric_value))
+        .where(Answer.survey_id == survey_id, Answer.text_value.is_(None))
+    )
+    if question_ids is not None:
+        stmt = stmt.where(Answer.question_id.in_(list(question_ids)))
+    # Plain integer columns, so read the DBAPI tuples directly and build one
+    # flat array; wrapping hundreds of thousands of rows in Row objects
+    # (let alone np.array over them) costs more than the query
+    result = db.session.connection(bind_arguments={"clause": stmt}).execute(stmt)  # replica-routable
+    try:
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    if not rows:
+        return {}
+
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 3).reshape(-1, 3)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    question_ids, starts = np.unique(data[:, 0], return_index=True)
+    bounds = list(starts[1:]) + [len(data)]
+    return {
+        int(qid): (data[start:end, 1], data[start:end, 2])
+        for qid, start, end in zip(question_ids, starts, bounds)
+    }
+
+
+def _text_answer_counts(survey_id):
+    from .models.survey import Answer
+
+    stmt = (
+        select(Answer.question_id, func.count(func.distinct(Answer.response_id)))
+        .where(Answer.survey_id == survey_id, Answer.text_value.isnot(None))
+        .group_by(Answer.question_id)
+    )
+    return dict(db.session.execute(stmt).all())
+
+
+# -----------------------------
+# Per-question statistics
+# -----------------------------
+def _percentages(counts, base):
+    if base <= 0:
+        return [0.0] * len(counts)
+    return np.round(counts * 100.0 / base, 1).tolist()
+
+
+def option_indexes(question, option_ids):
+    """Map option ids to positions in question.options; unknown ids become -1."""
+    known = np.array([option.id for option in question.options], dtype=np.int64)
+    if not len(known):
+        return np.full(len(option_ids), -1, dtype=np.int64)
+    positions = np.searchsorted(known, option_ids)
+    positions = np.clip(positions, 0, len(known) - 1)
+    return np.where(known[positions] == option_ids, positions, -1)
+
+
+def choice_stats(question, option_ids):
+    indexes = option_indexes(question, option_ids)
+    indexes = indexes[indexes >= 0]
+    counts = np.bincount(indexes, minlength=len(question.options))
+    answered = int(len(indexes))
+    return {
+        "answered": answered,
+        "options": [option.text for option in question.options],
+        "counts": counts.tolist(),
+        "percentages": _percentages(counts, answered),
+    }
+
+
+def checkbox_masks(question, response_ids, option_ids):
+    """One bitmask per respondent (bit i set = picked question.options[i])."""
+    indexes = option_indexes(question, option_ids)
+    keep = indexes >= 0
+    respondents, inverse = np.unique(response_ids[keep], return_inverse=True)
+    masks = np.zeros(len(respondents), dtype=np.uint64)
+    np.bitwise_or.at(masks, inverse, np.left_shift(np.uint64(1), indexes[keep].astype(np.uint64)))
+    return respondents, masks
+
+
+def checkbox_stats(question, response_ids, option_ids):
+    n_options = len(question.options)
+    if n_options > 64:
+        # Too many options for a 64-bit mask; count picks directly
+        indexes = option_indexes(question, option_ids)
+        keep = indexes >= 0
+        counts = np.bincount(indexes[keep], minlength=n_options)
+        answered = int(len(np.unique(response_ids[keep])))
+        combinations = None
+    else:
+        _, masks = checkbox_masks(question, response_ids, option_ids)
+        bits = np.arange(n_options, dtype=np.uint64)
+        picked = (masks[:, None] >> bits) & np.uint64(1)
+        counts = picked.sum(axis=0).astype(np.int64)
+        answered = int(len(masks))
+        combinations = np.bincount(picked.sum(axis=1).astype(np.int64), minlength=n_options + 1).tolist()
+    return {
+        "answered": answered,
+        "options": [option.text for option in question.options],
+        "counts": counts.tolist(),
+        # Share of respondents who ticked each option, so these may sum past 100
+        "percentages": _percentages(counts, answered),
+        # combinations[k] = respondents who ticked exactly k options
+        "selections_per_respondent": combinations,
+    }
+
+
+def scale_stats(question, values):
+    low, high = question.linear_scale_low, question.linear_scale_high
+    values = values[(values >= low) & (values <= high)]
+    answered = int(len(values))
+    counts = np.bincount(values - low, minlength=high - low + 1) if answered else np.zeros(high - low + 1, dtype=np.int64)
+    stats = {
+        "answered": answered,
+        "values": list(range(low, high + 1)),
+        "counts": counts.tolist(),
+        "percentages": _percentages(counts, answered),
+        "mean": None,
+        "median": None,
+        "stdev": None,
+        "min": None,
+        "max": None,
+    }
+    if answered:
+        stats.update(
+            mean=round(float(values.mean()), 3),
+            median=float(np.median(values)),
+            stdev=round(float(values.std(ddof=1)), 3) if answered > 1 else 0.0,
+            min=int(values.min()),
+            max=int(values.max()),
+        )
+    return stats
+
+
+# -----------------------------
+# Survey summary
+# -----------------------------
+def survey_analytics(compiled):
+    """Summary statistics for every question of a compiled survey."""
+    from . import counters
+
+    arrays = load_answer_arrays(compiled.id)
+    text_counts = _text_answer_counts(compiled.id)
+    empty = np.zeros(0, dtype=np.int64)
+
+    questions = []
+    for question in compiled.questions:
+        response_ids, values = arrays.get(question.id, (empty, empty))
+        if question.qtype in CHOICE_TYPES:
+            stats = choice_stats(question, values)
+        elif question.qtype == "checkbox":
+            stats = checkbox_stats(question, response_ids, values)
+        elif question.qtype == "linear_scale":
+            stats = scale_stats(question, values)
+        else:
+            stats = {"answered": int(text_counts.get(question.id, 0))}
+        stats.update(id=question.id, text=question.text, type=question.qtype)
+        questions.append(stats)
+
+    return {
+        "survey_id": compiled.id,
+        "responses": counters.get_count(compiled.id),
+        "questions": questions,
+    }
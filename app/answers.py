@@ -0,0 +1,174 @@
+# answers.py
+"""
+Normalized answer fact table.
+
+Every stored response is also written out as Answer rows (response_id,
+question_id, option_id / numeric_value / text_value), in the same
+transaction as the response itself, so per-question tallies, filters and
+cross-question breakdowns can run as single SQL aggregates instead of
+json.loads-ing every row in Python. `flask answers backfill` fills the
+table for responses stored before it existed.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, insert, func, exists
+from sqlalchemy.orm import aliased
+from . import db
+from .response_codec import is_compact, encode_responses
+
+
+def answer_rows(response_id, compiled, blob):
+    """Build Answer row dicts for one response from its stored (compact) blob."""
+    if not is_compact(blob):
+        # Legacy rows: re-encode from the stored answer texts first
+        raw = {q.id: (blob.get(str(q.id)) or {}).get("response") for q in compiled.questions}
+        blob = encode_responses(compiled, raw)
+
+    rows = []
+    answers = blob.get("a", {})
+    for question in compiled.questions:
+        value = answers.get(str(question.id))
+        if value is None:
+            continue
+        values = value if question.qtype == "checkbox" else [value]
+        for item in values:
+            row = {
+                "response_id": response_id,
+                "survey_id": compiled.id,
+                "question_id": question.id,
+                "option_id": None,
+                "numeric_value": None,
+                "text_value": None,
+            }
+            if isinstance(item, int) and question.qtype in ("multiple_choice", "dropdown", "checkbox"):
+                row["option_id"] = item
+            elif isinstance(item, int) and question.qtype == "linear_scale":
+                row["numeric_value"] = item
+            else:
+                row["text_value"] = str(item)
+            rows.append(row)
+    return rows
+
+
+def record_answers(rows):
+    """Insert Answer rows in the caller's transaction."""
+    from .models.survey import Answer
+
+    if rows:
+        db.session.execute(insert(Answer.__table__), rows)
+
+
+# -----------------------------
+# Set-based aggregates
+# -----------------------------
+def _restrict(stmt, answer, filters):
+    """Limit `answer` rows to responses that also picked each (question_id, option_id) in filters."""
+    from .models.survey import Answer
+
+    for question_id, option_id in filters or ():
+        other = aliased(Answer)
+        stmt = stmt.where(exists().where(
+            other.response_id == answer.response_id,
+            other.question_id == question_id,
+            other.option_id == option_id,
+        ))
+    return stmt
+
+
+def option_tallies(question_id, filters=None):
+    """{option_id: count} for a choice/checkbox question, optionally filtered."""
+    from .models.survey import Answer
+
+    stmt = (
+        select(Answer.option_id, func.count())
+        .where(Answer.question_id == question_id, Answer.option_id.isnot(None))
+        .group_by(Answer.option_id)
+    )
+    stmt = _restrict(stmt, Answer, filters)
+    return {option_id: count for option_id, count in db.session.execute(stmt)}
+
+
+def scale_summary(question_id, filters=None):
+    """Count, mean, min and max of a linear_scale question in one aggregate."""
+    from .models.survey import Answer
+
+    stmt = select(
+        func.count(Answer.numeric_value),
+        func.avg(Answer.numeric_value),
+        func.min(Answer.numeric_value),
+        func.max(Answer.numeric_value),
+    ).where(Answer.question_id == question_id)
+    stmt = _restrict(stmt, Answer, filters)
+    count, mean, low, high = db.session.execute(stmt).one()
+    return {"count": count, "mean": float(mean) if mean is not None else None, "min": low, "max": high}
+
+
+def cross_counts(question_a, question_b):
+    """{(option_a, option_b): count} over respondents who answered both questions."""
+    from .models.survey import Answer
+
+    a = aliased(Answer)
+    b = aliased(Answer)
+    stmt = (
+        select(a.option_id, b.option_id, func.count())
+        .join(b, (b.response_id == a.response_id) & (b.question_id == question_b))
+        .where(a.question_id == question_a, a.option_id.isnot(None), b.option_id.isnot(None))
+        .group_by(a.option_id, b.option_id)
+    )
+    return {(oa, ob): count for oa, ob, count in db.session.execute(stmt)}
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill(batch_size=1000, survey_id=None):
+    """Write Answer rows for responses that have none yet. Returns rows written."""
+    from .models.survey import Answer, SurveyResponse
+    from .response_codec import definition_for
+
+    definitions = {}
+    written = 0
+    last_id = 0
+    while True:
+        stmt = (
+            select(SurveyResponse.id, SurveyResponse.survey_id, SurveyResponse.responses)
+            .where(SurveyResponse.id > last_id)
+            .where(~exists().where(Answer.response_id == SurveyResponse.id))
+            .order_by(SurveyResponse.id)
+            .limit(batch_size)
+        )
+        if survey_id is not None:
+            stmt = stmt.where(SurveyResponse.survey_id == survey_id)
+        batch = db.session.execute(stmt).all()
+        if not batch:
+            break
+
+        rows = []
+        for response_id, sid, raw in batch:
+            last_id = response_id
+            if sid not in definitions:
+                definitions[sid] = definition_for(sid)
+            compiled = definitions[sid]
+            if compiled is None or not raw:
+                continue
+            rows.extend(answer_rows(response_id, compiled, raw))
+        record_answers(rows)
+        db.session.commit()
+        written += len(rows)
+    return written
+
+
+answers_cli = AppGroup("answers", help="Normalized answer table maintenance.")
+
+
+@answers_cli.command("backfill")
+@click.option("--batch-size", type=int, default=1000, show_default=True)
+@click.option("--survey-id", type=int, default=None, help="Only backfill this survey.")
+def backfill_command(batch_size, survey_id):
+    """Fill the answer table for responses stored before it existed."""
+    written = backfill(batch_size=batch_size, survey_id=survey_id)
+    click.echo(f"{written} answer row(s) written")
+
+
+def init_app(app):
+    app.cli.add_command(answers_cli)
@@ -0,0 +1,218 @@
+# assets.py
+"""
+Fingerprinted, precompressed static assets, plus compression of dynamic
+responses.
+
+At startup (and with `flask assets build`) every file under app/static,
+except user-uploaded survey logos, is copied to ASSET_BUILD_DIR as
+<name>.<content hash>.<ext>, with .gz and .br siblings for text formats.
+Templates link them through asset_url('css/layout.css'); the URL changes
+whenever the content does, so /assets/ responses are served with a year's
+max-age and `immutable`, and the best precompressed variant the client
+accepts is picked without compressing anything per request. Files from
+earlier builds are kept, so pages rendered (or cached) before a deploy
+still find their assets.
+
+Dynamic responses (HTML, JSON, CSV, plain text) of at least
+COMPRESS_MIN_BYTES are gzipped in after_request when the client accepts
+it. Streamed responses and ones that already carry a Content-Encoding
+(such as the respondent page, which is precompressed in page_cache) are
+left alone.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+import click
+from flask import abort, request, send_file, url_for
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+YEAR = 365 * 24 * 3600
+SKIP_DIRS = ("survey_logos",)
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".ico", ".map")
+DYNAMIC_MIMETYPES = ("text/html", "application/json", "text/csv", "text/plain")
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def encodings():
+    """Content encodings we can produce, best first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def preferred_encoding(available):
+    """Pick the best of `available` encodings that the current request accepts, or None."""
+    accepted = request.accept_encodings
+    for encoding in encodings():
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+class AssetPipeline:
+    def __init__(self):
+        self.source = None
+        self.root = None
+        self.manifest = {}  # logical path -> fingerprinted path
+        self.digest = ""
+        self.min_bytes = 1024
+        self.stats = {"raw": 0, "gzip": 0, "br": 0}
+        self.dynamic = {"bytes_in": 0, "bytes_out": 0}  # dynamic compression totals
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.source = app.static_folder
+        self.root = app.config.get("ASSET_BUILD_DIR") or os.path.join(app.instance_path, "assets")
+        self.min_bytes = int(app.config.get("COMPRESS_MIN_BYTES", 1024))
+        app.jinja_env.globals["asset_url"] = self.url
+        app.add_url_rule("/assets/<path:filename>", "assets", self.serve)
+        app.cli.add_command(assets_cli)
+        if self.min_bytes > 0:
+            app.after_request(self.compress_response)
+        self.build()
+
+    # -----------------------------
+    # Build
+    # -----------------------------
+    def build(self):
+        """Fingerprint and precompress every static file; returns the manifest."""
+        manifest = {}
+        stats = {"raw": 0, "gzip": 0, "br": 0}
+        for directory, dirs, names in os.walk(self.source):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                logical = os.path.relpath(path, self.source).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                stem, ext = os.path.splitext(logical)
+                built = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+                self._write(built, data)
+                stats["raw"] += len(data)
+                if ext.lower() in COMPRESSIBLE:
+                    for encoding in encodings():
+                        size = self._write_compressed(built, data, encoding)
+                        stats[encoding] += size
+                else:
+                    for encoding in encodings():
+                        stats[encoding] += len(data)
+                manifest[logical] = built
+        self.manifest = manifest
+        self.digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self.stats = stats
+        self._atomic_write(os.path.join(self.root, "manifest.json"), json.dumps(manifest, indent=1).encode("utf-8"))
+        return manifest
+
+    def _write(self, built, data):
+        path = os.path.join(self.root, built)
+        if not os.path.exists(path):
+            self._atomic_write(path, data)
+
+    def _write_compressed(self, built, data, encoding):
+        suffix = ".br" if encoding == "br" else ".gz"
+        path = os.path.join(self.root, built + suffix)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+        packed = compress(data, encoding)
+        if len(packed) >= len(data):
+            return len(data)  # not worth it; the plain file is served instead
+        self._atomic_write(path, packed)
+        return len(packed)
+
+    def _atomic_write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # -----------------------------
+    # Serving
+    # -----------------------------
+    def url(self, logical):
+        built = self.manifest.get(logical)
+        if built is None:
+            return url_for("static", filename=logical)
+        return url_for("assets", filename=built)
+
+    def serve(self, filename):
+        # Fingerprinted files from this or an earlier build; variants are picked below
+        path = safe_join(self.root, filename)
+        if path is None or filename == "manifest.json" or filename.endswith((".gz", ".br", ".tmp")) \
+                or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        variants = {
+            encoding: path + (".br" if encoding == "br" else ".gz")
+            for encoding in encodings()
+            if os.path.exists(path + (".br" if encoding == "br" else ".gz"))
+        }
+        encoding = preferred_encoding(variants)
+        response = send_file(variants.get(encoding, path), mimetype=mimetype, max_age=YEAR, conditional=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if variants:
+            response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    # -----------------------------
+    # Dynamic compression
+    # -----------------------------
+    def compress_response(self, response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in DYNAMIC_MIMETYPES
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        if request.accept_encodings["gzip"] <= 0:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_bytes:
+            return response
+        packed = gzip.compress(data, compresslevel=6)
+        response.set_data(packed)
+        with self._lock:
+            self.dynamic["bytes_in"] += len(data)
+            self.dynamic["bytes_out"] += len(packed)
+        response.headers["Content-Encoding"] = "gzip"
+        # A different representation must not share a strong validator
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+asset_pipeline = AssetPipeline()
+
+
+assets_cli = AppGroup("assets", help="Static asset pipeline.")
+
+
+@assets_cli.command("build")
+def build_command():
+    """Fingerprint and precompress static files, and report the sizes."""
+    manifest = asset_pipeline.build()
+    stats = asset_pipeline.stats
+    click.echo(f"{len(manifest)} asset(s) in {asset_pipeline.root}")
+    for encoding in encodings():
+        saved = stats["raw"] - stats[encoding]
+        click.echo(f"{encoding}: {stats[encoding]} of {stats['raw']} bytes ({saved} saved)")
@@ -0,0 +1,229 @@
+# charts.py
+"""
+Server-rendered result charts.
+
+Each question's tallied results (tallies.tally_summary) are turned into a
+small chart spec: a bar chart for choice/checkbox questions, a histogram for
+linear_scale. Specs are rendered to PNG or SVG by matplotlib in a separate
+process pool, so request workers never block on rendering or share
+matplotlib's global state.
+
+Rendered files are content-addressed: the file name is a hash of the spec,
+which contains the survey version and every count, so a chart is only ever
+rendered once per distinct result and unchanged data is served straight
+from CHART_DIR. The same cache holds the owner's "report pack" (all charts
+as one PDF, or a ZIP of PNG and SVG files). The directory is kept under
+CHART_CACHE_MAX_BYTES by dropping the least recently used files.
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+PACK_FORMATS = {"pdf": "application/pdf", "zip": "application/zip"}
+
+
+# -----------------------------
+# Specs
+# -----------------------------
+def chart_spec(compiled, stats):
+    """Describe one question's chart, or None for free-text questions."""
+    if "counts" not in stats:
+        return None
+    kind = "histogram" if stats["type"] == "linear_scale" else "bar"
+    labels = [str(label) for label in (stats.get("options") or stats.get("values") or [])]
+    spec = {
+        "survey_id": compiled.id,
+        "survey_version": compiled.version,
+        "question_id": stats["id"],
+        "kind": kind,
+        "title": stats["text"],
+        "labels": labels,
+        "counts": stats["counts"],
+        "answered": stats["answered"],
+    }
+    if kind == "histogram" and stats.get("mean") is not None:
+        spec["mean"] = stats["mean"]
+    return spec
+
+
+def spec_key(spec, fmt):
+    payload = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{fmt}:{payload}".encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Rendering (runs in the pool's worker processes)
+# -----------------------------
+def _figure(spec):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    # Figure objects, not pyplot, so nothing is registered globally
+    figure = Figure(figsize=(7, max(3.0, 0.45 * len(spec["labels"]) + 1.5)) if spec["kind"] == "bar" else (7, 4))
+    axes = figure.subplots()
+    counts = spec["counts"]
+    if spec["kind"] == "bar":
+        positions = range(len(counts))
+        axes.barh(list(positions), counts, color="#4a90e2")
+        axes.set_yticks(list(positions), labels=[label[:40] for label in spec["labels"]])
+        axes.invert_yaxis()
+        axes.set_xlabel("Responses")
+        for position, count in zip(positions, counts):
+            axes.annotate(str(count), (count, position), xytext=(3, 0), textcoords="offset points", va="center")
+    else:
+        axes.bar(spec["labels"], counts, color="#4a90e2", width=0.9)
+        axes.set_xlabel("Value")
+        axes.set_ylabel("Responses")
+        if "mean" in spec:
+            axes.set_title(f"Mean {spec['mean']}", fontsize=9, loc="right")
+    axes.set_title(spec["title"][:80], loc="left")
+    axes.spines[["top", "right"]].set_visible(False)
+    figure.tight_layout()
+    return figure
+
+
+def render_chart(spec, fmt):
+    """Render one spec to PNG or SVG bytes."""
+    buffer = io.BytesIO()
+    _figure(spec).savefig(buffer, format=fmt, dpi=110)
+    return buffer.getvalue()
+
+
+def render_pdf(specs, title):
+    """Render several specs as the pages of one PDF."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = io.BytesIO()
+    with PdfPages(buffer, metadata={"Title": title}) as pdf:
+        for spec in specs:
+            pdf.savefig(_figure(spec))
+    return buffer.getvalue()
+
+
+# -----------------------------
+# Cache + pool
+# -----------------------------
+class ChartRenderer:
+    def __init__(self):
+        self.root = None
+        self.workers = 2
+        self.timeout = 30
+        self.max_bytes = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.root = app.config.get("CHART_DIR") or os.path.join(app.instance_path, "charts")
+        self.workers = max(1, int(app.config.get("CHART_WORKERS", 2)))
+        self.timeout = int(app.config.get("CHART_RENDER_TIMEOUT", 30))
+        self.max_bytes = int(app.config.get("CHART_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+    def _pool(self):
+        # One pool per process; "spawn" so workers don't inherit the web
+        # worker's threads, sockets or database connections
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _render(self, fn, *args, timeout):
+        try:
+            return self._pool().submit(fn, *args).result(timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            with self._lock:
+                self._executor = None
+            raise
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def _cached(self, key, ext, build):
+        """Return the path of a cached artifact, building it with build() on a miss."""
+        path = self._path(key, ext)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mark as recently used for eviction
+            except OSError:
+                pass
+            return path
+        data = build()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._enforce_budget()
+        return path
+
+    def chart(self, spec, fmt):
+        """Path to the rendered chart for `spec` in `fmt` ("png" or "svg")."""
+        key = spec_key(spec, fmt)
+        return self._cached(key, fmt, lambda: self._render(render_chart, spec, fmt, timeout=self.timeout))
+
+    def report_pack(self, compiled, specs, fmt):
+        """Path to a PDF of all charts, or a ZIP of every chart as PNG and SVG."""
+        key = spec_key({"pack": specs, "title": compiled.title}, fmt)
+        if fmt == "pdf":
+            return self._cached(
+                key, fmt,
+                lambda: self._render(render_pdf, specs, compiled.title, timeout=self.timeout * max(1, len(specs))),
+            )
+
+        def build_zip():
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                for number, spec in enumerate(specs, start=1):
+                    for chart_format in FORMATS:
+                        archive.write(self.chart(spec, chart_format),
+                                      f"question_{number:02d}_{spec['question_id']}.{chart_format}")
+            return buffer.getvalue()
+
+        return self._cached(key, fmt, build_zip)
+
+    def _enforce_budget(self):
+        if self.max_bytes <= 0:
+            return
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+        logger.info("Chart cache trimmed to %d bytes", total)
+
+
+chart_renderer = ChartRenderer()
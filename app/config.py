@@ -18,3 +18,145 @@ class Config:
     )
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool and timeouts (app/database.py). DB_PGBOUNCER=1 when
+    # DATABASE_URL points at PgBouncer in transaction mode
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = no limit
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+
+    # Optional read replica for read-only views (see @replica_reads)
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+
+    # Response ingestion: "sync" writes each submission inline, "buffered"
+    # queues it for the background flusher in app/ingestion.py
+    INGEST_MODE = os.environ.get("INGEST_MODE", "sync")
+    INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "10000"))
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+    INGEST_FLUSH_INTERVAL_MS = int(os.environ.get("INGEST_FLUSH_INTERVAL_MS", "250"))
+    INGEST_SPOOL_PATH = os.environ.get("INGEST_SPOOL_PATH")  # defaults to instance/ingest_spool.jsonl
+    INGEST_DEAD_LETTER_PATH = os.environ.get("INGEST_DEAD_LETTER_PATH")  # defaults to instance/ingest_dead_letter.jsonl
+    INGEST_REPLAY_SECONDS = int(os.environ.get("INGEST_REPLAY_SECONDS", "60"))
+
+    # Response counters: shard rows per survey, and how often the background
+    # reconciler re-derives them from COUNT(*). 0 (the default) disables the
+    # thread; set it on a single process, or run `flask counters reconcile`
+    # from cron instead
+    RESPONSE_COUNTER_SHARDS = int(os.environ.get("RESPONSE_COUNTER_SHARDS", "8"))
+    RESPONSE_COUNTER_RECONCILE_SECONDS = int(os.environ.get("RESPONSE_COUNTER_RECONCILE_SECONDS", "0"))
+
+    # Answer tallies: shard rows per question (and per question value), so
+    # concurrent submits to one survey don't queue on the same tally rows
+    TALLY_SHARDS = int(os.environ.get("TALLY_SHARDS", "8"))
+
+    # Compiled published-survey cache used by the respondent routes
+    SURVEY_CACHE_SIZE = int(os.environ.get("SURVEY_CACHE_SIZE", "512"))
+    SURVEY_CACHE_REVALIDATE_SECONDS = int(os.environ.get("SURVEY_CACHE_REVALIDATE_SECONDS", "30"))
+
+    # CSV export: rows fetched per server-side cursor batch, and whether to
+    # gzip the stream for clients that accept it
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+    EXPORT_GZIP = os.environ.get("EXPORT_GZIP", "1") == "1"
+
+    # Materialized export files: where they live and the total disk budget
+    EXPORT_STORE_ENABLED = os.environ.get("EXPORT_STORE_ENABLED", "1") == "1"
+    EXPORT_STORE_DIR = os.environ.get("EXPORT_STORE_DIR")  # defaults to instance/exports
+    EXPORT_STORE_MAX_BYTES = int(os.environ.get("EXPORT_STORE_MAX_BYTES", str(1024 ** 3)))
+    # Responses younger than this aren't appended yet: a lower id may still be uncommitted
+    EXPORT_STORE_LAG_SECONDS = int(os.environ.get("EXPORT_STORE_LAG_SECONDS", "5"))
+
+    # Background export jobs (thread pool per worker, state on local disk)
+    EXPORT_JOB_DIR = os.environ.get("EXPORT_JOB_DIR")  # defaults to instance/export_jobs
+    EXPORT_JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", "2"))
+    EXPORT_JOBS_PER_USER = int(os.environ.get("EXPORT_JOBS_PER_USER", "2"))
+    EXPORT_JOB_TTL_SECONDS = int(os.environ.get("EXPORT_JOB_TTL_SECONDS", str(24 * 3600)))
+
+    # Cross-tab results kept per (survey, questions, filter) in each worker
+    CROSSTAB_CACHE_SIZE = int(os.environ.get("CROSSTAB_CACHE_SIZE", "256"))
+
+    # Chart rendering: matplotlib process pool and content-addressed image cache
+    CHART_DIR = os.environ.get("CHART_DIR")  # defaults to instance/charts
+    CHART_WORKERS = int(os.environ.get("CHART_WORKERS", "2"))
+    CHART_RENDER_TIMEOUT = int(os.environ.get("CHART_RENDER_TIMEOUT", "30"))
+    CHART_CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+    # Response time-series rollups: hourly buckets are folded into daily ones
+    # once older than the retention window, checked every ROLLUP_COMPACT_SECONDS
+    ROLLUP_HOURLY_RETENTION_HOURS = int(os.environ.get("ROLLUP_HOURLY_RETENTION_HOURS", "168"))
+    ROLLUP_COMPACT_SECONDS = int(os.environ.get("ROLLUP_COMPACT_SECONDS", "3600"))
+
+    # Inverted index over short/paragraph answers, built in batches behind submits
+    TEXT_INDEX_BATCH_SIZE = int(os.environ.get("TEXT_INDEX_BATCH_SIZE", "5000"))
+    TEXT_INDEX_INTERVAL_SECONDS = int(os.environ.get("TEXT_INDEX_INTERVAL_SECONDS", "60"))
+    TEXT_INDEX_LAG_SECONDS = int(os.environ.get("TEXT_INDEX_LAG_SECONDS", "5"))
+
+    # Approximate analytics: "auto" switches to sketches once a survey has
+    # ANALYTICS_APPROX_THRESHOLD responses; "exact" or "approximate" forces one
+    ANALYTICS_MODE = os.environ.get("ANALYTICS_MODE", "auto")
+    ANALYTICS_APPROX_THRESHOLD = int(os.environ.get("ANALYTICS_APPROX_THRESHOLD", "10000"))
+    # How often each worker merges its sketch deltas into survey_sketch
+    SKETCH_FLUSH_SECONDS = int(os.environ.get("SKETCH_FLUSH_SECONDS", "10"))
+
+    # Surveys per dashboard page (keyset-paginated)
+    DASHBOARD_PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "25"))
+
+    # Pre-rendered respondent pages, per (survey, version): LRU size, disk copy
+    # (defaults to instance/pages) and the Cache-Control max-age sent with them
+    PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "256"))
+    PAGE_CACHE_DISK = os.environ.get("PAGE_CACHE_DISK", "1") == "1"
+    PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR")
+    PAGE_CACHE_MAX_AGE = int(os.environ.get("PAGE_CACHE_MAX_AGE", "60"))
+
+    # Logging and instrumentation: LOG_LEVEL gates app logging (DEBUG shows
+    # per-request detail), /metrics serves Prometheus text (Bearer METRICS_TOKEN
+    # if set) and statements slower than SLOW_QUERY_MS are logged
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", "500"))
+
+    # Static assets are fingerprinted and precompressed into ASSET_BUILD_DIR
+    # (defaults to instance/assets) at startup; dynamic responses of at least
+    # COMPRESS_MIN_BYTES are gzipped (0 turns that off)
+    ASSET_BUILD_DIR = os.environ.get("ASSET_BUILD_DIR")
+    COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+    # Outgoing mail: queued in mail_outbox and sent by MAIL_WORKERS threads per
+    # process over reused SMTP connections, retried with exponential backoff
+    MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", "2"))
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", "20"))
+    MAIL_POLL_SECONDS = int(os.environ.get("MAIL_POLL_SECONDS", "30"))
+    MAIL_LEASE_SECONDS = int(os.environ.get("MAIL_LEASE_SECONDS", "300"))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "8"))
+    MAIL_RETRY_BASE_SECONDS = int(os.environ.get("MAIL_RETRY_BASE_SECONDS", "30"))
+    MAIL_RETRY_MAX_SECONDS = int(os.environ.get("MAIL_RETRY_MAX_SECONDS", "3600"))
+    MAIL_IDLE_SECONDS = int(os.environ.get("MAIL_IDLE_SECONDS", "60"))
+    MAIL_MAX_PER_CONNECTION = int(os.environ.get("MAIL_MAX_PER_CONNECTION", "100"))
+    MAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get("MAIL_OUTBOX_RETENTION_DAYS", "30"))
+
+    # Bulk invitations: uploads are spooled under INVITE_SPOOL_DIR, imported in
+    # the background and handed to the mail outbox at INVITE_RATE_PER_MINUTE
+    INVITE_SPOOL_DIR = os.environ.get("INVITE_SPOOL_DIR")
+    INVITE_RATE_PER_MINUTE = int(os.environ.get("INVITE_RATE_PER_MINUTE", "600"))
+    INVITE_CHUNK_SIZE = int(os.environ.get("INVITE_CHUNK_SIZE", "100"))
+    INVITE_IMPORT_CHUNK = int(os.environ.get("INVITE_IMPORT_CHUNK", "1000"))
+    INVITE_MAX_RECIPIENTS = int(os.environ.get("INVITE_MAX_RECIPIENTS", "50000"))
+    INVITE_MAX_UPLOAD_MB = float(os.environ.get("INVITE_MAX_UPLOAD_MB", "10"))
+    INVITE_POLL_SECONDS = int(os.environ.get("INVITE_POLL_SECONDS", "30"))
+
+    # Survey logos: resized into WebP/JPEG at LOGO_WIDTHS by LOGO_WORKERS
+    # threads, stored under LOGO_DIR (default instance/logos); files no survey
+    # uses are deleted after LOGO_GC_GRACE_SECONDS
+    LOGO_DIR = os.environ.get("LOGO_DIR")
+    LOGO_WORKERS = int(os.environ.get("LOGO_WORKERS", "2"))
+    LOGO_WIDTHS = os.environ.get("LOGO_WIDTHS", "160,320,640")
+    LOGO_MAX_SIZE = int(os.environ.get("LOGO_MAX_SIZE", "1280"))
+    LOGO_MAX_UPLOAD_MB = float(os.environ.get("LOGO_MAX_UPLOAD_MB", "5"))
+    LOGO_WEBP_QUALITY = int(os.environ.get("LOGO_WEBP_QUALITY", "80"))
+    LOGO_JPEG_QUALITY = int(os.environ.get("LOGO_JPEG_QUALITY", "85"))
+    LOGO_GC_GRACE_SECONDS = int(os.environ.get("LOGO_GC_GRACE_SECONDS", "86400"))
@@ -0,0 +1,197 @@
+# counters.py
+"""
+Sharded, atomic response counters.
+
+Each submission adds to one of RESPONSE_COUNTER_SHARDS rows for its survey
+with a single upsert, so concurrent submits spread their row locks instead
+of all contending on the Survey row. A survey's total is the sum of its
+shards. A reconciliation pass (`flask counters reconcile`, from cron say,
+or an opt-in periodic thread) compares the totals with the real
+SurveyResponse row count and rewrites any shard set that has drifted.
+"""
+import logging
+import random
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update, delete, insert
+from . import db
+from .workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+
+def _dialect_insert(table):
+    """INSERT that supports ON CONFLICT on the engines we run on."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table)
+    return None
+
+
+def upsert_add(table, keys, increments, defaults=None):
+    """
+    Atomically add `increments` to the row identified by `keys`, creating it
+    if needed (with `defaults` for any other columns). Runs in the caller's
+    transaction.
+    """
+    defaults = defaults or {}
+    stmt = _dialect_insert(table)
+    if stmt is not None:
+        stmt = stmt.values(**keys, **defaults, **increments).on_conflict_do_update(
+            index_elements=[table.c[name] for name in keys],
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments},
+        )
+        db.session.execute(stmt)
+        return
+
+    # Portable fallback: UPDATE, then INSERT when no row existed yet
+    where = [table.c[name] == value for name, value in keys.items()]
+    result = db.session.execute(
+        update(table).where(*where).values(
+            **{name: table.c[name] + value for name, value in increments.items()}
+        )
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(**keys, **defaults, **increments))
+
+
+def _shards():
+    from flask import current_app
+    return max(1, int(current_app.config.get("RESPONSE_COUNTER_SHARDS", 8)))
+
+
+def increment(survey_id, amount=1):
+    """Add `amount` responses to a random shard of the survey's counter."""
+    from .models.survey import SurveyResponseCounter
+
+    upsert_add(
+        SurveyResponseCounter.__table__,
+        {"survey_id": survey_id, "shard": random.randrange(_shards())},
+        {"count": amount},
+    )
+    reconciler.ensure_started()
+
+
+def get_count(survey_id):
+    return get_counts([survey_id]).get(survey_id, 0)
+
+
+def get_counts(survey_ids):
+    """Return {survey_id: total} for the given surveys (missing surveys count 0)."""
+    from .models.survey import SurveyResponseCounter
+
+    survey_ids = list(survey_ids)
+    if not survey_ids:
+        return {}
+    rows = db.session.execute(
+        select(SurveyResponseCounter.survey_id, func.sum(SurveyResponseCounter.count))
+        .where(SurveyResponseCounter.survey_id.in_(survey_ids))
+        .group_by(SurveyResponseCounter.survey_id)
+    ).all()
+    counts = {survey_id: 0 for survey_id in survey_ids}
+    counts.update({survey_id: int(total or 0) for survey_id, total in rows})
+    return counts
+
+
+def forget(survey_id):
+    """Drop a survey's counter rows (used when the survey is deleted)."""
+    from .models.survey import SurveyResponseCounter
+
+    db.session.execute(delete(SurveyResponseCounter).where(SurveyResponseCounter.survey_id == survey_id))
+
+
+def reconcile_survey(survey_id):
+    """
+    Re-derive one survey's counter from COUNT(*). Returns (old, actual).
+
+    The survey row is locked first (FOR UPDATE conflicts with the key-share
+    lock that inserting a response or a new shard row takes through its
+    foreign key), then the shard rows, so submits already in flight commit
+    before the count is taken and later ones add on top of the new value.
+    """
+    from .models.survey import Survey, SurveyResponse, SurveyResponseCounter
+
+    db.session.execute(select(Survey.id).where(Survey.id == survey_id).with_for_update())
+    shard_rows = db.session.execute(
+        select(SurveyResponseCounter.shard, SurveyResponseCounter.count)
+        .where(SurveyResponseCounter.survey_id == survey_id)
+        .with_for_update()
+    ).all()
+    old = sum(count for _, count in shard_rows)
+    actual = db.session.execute(
+        select(func.count(SurveyResponse.id)).where(SurveyResponse.survey_id == survey_id)
+    ).scalar_one()
+
+    if old != actual:
+        forget(survey_id)
+        db.session.execute(
+            insert(SurveyResponseCounter.__table__).values(survey_id=survey_id, shard=0, count=actual)
+        )
+    # Keep the denormalised column in step for anything still reading it
+    db.session.execute(update(Survey).where(Survey.id == survey_id).values(response_count=actual))
+    db.session.commit()
+    return old, actual
+
+
+def reconcile_all():
+    """Reconcile every survey; returns {survey_id: (old, actual)} for those that drifted."""
+    from .models.survey import Survey
+
+    drifted = {}
+    survey_ids = db.session.execute(select(Survey.id)).scalars().all()
+    for survey_id in survey_ids:
+        old, actual = reconcile_survey(survey_id)
+        if old != actual:
+            drifted[survey_id] = (old, actual)
+    if drifted:
+        logger.warning("Reconciled %d drifted response counters: %s", len(drifted), drifted)
+    return drifted
+
+
+class CounterReconciler(PeriodicWorker):
+    """
+    Background thread running reconcile_all every RESPONSE_COUNTER_RECONCILE_SECONDS.
+
+    Off by default: every process that sets the interval runs its own pass,
+    so enable it on one of them only (or use the CLI command instead).
+    """
+
+    thread_name = "counter-reconciler"
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = int(app.config.get("RESPONSE_COUNTER_RECONCILE_SECONDS", 0))
+        app.cli.add_command(counters_cli)
+
+    def tick(self):
+        with self.app.app_context():
+            try:
+                reconcile_all()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Response counter reconciliation failed")
+
+
+reconciler = CounterReconciler()
+
+
+counters_cli = AppGroup("counters", help="Response counter maintenance.")
+
+
+@counters_cli.command("reconcile")
+@click.option("--survey-id", type=int, default=None, help="Only reconcile this survey.")
+def reconcile_command(survey_id):
+    """Rebuild response counters from the real row counts."""
+    if survey_id is not None:
+        old, actual = reconcile_survey(survey_id)
+        click.echo(f"survey {survey_id}: {old} -> {actual}")
+        return
+    drifted = reconcile_all()
+    for sid, (old, actual) in sorted(drifted.items()):
+        click.echo(f"survey {sid}: {old} -> {actual}")
+    click.echo(f"{len(drifted)} counter(s) corrected")
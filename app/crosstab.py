@@ -0,0 +1,249 @@
+# crosstab.py
+"""
+Cross-tabulation of two questions, optionally restricted to a segment.
+
+Answers to question A and B are loaded as NumPy arrays (see
+analytics.load_answer_arrays) and turned into respondent x category 0/1
+indicator matrices; the contingency table is then
+one matrix product, A^T @ B, which also handles checkbox questions where a
+respondent can fall into several categories. Row/column percentages and a
+chi-square test of independence are computed from the table; the test is
+left out (null) when A or B is a checkbox question, since a respondent who
+picks several options is counted in several cells and the cells are no
+longer independent. The segment
+(respondents whose answer to C is one of the chosen values) comes from a
+JSONB containment query on PostgreSQL, served by the GIN index on
+survey_response.responses, and from the Answer rows elsewhere.
+
+Results are cached per (survey, A, B, filter) and stamped with the survey's
+version and response count, so a new response or an edit makes the next
+request recompute instead of serving a stale table.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import or_, select
+
+from . import db
+from .analytics import load_answer_arrays, option_indexes
+
+CATEGORICAL_TYPES = ("multiple_choice", "dropdown", "checkbox", "linear_scale")
+
+
+class CrosstabError(ValueError):
+    """The requested cross-tab doesn't make sense for this survey."""
+
+
+# -----------------------------
+# Encoding
+# -----------------------------
+def categories(question):
+    """Category labels for a question, in table order."""
+    if question.qtype == "linear_scale":
+        return [str(value) for value in range(question.linear_scale_low, question.linear_scale_high + 1)]
+    return [option.text for option in question.options]
+
+
+def category_indexes(question, values):
+    """Map stored answer values to category positions; unknown values become -1."""
+    if question.qtype == "linear_scale":
+        positions = values - question.linear_scale_low
+        return np.where((positions >= 0) & (positions < len(categories(question))), positions, -1)
+    return option_indexes(question, values)
+
+
+def _indicator(respondents, response_ids, positions, width):
+    """respondents x width 0/1 matrix; row i is respondents[i]."""
+    matrix = np.zeros((len(respondents), width), dtype=np.int64)
+    keep = (positions >= 0) & np.isin(response_ids, respondents)
+    matrix[np.searchsorted(respondents, response_ids[keep]), positions[keep]] = 1
+    return matrix
+
+
+# -----------------------------
+# Statistics
+# -----------------------------
+def _chi2_sf(statistic, df):
+    """P(X >= statistic) for X ~ chi-square(df): the regularized upper incomplete gamma Q(df/2, x/2)."""
+    if statistic <= 0 or df <= 0:
+        return 1.0
+    a, x = df / 2.0, statistic / 2.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower function P, then Q = 1 - P
+        term = total = 1.0 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-14:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # Continued fraction for Q (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-14:
+            break
+    return min(1.0, h * math.exp(log_prefix))
+
+
+NO_TEST = {"statistic": None, "df": 0, "p_value": None, "cramers_v": None}
+
+
+def chi_square(table):
+    """Chi-square test of independence, ignoring empty rows and columns."""
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    rows, columns = table.shape
+    total = table.sum()
+    if rows < 2 or columns < 2 or total == 0:
+        return dict(NO_TEST)
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / total
+    statistic = float(((table - expected) ** 2 / expected).sum())
+    df = (rows - 1) * (columns - 1)
+    return {
+        "statistic": round(statistic, 4),
+        "df": df,
+        "p_value": _chi2_sf(statistic, df),
+        "cramers_v": round(math.sqrt(statistic / (total * (min(rows, columns) - 1))), 4),
+    }
+
+
+def _percent(part, whole):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.where(whole > 0, part * 100.0 / whole, 0.0)
+    return np.round(result, 1).tolist()
+
+
+# -----------------------------
+# Cross-tab
+# -----------------------------
+def _question(compiled, question_id, role):
+    question = compiled.questions_by_id.get(question_id)
+    if question is None:
+        raise CrosstabError(f"Question {role} is not part of this survey.")
+    if question.qtype not in CATEGORICAL_TYPES:
+        raise CrosstabError(f"Question {role} has free-text answers and can't be cross-tabulated.")
+    return question
+
+
+def segment(compiled, question, values):
+    """Sorted ids of the survey's responses whose answer to `question` is one of `values`."""
+    from .models.survey import SurveyResponse
+
+    values = sorted(set(values))
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+    if db.engine.dialect.name == "postgresql":
+        stmt = select(SurveyResponse.id).where(
+            SurveyResponse.survey_id == compiled.id,
+            or_(*(SurveyResponse.answered(question, value) for value in values)),
+        )
+        return np.unique(np.fromiter(db.session.execute(stmt).scalars(), dtype=np.int64))
+    response_ids, answers = load_answer_arrays(compiled.id, {question.id}).get(
+        question.id, (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    )
+    return np.unique(response_ids[np.isin(answers, values)])
+
+
+def crosstab(compiled, question_a, question_b, filter_question=None, filter_values=()):
+    """
+    Contingency table of question_a (rows) by question_b (columns) over the
+    respondents who answered both, restricted to those whose answer to
+    filter_question is one of filter_values (option ids or scale values).
+    """
+    a = _question(compiled, question_a, "A")
+    b = _question(compiled, question_b, "B")
+    c = _question(compiled, filter_question, "C") if filter_question is not None else None
+    if a.id == b.id:
+        raise CrosstabError("Pick two different questions.")
+
+    arrays = load_answer_arrays(compiled.id, {a.id, b.id})
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    resp_a, values_a = arrays.get(a.id, empty)
+    resp_b, values_b = arrays.get(b.id, empty)
+    pos_a = category_indexes(a, values_a)
+    pos_b = category_indexes(b, values_b)
+
+    respondents = np.intersect1d(resp_a[pos_a >= 0], resp_b[pos_b >= 0])
+    if c is not None:
+        respondents = np.intersect1d(respondents, segment(compiled, c, filter_values))
+
+    labels_a, labels_b = categories(a), categories(b)
+    table = _indicator(respondents, resp_a, pos_a, len(labels_a)).T \
+        @ _indicator(respondents, resp_b, pos_b, len(labels_b))
+
+    row_totals = table.sum(axis=1)
+    column_totals = table.sum(axis=0)
+    multi_select = "checkbox" in (a.qtype, b.qtype)
+    return {
+        "survey_id": compiled.id,
+        "question_a": {"id": a.id, "text": a.text, "type": a.qtype, "categories": labels_a},
+        "question_b": {"id": b.id, "text": b.text, "type": b.qtype, "categories": labels_b},
+        "filter": {"question_id": c.id, "text": c.text, "values": sorted(filter_values)} if c is not None else None,
+        "respondents": int(len(respondents)),
+        "counts": table.tolist(),
+        "row_totals": row_totals.tolist(),
+        "column_totals": column_totals.tolist(),
+        "row_percentages": _percent(table, row_totals[:, None]),
+        "column_percentages": _percent(table, column_totals[None, :]),
+        # Checkbox answers put one respondent in several cells, which breaks
+        # the independence assumption behind the test, so there is none
+        "chi_square": dict(NO_TEST) if multi_select else chi_square(table),
+        "multi_select": multi_select,
+    }
+
+
+class CrosstabCache:
+    """LRU of cross-tab results keyed by (survey, A, B, filter), stamped with (version, responses)."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = int(app.config.get("CROSSTAB_CACHE_SIZE", self.max_entries))
+
+    def get(self, compiled, question_a, question_b, filter_question=None, filter_values=()):
+        from . import counters
+
+        filter_values = tuple(sorted(set(filter_values)))
+        key = (compiled.id, question_a, question_b, filter_question, filter_values)
+        stamp = (compiled.version, counters.get_count(compiled.id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        result = crosstab(compiled, question_a, question_b, filter_question, filter_values)
+        with self._lock:
+            self._entries[key] = (stamp, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, survey_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == survey_id]:
+                del self._entries[key]
+
+
+crosstab_cache = CrosstabCache()
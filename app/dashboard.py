@@ -0,0 +1,119 @@
+# dashboard.py
+"""
+The owner dashboard's data, in one query.
+
+A CTE computes one row per survey of the user (question count from
+question, response count from the sharded counter rows), a second
+aggregates it into the stat-card totals, and the page itself is a keyset
+slice of the first: rows strictly after the (sort value, id) of the last
+row shown, in the requested order. The totals are LEFT JOINed onto the
+page so an empty page still returns them. Page size and sort never change
+the number of statements, and no template access triggers a lazy load.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import select, func, case, literal, true, tuple_
+from . import db
+
+SORTS = ("created", "title", "responses", "questions")
+
+
+class DashboardError(ValueError):
+    """Bad sort or cursor parameters."""
+
+
+def encode_cursor(value, survey_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, survey_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        value, survey_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if sort == "created":
+            value = datetime.fromisoformat(value)
+        elif sort in ("responses", "questions"):
+            value = int(value)
+        elif not isinstance(value, str):
+            raise ValueError(value)
+        return value, int(survey_id)
+    except (ValueError, TypeError):
+        raise DashboardError("Invalid page cursor.")
+
+
+def dashboard_page(user_id, sort="created", descending=True, after=None, per_page=25):
+    """
+    One page of the user's surveys plus totals over all of them:
+    {"surveys": [row, ...], "total_surveys", "published_surveys",
+     "total_responses", "next_cursor"}.
+    """
+    from .models.survey import Question, Survey, SurveyResponseCounter
+
+    if sort not in SORTS:
+        raise DashboardError(f"sort must be one of {', '.join(SORTS)}")
+
+    question_counts = (
+        select(Question.survey_id, func.count().label("question_count"))
+        .group_by(Question.survey_id)
+        .subquery()
+    )
+    response_counts = (
+        select(SurveyResponseCounter.survey_id, func.sum(SurveyResponseCounter.count).label("response_count"))
+        .group_by(SurveyResponseCounter.survey_id)
+        .subquery()
+    )
+    stats = (
+        select(
+            Survey.id, Survey.title, Survey.description, Survey.created_at, Survey.published,
+            func.coalesce(question_counts.c.question_count, 0).label("question_count"),
+            func.coalesce(response_counts.c.response_count, 0).label("response_count"),
+        )
+        .outerjoin(question_counts, question_counts.c.survey_id == Survey.id)
+        .outerjoin(response_counts, response_counts.c.survey_id == Survey.id)
+        .where(Survey.user_id == user_id)
+        .cte("survey_stats")
+    )
+    totals = select(
+        func.count().label("total_surveys"),
+        func.coalesce(func.sum(case((stats.c.published == true(), 1), else_=0)), 0).label("published_surveys"),
+        func.coalesce(func.sum(stats.c.response_count), 0).label("total_responses"),
+    ).subquery("totals")
+
+    sort_column = {
+        "created": stats.c.created_at,
+        "title": stats.c.title,
+        "responses": stats.c.response_count,
+        "questions": stats.c.question_count,
+    }[sort]
+    key = tuple_(sort_column, stats.c.id)
+    page_query = select(stats, sort_column.label("sort_value"))
+    if after is not None:
+        value, survey_id = decode_cursor(after, sort)
+        page_query = page_query.where(key < tuple_(literal(value), literal(survey_id)) if descending
+                                      else key > tuple_(literal(value), literal(survey_id)))
+    order = (sort_column.desc(), stats.c.id.desc()) if descending else (sort_column.asc(), stats.c.id.asc())
+    # One row past the page tells us whether there is a next page
+    page = page_query.order_by(*order).limit(per_page + 1).subquery("page")
+
+    page_order = (page.c.sort_value.desc(), page.c.id.desc()) if descending else (page.c.sort_value, page.c.id)
+    rows = db.session.execute(
+        select(totals, page).select_from(totals.outerjoin(page, true())).order_by(*page_order)
+    ).all()
+
+    first = rows[0]
+    surveys = [row for row in rows if row.id is not None]
+    next_cursor = None
+    if len(surveys) > per_page:
+        surveys = surveys[:per_page]
+        next_cursor = encode_cursor(surveys[-1].sort_value, surveys[-1].id)
+    return {
+        "surveys": surveys,
+        "total_surveys": first.total_surveys,
+        "published_surveys": int(first.published_surveys),
+        "total_responses": int(first.total_responses),
+        "next_cursor": next_cursor,
+    }
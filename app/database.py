@@ -0,0 +1,105 @@
+# database.py
+"""
+Engine settings and read-replica routing.
+
+engine_options() turns the DB_* settings into SQLAlchemy engine options:
+pool size, overflow, checkout timeout, recycle age, pre-ping, and on
+PostgreSQL a connect timeout and a statement_timeout. The timeout is sent as
+a startup parameter, or with DB_PGBOUNCER=1 as SET LOCAL at the start of
+each transaction, because PgBouncer refuses unknown startup parameters and
+in transaction mode a session-level SET would leak to other clients. In
+that mode psycopg 3's automatic prepared statements are switched off too.
+psycopg2 never prepares, so it needs nothing extra.
+
+When DATABASE_REPLICA_URL is set, the replica becomes the "replica" bind
+and RoutingSession sends plain SELECTs to it, but only inside views
+decorated with @replica_reads. Everything else goes to the primary:
+writes, SELECT ... FOR UPDATE, text() statements, bare
+connection()/get_bind() calls, and every statement after the first of
+those in the same session. A request that writes therefore reads its own
+writes. Replica lag can make respondent pages trail a change by up to the
+lag plus SURVEY_CACHE_REVALIDATE_SECONDS.
+"""
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+REPLICA = "replica"
+
+
+def engine_options(config, url):
+    """SQLAlchemy engine options for `url` from the DB_* settings."""
+    url = make_url(url)
+    options = {"pool_pre_ping": bool(config.get("DB_POOL_PRE_PING", True))}
+    if url.get_backend_name() == "sqlite":
+        return options  # file and memory databases use their own pool classes
+
+    options.update(
+        pool_size=int(config.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(config.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(config.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(config.get("DB_POOL_RECYCLE", 1800)),
+    )
+    if url.get_backend_name() != "postgresql":
+        return options
+
+    connect_args = {"connect_timeout": int(config.get("DB_CONNECT_TIMEOUT", 10))}
+    timeout_ms = int(config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+    if config.get("DB_PGBOUNCER"):
+        if url.get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = None
+    elif timeout_ms > 0:
+        connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+    options["connect_args"] = connect_args
+    return options
+
+
+def configure(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS and the replica bind; call before db.init_app."""
+    config = app.config
+    config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(config, config["SQLALCHEMY_DATABASE_URI"]))
+    replica_url = config.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        binds = config.setdefault("SQLALCHEMY_BINDS", {})
+        binds.setdefault(REPLICA, {"url": replica_url, **engine_options(config, replica_url)})
+
+
+def init_app(app, db):
+    """Per-transaction statement_timeout under PgBouncer; call after db.init_app."""
+    timeout_ms = int(app.config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+    if not app.config.get("DB_PGBOUNCER") or timeout_ms <= 0:
+        return
+
+    def set_timeout(connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "postgresql":
+                event.listen(engine, "begin", set_timeout)
+
+
+def replica_reads(view):
+    """Let the view's plain SELECTs go to the read replica, when there is one."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._db_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """db.session class: replica for reads in @replica_reads views, primary for everything else."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get("_db_replica") and not self.info.get("primary_only"):
+            engines = self._db.engines
+            if REPLICA in engines:
+                if isinstance(clause, Select) and clause._for_update_arg is None:
+                    return engines[REPLICA]
+                self.info["primary_only"] = True  # stay on the primary from the first write on
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,241 @@
+# export_jobs.py
+"""
+Background export jobs.
+
+Big exports are built off the request thread: the owner requests a job,
+a bounded thread pool builds the CSV (through the export store when it's
+enabled) and survey_view polls the job's progress until a download link
+appears. Job state lives in small JSON files under EXPORT_JOB_DIR, so any
+worker process can answer a progress poll or serve the download, and no
+broker beyond the local filesystem and Postgres is needed.
+
+- Jobs for the same survey are deduplicated: while one is queued or
+  running, requesting another returns it.
+- Each user may have at most EXPORT_JOBS_PER_USER jobs in flight.
+- Finished artifacts are kept for EXPORT_JOB_TTL_SECONDS, then swept.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import db, counters
+from .exports import iter_csv
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+
+# A running job that hasn't reported progress for this long is presumed dead
+STALE_AFTER_SECONDS = 600
+# ...and a queued one that no worker has started in this long (its pool
+# went away with a restart, say)
+QUEUED_STALE_AFTER_SECONDS = 3600
+# A survey pointer whose job file can't be read is left alone this long,
+# in case the job is mid-write
+POINTER_GRACE_SECONDS = 5
+
+
+class TooManyJobs(Exception):
+    """The user already has the maximum number of export jobs in flight."""
+
+
+class ExportJobManager:
+    def __init__(self):
+        self.app = None
+        self.root = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.root = app.config.get("EXPORT_JOB_DIR") or os.path.join(app.instance_path, "export_jobs")
+        self.workers = max(1, int(app.config.get("EXPORT_JOB_WORKERS", 2)))
+        self.per_user = max(1, int(app.config.get("EXPORT_JOBS_PER_USER", 2)))
+        self.ttl = int(app.config.get("EXPORT_JOB_TTL_SECONDS", 24 * 3600))
+
+    # -----------------------------
+    # Job records
+    # -----------------------------
+    def _job_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _pointer_path(self, survey_id):
+        return os.path.join(self.root, f"survey_{survey_id}.active")
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.csv")
+
+    def get(self, job_id):
+        try:
+            with open(self._job_path(job_id), encoding="utf-8") as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        idle = time.time() - job["updated_at"]
+        if job["state"] == "running" and idle > STALE_AFTER_SECONDS:
+            job["state"] = "failed"
+            job["error"] = "Export worker stopped responding."
+        elif job["state"] == "queued" and idle > QUEUED_STALE_AFTER_SECONDS:
+            job["state"] = "failed"
+            job["error"] = "Export was never started."
+        return job
+
+    def _save(self, job):
+        job["updated_at"] = time.time()
+        tmp = f"{self._job_path(job['id'])}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._job_path(job["id"]))
+
+    def _jobs(self):
+        if not os.path.isdir(self.root):
+            return []
+        jobs = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                job = self.get(name[:-len(".json")])
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+    # -----------------------------
+    # Submission
+    # -----------------------------
+    def submit(self, survey_id, user_id):
+        """Return the active job for this survey, or queue a new one."""
+        os.makedirs(self.root, exist_ok=True)
+        self.sweep()
+
+        existing = self._active_for_survey(survey_id)
+        if existing is not None:
+            return existing
+        if os.path.exists(self._pointer_path(survey_id)):
+            # Claimed, but the job isn't readable yet; give it a moment
+            time.sleep(0.1)
+            return self.submit(survey_id, user_id)
+
+        active = [j for j in self._jobs() if j["user_id"] == user_id and j["state"] in ACTIVE_STATES]
+        if len(active) >= self.per_user:
+            raise TooManyJobs()
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "survey_id": survey_id,
+            "user_id": user_id,
+            "state": "queued",
+            "rows_done": 0,
+            "rows_total": counters.get_count(survey_id),
+            "created_at": time.time(),
+            "finished_at": None,
+            "error": None,
+        }
+        # Write the job first, so whoever finds the pointer can read it, then
+        # claim the survey atomically so concurrent requests (in any process) dedupe
+        self._save(job)
+        try:
+            fd = os.open(self._pointer_path(survey_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            os.remove(self._job_path(job["id"]))
+            return self.submit(survey_id, user_id)
+        with os.fdopen(fd, "w") as f:
+            f.write(job["id"])
+        self._pool().submit(self._run, job["id"])
+        return job
+
+    def _active_for_survey(self, survey_id):
+        pointer = self._pointer_path(survey_id)
+        try:
+            with open(pointer, encoding="utf-8") as f:
+                job_id = f.read().strip()
+            claimed_at = os.path.getmtime(pointer)
+        except OSError:
+            return None
+        job = self.get(job_id)
+        if job is not None and job["state"] in ACTIVE_STATES:
+            return job
+        if job is None and time.time() - claimed_at < POINTER_GRACE_SECONDS:
+            return None  # just claimed, or its job is being replaced; not ours to release
+        # Finished, failed or vanished: release the claim
+        try:
+            os.remove(self._pointer_path(survey_id))
+        except OSError:
+            pass
+        return None
+
+    def _pool(self):
+        # One pool per process; rebuilt after a fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-job")
+            return self._executor
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def _run(self, job_id):
+        from .export_store import export_store
+        from .response_codec import definition_for
+
+        job = self.get(job_id)
+        if job is None or job["state"] != "queued":
+            return  # reported stale meanwhile, and perhaps already replaced
+        job["state"] = "running"
+        self._save(job)
+
+        last_saved = [0.0]
+
+        def progress(rows_done):
+            job["rows_done"] = rows_done
+            if time.monotonic() - last_saved[0] >= 0.5:
+                last_saved[0] = time.monotonic()
+                self._save(job)
+
+        with self.app.app_context():
+            try:
+                compiled = definition_for(job["survey_id"])
+                artifact = self.artifact_path(job_id)
+                if export_store.enabled:
+                    path, meta = export_store.get(compiled, progress=progress)
+                    shutil.copyfile(path, f"{artifact}.tmp")
+                    job["rows_done"] = meta["rows"]
+                else:
+                    with open(f"{artifact}.tmp", "wb") as f:
+                        for chunk in iter_csv(compiled, progress=progress):
+                            f.write(chunk)
+                os.replace(f"{artifact}.tmp", artifact)
+                job["rows_total"] = max(job["rows_total"], job["rows_done"])
+                job["state"] = "finished"
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Export job %s failed", job_id)
+                job["state"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                self._save(job)
+                self._active_for_survey(job["survey_id"])
+
+    # -----------------------------
+    # Expiry
+    # -----------------------------
+    def sweep(self):
+        """Remove finished or failed jobs (and their artifacts) older than the TTL."""
+        now = time.time()
+        for job in self._jobs():
+            if job["state"] in ACTIVE_STATES or now - (job["finished_at"] or job["updated_at"]) < self.ttl:
+                continue
+            for path in (self._job_path(job["id"]), self.artifact_path(job["id"])):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+export_jobs = ExportJobManager()
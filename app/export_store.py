@@ -0,0 +1,229 @@
+# export_store.py
+"""
+Materialized CSV exports on local disk.
+
+The first download of a survey's responses builds survey_<id>_v<version>.csv
+under EXPORT_STORE_DIR. Later downloads only append the responses that
+arrived since (tracked by a high-water-mark response id in a JSON sidecar)
+and then serve the file straight from disk, so nothing is re-parsed.
+Ids are assigned before commit, so a response can become visible after a
+higher id has already been exported; the mark therefore stops at the
+first response younger than EXPORT_STORE_LAG_SECONDS, which the next
+download picks up once it has settled.
+Because the file is append-only, Flask's send_file can answer ETag and
+Range requests for it.
+
+Entries are dropped when their survey is deleted or its version changes,
+and the whole store is kept under EXPORT_STORE_MAX_BYTES by evicting the
+least recently downloaded files.
+"""
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import StringIO
+
+from .exports import header_row, response_row, iter_response_rows
+
+try:
+    import fcntl  # POSIX only; on other platforms only in-process locking applies
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class ExportStore:
+    def __init__(self):
+        self.root = None
+        self.max_bytes = 0
+        self.enabled = False
+        self.lag = 5
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def init_app(self, app):
+        self.root = app.config.get("EXPORT_STORE_DIR") or os.path.join(app.instance_path, "exports")
+        self.max_bytes = int(app.config.get("EXPORT_STORE_MAX_BYTES", 1024 ** 3))
+        self.enabled = bool(app.config.get("EXPORT_STORE_ENABLED", True))
+        self.lag = int(app.config.get("EXPORT_STORE_LAG_SECONDS", self.lag))
+
+    # -----------------------------
+    # Paths and locking
+    # -----------------------------
+    def _prefix(self, survey_id):
+        return os.path.join(self.root, f"survey_{survey_id}")
+
+    def csv_path(self, survey_id, version):
+        return f"{self._prefix(survey_id)}_v{version}.csv"
+
+    def _meta_path(self, survey_id):
+        return f"{self._prefix(survey_id)}.json"
+
+    @contextmanager
+    def _locked(self, survey_id):
+        with self._locks_guard:
+            lock = self._locks.setdefault(survey_id, threading.Lock())
+        with lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(f"{self._prefix(survey_id)}.lock", "a") as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_meta(self, survey_id):
+        try:
+            with open(self._meta_path(survey_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, survey_id, meta):
+        tmp = f"{self._meta_path(survey_id)}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(survey_id))
+
+    # -----------------------------
+    # Build / refresh
+    # -----------------------------
+    def get(self, compiled, progress=None):
+        """
+        Return (path, meta) for an up-to-date export of `compiled`.
+
+        `progress`, if given, is called with the number of rows written so
+        far while new rows are being appended.
+        """
+        with self._locked(compiled.id):
+            meta = self._read_meta(compiled.id)
+            if meta is None or meta.get("version") != compiled.version \
+                    or not os.path.exists(self.csv_path(compiled.id, compiled.version)):
+                meta = self._rebuild(compiled, meta, progress)
+            else:
+                meta = self._append(compiled, meta, progress)
+            meta["last_access"] = time.time()
+            self._write_meta(compiled.id, meta)
+        self._enforce_budget(keep=compiled.id)
+        return self.csv_path(compiled.id, compiled.version), meta
+
+    def _rebuild(self, compiled, old_meta, progress):
+        if old_meta is not None:
+            self._remove_csv(compiled.id, old_meta.get("version"))
+        path = self.csv_path(compiled.id, compiled.version)
+        tmp = f"{path}.tmp"
+        meta = {"survey_id": compiled.id, "version": compiled.version, "high_water_id": 0, "rows": 0}
+        with open(tmp, "wb") as f:
+            self._write_rows(f, compiled, meta, progress, include_header=True)
+        os.replace(tmp, path)
+        meta["size"] = os.path.getsize(path)
+        return meta
+
+    def _append(self, compiled, meta, progress):
+        path = self.csv_path(compiled.id, compiled.version)
+        with open(path, "r+b") as f:
+            # Drop any tail left by an append that died before its meta was saved
+            f.truncate(meta.get("size", 0))
+            f.seek(0, os.SEEK_END)
+            self._write_rows(f, compiled, meta, progress, include_header=False)
+        meta["size"] = os.path.getsize(path)
+        return meta
+
+    def _write_rows(self, f, compiled, meta, progress, include_header):
+        """
+        Append rows past the high-water mark, advancing it as they're written,
+        up to the first one too recent to be sure no lower id is still
+        uncommitted.
+        """
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if include_header:
+            writer.writerow(header_row(compiled))
+        settled = datetime.utcnow() - timedelta(seconds=self.lag)
+        rows = iter_response_rows(compiled.id, after_id=meta["high_water_id"])
+        try:
+            for response_id, created_at, ip, blob in rows:
+                if created_at is not None and created_at > settled:
+                    break
+                writer.writerow(response_row(response_id, created_at, ip, blob, compiled))
+                meta["high_water_id"] = response_id
+                meta["rows"] += 1
+                if buffer.tell() >= 64 * 1024:
+                    self._drain(f, buffer, progress, meta)
+        finally:
+            rows.close()
+        self._drain(f, buffer, progress, meta)
+
+    @staticmethod
+    def _drain(f, buffer, progress, meta):
+        data = buffer.getvalue()
+        if data:
+            f.write(data.encode("utf-8"))
+            f.flush()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if progress is not None:
+            progress(meta["rows"])
+
+    # -----------------------------
+    # Invalidation and eviction
+    # -----------------------------
+    def _remove_csv(self, survey_id, version):
+        if version is None:
+            return
+        try:
+            os.remove(self.csv_path(survey_id, version))
+        except OSError:
+            pass
+
+    def invalidate(self, survey_id):
+        """Forget a survey's export entirely (e.g. when the survey is deleted)."""
+        if self.root is None or not os.path.isdir(self.root):
+            return
+        with self._locked(survey_id):
+            meta = self._read_meta(survey_id)
+            if meta is not None:
+                self._remove_csv(survey_id, meta.get("version"))
+            try:
+                os.remove(self._meta_path(survey_id))
+            except OSError:
+                pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if not (name.startswith("survey_") and name.endswith(".json")):
+                continue
+            try:
+                survey_id = int(name[len("survey_"):-len(".json")])
+            except ValueError:
+                continue
+            meta = self._read_meta(survey_id)
+            if meta is not None:
+                entries.append((meta.get("last_access", 0), survey_id, meta.get("size", 0)))
+        return entries
+
+    def _enforce_budget(self, keep=None):
+        """Evict least recently downloaded exports until the store fits in max_bytes."""
+        if self.max_bytes <= 0:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, survey_id, size in entries:
+            if total <= self.max_bytes:
+                break
+            if survey_id == keep:
+                continue
+            self.invalidate(survey_id)
+            total -= size
+            logger.info("Evicted cached export for survey %s (%d bytes)", survey_id, size)
+
+
+export_store = ExportStore()
@@ -0,0 +1,385 @@
+# ingestion.py
+"""
+Write-behind ingestion for survey responses.
+
+When INGEST_MODE is "buffered", submit_survey_response hands validated rows
+to a bounded in-process queue instead of writing them inline. A background
+flusher drains the queue and writes multi-row INSERTs every
+INGEST_BATCH_SIZE rows or INGEST_FLUSH_INTERVAL_MS milliseconds, whichever
+comes first, together with the batch's answer rows and one counter upsert
+per survey. Rows that cannot be queued (queue full, shutdown) are appended
+to a local spool file, which the flusher replays when it starts and every
+INGEST_REPLAY_SECONDS; at start it also takes over replay files left by
+processes that died mid-replay. A batch that fails is retried row by row: rows that
+fail on their own (a survey deleted since submit) go to the dead-letter
+file with the error, the rest are written, and if the database itself is
+unavailable the remainder is spooled.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as SQLAlchemyTimeoutError
+from . import db, counters, rollups
+from .answers import answer_rows, record_answers
+from .tallies import record_tallies
+from .text_index import indexer as text_indexer
+from .sketches import buffer as sketch_buffer
+from .survey_cache import survey_cache
+from .workers import DaemonThread
+
+logger = logging.getLogger(__name__)
+
+
+class IngestStats:
+    """Counters describing the ingestion pipeline, safe to read from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.flushed = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.flush_errors = 0
+        self.flush_count = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        self.last_flush_ms = 0.0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_flush(self, rows, elapsed_ms):
+        with self._lock:
+            self.flushed += rows
+            self.flush_count += 1
+            self.flush_ms_total += elapsed_ms
+            self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+            self.last_flush_ms = elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.flush_ms_total / self.flush_count if self.flush_count else 0.0
+            return {
+                "enqueued": self.enqueued,
+                "flushed": self.flushed,
+                "spooled": self.spooled,
+                "replayed": self.replayed,
+                "dead_lettered": self.dead_lettered,
+                "flush_errors": self.flush_errors,
+                "flush_count": self.flush_count,
+                "flush_ms_avg": round(avg, 3),
+                "flush_ms_max": round(self.flush_ms_max, 3),
+                "flush_ms_last": round(self.last_flush_ms, 3),
+            }
+
+
+class ResponseIngestor:
+    """Bounded queue plus background flusher for SurveyResponse rows."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.stats = IngestStats()
+        self._queue = None
+        self._flusher = DaemonThread("response-ingestor", self._run)
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("INGEST_MODE", "sync") == "buffered"
+        self.batch_size = max(1, int(app.config.get("INGEST_BATCH_SIZE", 500)))
+        self.flush_interval = max(1, int(app.config.get("INGEST_FLUSH_INTERVAL_MS", 250))) / 1000.0
+        self.spool_path = app.config.get("INGEST_SPOOL_PATH") or os.path.join(
+            app.instance_path, "ingest_spool.jsonl"
+        )
+        self.dead_letter_path = app.config.get("INGEST_DEAD_LETTER_PATH") or os.path.join(
+            app.instance_path, "ingest_dead_letter.jsonl"
+        )
+        self.replay_interval = max(1, int(app.config.get("INGEST_REPLAY_SECONDS", 60)))
+        self._queue = queue.Queue(maxsize=max(1, int(app.config.get("INGEST_QUEUE_SIZE", 10000))))
+        if self.enabled:
+            atexit.register(self.shutdown)
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def submit(self, row):
+        """
+        Queue one response row for a batched write.
+
+        `row` holds SurveyResponse column values (survey_id, respondent_ip,
+        respondent_info, created_at, responses). Never blocks: when the queue
+        is full the row goes to the spool file instead.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            self.stats.incr("enqueued")
+        except queue.Full:
+            self._spool([row])
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def snapshot(self):
+        data = self.stats.snapshot()
+        data["queue_depth"] = self.queue_depth()
+        data["queue_capacity"] = self._queue.maxsize if self._queue is not None else 0
+        data["mode"] = "buffered" if self.enabled else "sync"
+        return data
+
+    # -----------------------------
+    # Flusher side
+    # -----------------------------
+    def _ensure_started(self):
+        # Started lazily (and re-started after a fork) so gunicorn's
+        # preload_app doesn't leave workers with a dead parent thread.
+        if not self._flusher.is_alive():
+            self._stop.clear()
+            self._flusher.ensure_started()
+
+    def _run(self):
+        self._replay_spool(leftovers=True)
+        last_replay = time.monotonic()
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+            # Rows spooled by an outage go back in once it's over, not at the next restart
+            if time.monotonic() - last_replay >= self.replay_interval:
+                last_replay = time.monotonic()
+                self._replay_spool()
+
+    def _collect_batch(self):
+        """Wait for the first row, then gather until the batch is full or the interval elapses."""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, rows):
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                answer_batch = self._write(rows)
+            except Exception:
+                db.session.rollback()
+                self.stats.incr("flush_errors")
+                logger.exception("Failed to flush %d survey responses; retrying row by row", len(rows))
+                self._retry_rows(rows)
+                return
+            self._after_commit(rows, answer_batch)
+        self.stats.record_flush(len(rows), (time.perf_counter() - started) * 1000.0)
+
+    def _write(self, rows):
+        """Insert rows with their answers, tallies, counters and rollups, and commit; returns the answers."""
+        from .models.survey import SurveyResponse
+
+        table = SurveyResponse.__table__
+        response_ids = db.session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        answer_batch = []
+        for response_id, row in zip(response_ids, rows):
+            compiled = survey_cache.get_by_id(row["survey_id"])
+            if compiled is not None:
+                answer_batch.extend(answer_rows(response_id, compiled, row["responses"]))
+        record_answers(answer_batch)
+        record_tallies(answer_batch)
+
+        per_survey = {}
+        for row in rows:
+            per_survey[row["survey_id"]] = per_survey.get(row["survey_id"], 0) + 1
+        for survey_id, added in per_survey.items():
+            counters.increment(survey_id, added)
+        rollups.record_many((row["survey_id"], row["created_at"]) for row in rows)
+        db.session.commit()
+        return answer_batch
+
+    def _after_commit(self, rows, answer_batch):
+        # The rows are committed: a failure from here on must not spool them again
+        try:
+            for survey_id in {row["survey_id"] for row in answer_batch if row["text_value"] is not None}:
+                text_indexer.mark_dirty(survey_id)
+            sketch_buffer.observe(
+                ((row["survey_id"], row["respondent_ip"], row["respondent_info"]) for row in rows), answer_batch
+            )
+        except Exception:
+            logger.exception("Post-commit hooks failed for %d survey responses", len(rows))
+
+    def _retry_rows(self, rows):
+        """
+        Write a failed batch one row at a time, so one bad row (say, for a
+        survey deleted since submit) doesn't hold back the rest. A row that
+        still fails goes to the dead-letter file, unless the error says the
+        database itself is unavailable: then this row and the remainder are
+        spooled for the next replay.
+        """
+        for i, row in enumerate(rows):
+            try:
+                answer_batch = self._write([row])
+            except (OperationalError, InterfaceError, SQLAlchemyTimeoutError):
+                db.session.rollback()
+                logger.exception("Failed to write survey response; spooling %d row(s)", len(rows) - i)
+                self._spool(rows[i:])
+                return
+            except Exception as e:
+                db.session.rollback()
+                self._dead_letter(row, e)
+                continue
+            self._after_commit([row], answer_batch)
+            self.stats.record_flush(1, 0.0)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the flusher and persist anything still queued."""
+        self._stop.set()
+        self._flusher.join(timeout)
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftovers:
+            self._spool(leftovers)
+
+    # -----------------------------
+    # Spool file
+    # -----------------------------
+    def _spool(self, rows):
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    record = dict(row)
+                    if isinstance(record.get("created_at"), datetime):
+                        record["created_at"] = record["created_at"].isoformat()
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self.stats.incr("spooled", len(rows))
+
+    def _dead_letter(self, row, error):
+        """Set aside a row the database refuses, with the reason, for someone to look at."""
+        logger.error("Survey response for survey %s rejected (%s); dead-lettered",
+                     row.get("survey_id"), type(error).__name__)
+        record = dict(row)
+        if isinstance(record.get("created_at"), datetime):
+            record["created_at"] = record["created_at"].isoformat()
+        record["error"] = str(getattr(error, "orig", None) or error)[:500]
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self.stats.incr("dead_lettered")
+
+    def _replay_spool(self, leftovers=False):
+        """Move the spool aside and write its rows back in batches.
+
+        With `leftovers`, first take over the replay files of processes that
+        died (or of this one's previous flusher thread) before finishing them.
+        """
+        paths = []
+        with self._spool_lock:
+            if leftovers:
+                paths.extend(self._claim_leftovers())
+            # Replay files are named {spool}.{pid}[.{claim}].replay, by the process replaying them
+            replay_path = f"{self.spool_path}.{os.getpid()}.replay"
+            try:
+                os.replace(self.spool_path, replay_path)
+                paths.append(replay_path)
+            except FileNotFoundError:
+                pass  # nothing spooled, or another process took it first
+            except OSError:
+                logger.exception("Could not move the ingest spool aside for replay")
+        for path in paths:
+            self._replay_file(path)
+
+    def _claim_leftovers(self):
+        claimed = []
+        prefix = f"{self.spool_path}."
+        for path in glob.glob(f"{glob.escape(prefix)}*.replay"):
+            try:
+                pid = int(path[len(prefix):].split(".")[0])
+            except ValueError:
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue  # still being replayed
+            claim = f"{prefix}{os.getpid()}.{uuid.uuid4().hex[:8]}.replay"
+            try:
+                os.replace(path, claim)
+            except OSError:
+                continue  # another process claimed it first
+            claimed.append(claim)
+        return claimed
+
+    def _replay_file(self, replay_path):
+        rows = []
+        try:
+            with open(replay_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping corrupt spool line in %s", replay_path)
+                        continue
+                    if record.get("created_at"):
+                        record["created_at"] = datetime.fromisoformat(record["created_at"])
+                    rows.append(record)
+        except OSError:
+            logger.exception("Could not read %s; leaving it for the next start", replay_path)
+            return
+
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start:start + self.batch_size])
+        self.stats.incr("replayed", len(rows))
+        try:
+            os.remove(replay_path)
+        except OSError:
+            logger.exception("Could not remove %s after replaying it", replay_path)
+        if rows:
+            logger.info("Replayed %d spooled survey responses", len(rows))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+ingestor = ResponseIngestor()
@@ -0,0 +1,456 @@
+# invitations.py
+"""
+Bulk survey invitations.
+
+The owner uploads a CSV of recipients: a header row with an "email" column
+(and optionally "name"), or rows of email then name with no header. The
+request only copies the upload to INVITE_SPOOL_DIR and records a batch, so
+even a 50k-row list returns at once; a sender thread per process does the
+rest:
+
+- Import streams the spooled file through the csv module and inserts
+  recipients INVITE_IMPORT_CHUNK rows at a time, skipping invalid
+  addresses, repeats, anyone already invited to the survey (a unique
+  (survey_id, email) constraint) and rows past INVITE_MAX_RECIPIENTS.
+- Sending takes INVITE_CHUNK_SIZE pending invitations at a time and hands
+  them to the mail outbox (mailer.py), whose pooled workers deliver them
+  over reused SMTP connections. The invitation is rendered once per batch
+  with marker strings where each recipient's name and token go, so a
+  message costs two str.replace calls rather than a template render.
+
+Batches go out one at a time, oldest first, at INVITE_RATE_PER_MINUTE no
+matter how many processes run a sender: the sending batch's row is locked
+while a chunk is queued, and its next_send_at pushed forward by that
+chunk's share of a minute.
+
+A recipient's token is in their link (/i/<token>) and open pixel
+(/i/<token>/open.gif). Following the link remembers the token in the
+session, and submitting that survey marks the invitation completed.
+"""
+import csv
+import logging
+import os
+import re
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from flask import url_for
+from markupsafe import escape
+from sqlalchemy import select, update, func, insert
+from . import db
+from .counters import _dialect_insert
+from .emails import email_renderer
+from .logos import logo_pipeline
+from .mailer import mail_dispatcher
+from .workers import DaemonThread
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r"^[^@\s,;<>\"']+@[^@\s,;<>\"']+\.[^@\s,;<>\"']+$")
+EMAIL_HEADERS = ("email", "e-mail", "email address")
+NAME_HEADERS = ("name", "full name", "first name")
+ACTIVE_STATES = ("uploaded", "importing", "sending")
+
+# An import that hasn't finished in this long is presumed dead and retried
+IMPORT_LEASE_SECONDS = 600
+
+# 1x1 transparent GIF served by the open-tracking route
+OPEN_PIXEL = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+
+class InvitationError(ValueError):
+    """The upload can't be turned into an invitation batch."""
+
+
+def parse_recipients(rows):
+    """Yield (email, name or None) for each CSV row, or None for a row without a valid address."""
+    email_col, name_col = 0, 1
+    first = True
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        if first:
+            first = False
+            labels = [cell.strip().lower() for cell in row]
+            if any(label in EMAIL_HEADERS for label in labels):
+                email_col = next(i for i, label in enumerate(labels) if label in EMAIL_HEADERS)
+                name_col = next((i for i, label in enumerate(labels) if label in NAME_HEADERS), None)
+                continue
+        email = row[email_col].strip().lower() if len(row) > email_col else ""
+        if len(email) > 254 or not EMAIL_RE.match(email):
+            yield None
+            continue
+        name = row[name_col].strip()[:200] if name_col is not None and len(row) > name_col else ""
+        yield email, name or None
+
+
+class InvitationSender:
+    def __init__(self):
+        self.app = None
+        self.root = None
+        self.rate_per_minute = 600
+        self.chunk_size = 100
+        self.import_chunk = 1000
+        self.max_recipients = 50000
+        self.max_upload_bytes = 10 * 1024 * 1024
+        self.poll_seconds = 30
+        self._sender = DaemonThread("invitation-sender", self._run)
+        self._wake = threading.Event()
+        self._rendered = {}  # batch id -> (survey version, marker, html, text)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        self.root = config.get("INVITE_SPOOL_DIR") or os.path.join(app.instance_path, "invitations")
+        self.rate_per_minute = max(1, int(config.get("INVITE_RATE_PER_MINUTE", 600)))
+        self.chunk_size = max(1, int(config.get("INVITE_CHUNK_SIZE", 100)))
+        self.import_chunk = max(1, int(config.get("INVITE_IMPORT_CHUNK", 1000)))
+        self.max_recipients = int(config.get("INVITE_MAX_RECIPIENTS", 50000))
+        self.max_upload_bytes = int(float(config.get("INVITE_MAX_UPLOAD_MB", 10)) * 1024 * 1024)
+        self.poll_seconds = float(config.get("INVITE_POLL_SECONDS", 30))
+        # Started with the first request (after any fork), like the mail workers
+        app.before_request(self.ensure_started)
+
+    def _spool_path(self, batch_id):
+        return os.path.join(self.root, f"{batch_id}.csv")
+
+    # -----------------------------
+    # Upload
+    # -----------------------------
+    def create_batch(self, survey, user_id, upload, base_url, subject=None):
+        """Spool an uploaded CSV (a FileStorage) and queue it for import. Commits the session."""
+        from .models.invitation import InvitationBatch
+
+        batch = InvitationBatch(
+            survey_id=survey.id,
+            user_id=user_id,
+            filename=(upload.filename or "")[:255],
+            # A line break in a header would end it early (or break the message)
+            subject=" ".join((subject or f"You're invited: {survey.title}").split())[:255],
+            base_url=base_url,
+        )
+        db.session.add(batch)
+        db.session.flush()
+        path = self._spool_path(batch.id)
+        os.makedirs(self.root, exist_ok=True)
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    chunk = upload.stream.read(64 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise InvitationError(
+                            f"Recipient lists are limited to {self.max_upload_bytes // (1024 * 1024)} MB."
+                        )
+                    f.write(chunk)
+            if size == 0:
+                raise InvitationError("The uploaded file is empty.")
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self._wake.set()
+        self.ensure_started()
+        return batch
+
+    def cancel(self, batch_id):
+        """Stop a batch; invitations already handed to the outbox still go out. Commits the session."""
+        from .models.invitation import InvitationBatch, Invitation
+
+        result = db.session.execute(
+            update(InvitationBatch)
+            .where(InvitationBatch.id == batch_id, InvitationBatch.status.in_(ACTIVE_STATES))
+            .values(status="cancelled", finished_at=datetime.utcnow())
+        )
+        db.session.execute(
+            update(Invitation).where(Invitation.batch_id == batch_id, Invitation.status == "pending")
+            .values(status="cancelled")
+        )
+        db.session.commit()
+        self._rendered.pop(batch_id, None)
+        try:
+            os.remove(self._spool_path(batch_id))
+        except OSError:
+            pass
+        return result.rowcount > 0
+
+    # -----------------------------
+    # Tracking
+    # -----------------------------
+    def record_open(self, token):
+        from .models.invitation import Invitation
+
+        db.session.execute(
+            update(Invitation).where(Invitation.token == token, Invitation.opened_at.is_(None))
+            .values(opened_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def record_click(self, token):
+        """Mark the invitation clicked (and so opened); returns its survey id, or None for an unknown token."""
+        from .models.invitation import Invitation
+
+        survey_id = db.session.execute(
+            select(Invitation.survey_id).where(Invitation.token == token)
+        ).scalar_one_or_none()
+        if survey_id is None:
+            return None
+        now = datetime.utcnow()
+        db.session.execute(
+            update(Invitation).where(Invitation.token == token).values(
+                clicked_at=func.coalesce(Invitation.clicked_at, now),
+                opened_at=func.coalesce(Invitation.opened_at, now),
+            )
+        )
+        db.session.commit()
+        return survey_id
+
+    def record_completion(self, survey_id, token):
+        from .models.invitation import Invitation
+
+        db.session.execute(
+            update(Invitation)
+            .where(Invitation.token == token, Invitation.survey_id == survey_id, Invitation.completed_at.is_(None))
+            .values(completed_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def batch_stats(self, survey_id):
+        """The survey's batches, newest first, each with queued/opened/clicked/completed counts."""
+        from .models.invitation import InvitationBatch, Invitation
+
+        return db.session.execute(
+            select(
+                InvitationBatch,
+                func.count(Invitation.queued_at).label("queued"),
+                func.count(Invitation.opened_at).label("opened"),
+                func.count(Invitation.clicked_at).label("clicked"),
+                func.count(Invitation.completed_at).label("completed"),
+            )
+            .outerjoin(Invitation, Invitation.batch_id == InvitationBatch.id)
+            .where(InvitationBatch.survey_id == survey_id)
+            .group_by(InvitationBatch.id)
+            .order_by(InvitationBatch.id.desc())
+        ).all()
+
+    # -----------------------------
+    # Sender thread
+    # -----------------------------
+    def ensure_started(self):
+        self._sender.ensure_started()
+
+    def _run(self):
+        while True:
+            wait = self.poll_seconds
+            with self.app.app_context():
+                try:
+                    self.import_next()
+                    wait = min(wait, self.send_next())
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Invitation sender pass failed")
+            if wait > 0 and self._wake.wait(wait):
+                self._wake.clear()
+
+    def import_next(self):
+        """Import one uploaded batch whose spool file is on this host; returns its id or None."""
+        from .models.invitation import InvitationBatch
+
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(InvitationBatch.id).where(
+                (InvitationBatch.status == "uploaded")
+                | ((InvitationBatch.status == "importing") & (InvitationBatch.next_send_at < now))
+            ).order_by(InvitationBatch.id)
+        ).scalars().all()
+        db.session.rollback()
+        for batch_id in candidates:
+            if not os.path.exists(self._spool_path(batch_id)):
+                continue  # uploaded through another host
+            claimed = db.session.execute(
+                update(InvitationBatch)
+                .where(
+                    InvitationBatch.id == batch_id,
+                    (InvitationBatch.status == "uploaded")
+                    | ((InvitationBatch.status == "importing") & (InvitationBatch.next_send_at < now)),
+                )
+                .values(status="importing", next_send_at=now + timedelta(seconds=IMPORT_LEASE_SECONDS))
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                self._import(batch_id)
+                return batch_id
+        return None
+
+    def _import(self, batch_id):
+        from .models.invitation import InvitationBatch, Invitation
+
+        batch = db.session.get(InvitationBatch, batch_id)
+        path = self._spool_path(batch_id)
+        rows_seen = 0
+        seen = set()
+        chunk = []
+        try:
+            with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+                for recipient in parse_recipients(csv.reader(f)):
+                    rows_seen += 1
+                    if recipient is None or recipient[0] in seen or len(seen) >= self.max_recipients:
+                        continue
+                    seen.add(recipient[0])
+                    chunk.append({
+                        "batch_id": batch_id, "survey_id": batch.survey_id, "email": recipient[0],
+                        "name": recipient[1], "token": secrets.token_urlsafe(16), "status": "pending",
+                    })
+                    if len(chunk) >= self.import_chunk:
+                        self._insert(chunk)
+                        chunk = []
+            if chunk:
+                self._insert(chunk)
+        except (csv.Error, OSError) as e:
+            db.session.rollback()
+            self._finish(batch_id, "failed", f"Could not read the recipient list: {e}")
+            logger.warning("Invitation batch %s import failed: %s", batch_id, e)
+            return
+
+        imported = db.session.execute(
+            select(func.count()).select_from(Invitation).where(Invitation.batch_id == batch_id)
+        ).scalar()
+        batch.imported = imported
+        batch.skipped = rows_seen - imported
+        if imported:
+            batch.status = "sending"
+            batch.next_send_at = datetime.utcnow()
+        else:
+            batch.status = "failed"
+            batch.error = "The list has no new, valid email addresses."
+            batch.finished_at = datetime.utcnow()
+        db.session.commit()
+        os.remove(path)
+        logger.info("Invitation batch %s: %d imported, %d skipped", batch_id, imported, rows_seen - imported)
+
+    def _insert(self, rows):
+        from .models.invitation import Invitation
+
+        table = Invitation.__table__
+        stmt = _dialect_insert(table)
+        if stmt is not None:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.survey_id, table.c.email])
+        else:
+            existing = set(db.session.execute(
+                select(table.c.email).where(
+                    table.c.survey_id == rows[0]["survey_id"], table.c.email.in_([row["email"] for row in rows])
+                )
+            ).scalars())
+            rows = [row for row in rows if row["email"] not in existing]
+            stmt = insert(table)
+        if rows:
+            db.session.execute(stmt, rows)
+        db.session.commit()
+
+    def _finish(self, batch_id, status, error=None):
+        from .models.invitation import InvitationBatch
+
+        db.session.execute(
+            update(InvitationBatch).where(InvitationBatch.id == batch_id)
+            .values(status=status, error=error, finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+        self._rendered.pop(batch_id, None)
+
+    def send_next(self):
+        """Queue the next chunk of the oldest sending batch; returns seconds until another is due."""
+        from .models.invitation import InvitationBatch, Invitation
+        from .models.survey import Survey
+        from .models.user import User
+
+        now = datetime.utcnow()
+        # Holding this row's lock serializes senders across processes
+        batch = db.session.execute(
+            select(InvitationBatch).where(InvitationBatch.status == "sending")
+            .order_by(InvitationBatch.id).limit(1).with_for_update()
+        ).scalar_one_or_none()
+        if batch is None:
+            db.session.rollback()
+            return self.poll_seconds
+        if batch.next_send_at > now:
+            wait = (batch.next_send_at - now).total_seconds()
+            db.session.rollback()
+            return wait
+
+        batch_id = batch.id
+        survey = db.session.get(Survey, batch.survey_id)
+        if survey is None or not survey.published:
+            db.session.rollback()
+            self._finish(batch_id, "cancelled", "The survey is no longer published.")
+            return 0
+        recipients = db.session.execute(
+            select(Invitation.id, Invitation.email, Invitation.name, Invitation.token)
+            .where(Invitation.batch_id == batch.id, Invitation.status == "pending")
+            .order_by(Invitation.id)
+            .limit(self.chunk_size)
+        ).all()
+        if not recipients:
+            db.session.rollback()
+            self._finish(batch_id, "sent")
+            return 0
+
+        owner = db.session.get(User, batch.user_id)
+        sender = self.app.config.get("MAIL_USERNAME")
+        messages = []
+        try:
+            marker, html, text = self._template(batch, survey)
+            for invitation_id, email, name, token in recipients:
+                greeting = name or "there"
+                messages.append(email_renderer.build(
+                    batch.subject, sender, [email],
+                    html.replace(f"{marker}t", token).replace(f"{marker}n", str(escape(greeting))),
+                    text=text.replace(f"{marker}t", token).replace(f"{marker}n", greeting),
+                    reply_to=owner.email if owner else None,
+                ))
+        except Exception as e:
+            # Retrying won't help, and this batch would hold up every one behind it
+            db.session.rollback()
+            logger.exception("Invitation batch %s could not be built", batch_id)
+            self._finish(batch_id, "failed", f"Could not build the invitation: {e}")
+            return 0
+        db.session.execute(
+            update(Invitation).where(Invitation.id.in_([row.id for row in recipients]))
+            .values(status="queued", queued_at=now)
+        )
+        batch.next_send_at = now + timedelta(seconds=60.0 * len(recipients) / self.rate_per_minute)
+        mail_dispatcher.enqueue_many(messages)  # commits the batch, invitations and outbox rows together
+        return 0
+
+    def _template(self, batch, survey):
+        """(marker, html, text) for the batch, rendered once per survey version."""
+        cached = self._rendered.get(batch.id)
+        if cached is not None and cached[0] == survey.version:
+            return cached[1:]
+        # Random, URL-safe markers can't collide with anything the owner wrote
+        marker = secrets.token_hex(8)
+        with self.app.test_request_context(base_url=batch.base_url):
+            context = {
+                "survey": survey,
+                "name": f"{marker}n",
+                "invite_url": url_for("main.invitation_link", token=f"{marker}t", _external=True),
+                "open_url": url_for("main.invitation_opened", token=f"{marker}t", _external=True),
+                "logo_url": None,
+            }
+            if survey.logo_variants:
+                # JPEG: webmail and desktop clients vary in WebP support
+                context["logo_url"] = logo_pipeline.url(survey.logo_variants, 320, "jpg", external=True)
+            elif survey.logo_filename:
+                context["logo_url"] = url_for("static", filename=f"survey_logos/{survey.logo_filename}", _external=True)
+            html = email_renderer.render("invitation.html", **context)
+            text = email_renderer.render("invitation.txt", **context)
+        self._rendered[batch.id] = (survey.version, marker, html, text)
+        return marker, html, text
+
+
+invitation_sender = InvitationSender()
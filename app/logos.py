@@ -0,0 +1,325 @@
+# logos.py
+"""
+Survey logo processing.
+
+Uploads are checked (format, pixel count) and spooled in the request, then
+processed on a small per-process thread pool with Pillow: the first frame
+is rotated upright per its EXIF orientation, downscaled to fit
+LOGO_MAX_SIZE, stripped of metadata, and written as WebP and JPEG at each
+of LOGO_WIDTHS no wider than the image. Files are named
+<survey id>-<content hash>-<width>.<ext> under LOGO_DIR, so /logos/ serves
+them with a year's max-age and `immutable`; templates pick a size with
+srcset (see templates/_logo.html). When a logo is ready, the survey's
+logo_filename becomes the key (<survey id>-<content hash>) and
+logo_variants records the widths, and the version bump makes cached
+respondent pages pick it up.
+
+Files under LOGO_DIR that no survey references any more (replaced or
+removed logos, deleted surveys, abandoned uploads) are deleted by
+collect_garbage() once they are older than LOGO_GC_GRACE_SECONDS, so pages
+cached before the change still find them. It runs hourly after processing
+and as `flask logos gc`, and never looks anywhere else. Uploads from before
+this pipeline live in static/survey_logos, which is checked in; after
+`flask logos reprocess` they are removed only by an explicit
+`flask logos prune-legacy`.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import abort, send_file, url_for
+from flask.cli import AppGroup
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import select
+from werkzeug.security import safe_join
+from . import db
+
+logger = logging.getLogger(__name__)
+
+YEAR = 365 * 24 * 3600
+FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+EXTENSIONS = ("webp", "jpg")
+
+
+class LogoError(ValueError):
+    """The upload isn't an image we accept."""
+
+
+class LogoPipeline:
+    def __init__(self):
+        self.app = None
+        self.root = None
+        self.legacy_root = None
+        self.widths = (160, 320, 640)
+        self.max_size = 1280
+        self.max_upload_bytes = 5 * 1024 * 1024
+        self.webp_quality = 80
+        self.jpeg_quality = 85
+        self.gc_grace = 24 * 3600
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        self.root = config.get("LOGO_DIR") or os.path.join(app.instance_path, "logos")
+        self.legacy_root = os.path.join(app.static_folder, "survey_logos")
+        widths = config.get("LOGO_WIDTHS", self.widths)
+        if isinstance(widths, str):
+            widths = [int(w) for w in widths.split(",") if w.strip()]
+        self.widths = tuple(sorted(set(widths)))
+        self.max_size = int(config.get("LOGO_MAX_SIZE", self.max_size))
+        self.max_upload_bytes = int(float(config.get("LOGO_MAX_UPLOAD_MB", 5)) * 1024 * 1024)
+        self.webp_quality = int(config.get("LOGO_WEBP_QUALITY", self.webp_quality))
+        self.jpeg_quality = int(config.get("LOGO_JPEG_QUALITY", self.jpeg_quality))
+        self.gc_grace = int(config.get("LOGO_GC_GRACE_SECONDS", self.gc_grace))
+        self.workers = max(1, int(config.get("LOGO_WORKERS", 2)))
+        app.add_url_rule("/logos/<path:filename>", "survey_logo", self.serve)
+        app.jinja_env.globals["logo_url"] = self.url
+        app.cli.add_command(logos_cli)
+
+    def _pool(self):
+        # One pool per process; rebuilt after a fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="logo")
+            return self._executor
+
+    # -----------------------------
+    # Upload
+    # -----------------------------
+    def submit(self, survey_id, upload):
+        """Check and spool an uploaded logo (a FileStorage), then process it in the background."""
+        incoming = os.path.join(self.root, "incoming")
+        os.makedirs(incoming, exist_ok=True)
+        path = os.path.join(incoming, f"{survey_id}-{uuid.uuid4().hex}")
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    chunk = upload.stream.read(64 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise LogoError(f"Logos are limited to {self.max_upload_bytes // (1024 * 1024)} MB.")
+                    f.write(chunk)
+            # Header only: cheap, and refuses decompression bombs before any decoding
+            try:
+                with Image.open(path) as image:
+                    if image.format not in FORMATS:
+                        raise LogoError("Please upload a JPG, PNG, GIF or WebP image.")
+                    if image.width * image.height > Image.MAX_IMAGE_PIXELS:
+                        raise LogoError("That image is too large.")
+            except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+                raise LogoError("That file isn't an image we can read.")
+        except Exception:
+            os.remove(path)
+            raise
+        self._pool().submit(self._run, survey_id, path, datetime.utcnow().isoformat())
+        return path
+
+    def _run(self, survey_id, path, uploaded_at):
+        with self.app.app_context():
+            try:
+                self.process(survey_id, path, uploaded_at)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Processing logo for survey %s failed", survey_id)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+            if time.monotonic() - self._last_gc > 3600:
+                self._last_gc = time.monotonic()
+                try:
+                    self.collect_garbage()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Logo garbage collection failed")
+
+    # -----------------------------
+    # Processing
+    # -----------------------------
+    def process(self, survey_id, path, uploaded_at=None):
+        """Write the variants for the image at `path` and point the survey at them; returns the key."""
+        from .models.survey import Survey
+        from .survey_cache import survey_cache
+
+        with open(path, "rb") as f:
+            key = f"{survey_id}-{hashlib.sha256(f.read()).hexdigest()[:12]}"
+        with Image.open(path) as source:
+            source.seek(0)  # first frame of animations
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        image.info = {}  # no EXIF, ICC, comments or text chunks in the output
+        image.thumbnail((self.max_size, self.max_size), Image.LANCZOS)
+
+        widths = [w for w in self.widths if w < image.width]
+        if not widths or image.width <= self.widths[-1]:
+            widths.append(image.width)  # small images: the full width instead of an upscale
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            variant = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            self._save(variant, f"{key}-{width}.webp", "WEBP", quality=self.webp_quality, method=4)
+            if has_alpha:
+                flat = Image.new("RGB", variant.size, (255, 255, 255))
+                flat.paste(variant, mask=variant.getchannel("A"))
+                variant = flat
+            self._save(variant, f"{key}-{width}.jpg", "JPEG", quality=self.jpeg_quality,
+                       optimize=True, progressive=True)
+
+        survey = db.session.get(Survey, survey_id)
+        if survey is None:
+            return None  # deleted meanwhile; the files are garbage now
+        current = survey.logo_variants or {}
+        if uploaded_at and current.get("uploaded_at", "") > uploaded_at:
+            return None  # a later upload finished first
+        survey.logo_filename = key
+        survey.logo_variants = {
+            "key": key,
+            "widths": widths,
+            "width": image.width,
+            "height": image.height,
+            "uploaded_at": uploaded_at or datetime.utcnow().isoformat(),
+        }
+        survey.bump_version()
+        db.session.commit()
+        survey_cache.invalidate(survey_id)
+        logger.info("Logo for survey %s processed: %s at widths %s", survey_id, key, widths)
+        return key
+
+    def _save(self, image, name, format, **options):
+        path = os.path.join(self.root, name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp, format, **options)
+        os.replace(tmp, path)
+
+    # -----------------------------
+    # Serving
+    # -----------------------------
+    def url(self, variants, width, ext="jpg", external=False):
+        """URL of the variant at `width`, or the narrowest one at least that wide (else the widest)."""
+        widths = variants["widths"]
+        chosen = next((w for w in widths if w >= width), widths[-1])
+        return url_for("survey_logo", filename=f"{variants['key']}-{chosen}.{ext}", _external=external)
+
+    def serve(self, filename):
+        path = safe_join(self.root, filename)
+        if path is None or "/" in filename or filename.rsplit(".", 1)[-1] not in EXTENSIONS or not os.path.isfile(path):
+            abort(404)
+        response = send_file(path, max_age=YEAR, conditional=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    # -----------------------------
+    # Garbage collection
+    # -----------------------------
+    def collect_garbage(self):
+        """Delete files under LOGO_DIR no survey references that are older than the grace period; returns the count."""
+        from .models.survey import Survey
+
+        referenced = set(db.session.execute(
+            select(Survey.logo_filename).where(Survey.logo_filename.isnot(None))
+        ).scalars())
+        db.session.rollback()
+        cutoff = time.time() - self.gc_grace
+        removed = 0
+        for directory, key_of in (
+            (self.root, lambda name: name.rsplit("-", 1)[0]),
+            (os.path.join(self.root, "incoming"), lambda name: None),  # uploads a crash left behind
+        ):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    if not os.path.isfile(path) or key_of(name) in referenced or os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def prune_legacy(self, dry_run=False):
+        """
+        Delete files in static/survey_logos that no survey points at any more,
+        i.e. those `flask logos reprocess` has replaced. Returns their names.
+        """
+        from .models.survey import Survey
+
+        referenced = set(db.session.execute(
+            select(Survey.logo_filename).where(Survey.logo_filename.isnot(None))
+        ).scalars())
+        db.session.rollback()
+        if not os.path.isdir(self.legacy_root):
+            return []
+        pruned = []
+        for name in sorted(os.listdir(self.legacy_root)):
+            path = os.path.join(self.legacy_root, name)
+            if name in referenced or not os.path.isfile(path):
+                continue
+            if not dry_run:
+                os.remove(path)
+            pruned.append(name)
+        return pruned
+
+
+logo_pipeline = LogoPipeline()
+
+
+logos_cli = AppGroup("logos", help="Survey logo pipeline.")
+
+
+@logos_cli.command("gc")
+def gc_command():
+    """Delete processed logo files that no survey references."""
+    click.echo(f"{logo_pipeline.collect_garbage()} file(s) removed")
+
+
+@logos_cli.command("reprocess")
+def reprocess_command():
+    """Run logos uploaded before the pipeline existed through it."""
+    from .models.survey import Survey
+
+    surveys = Survey.query.filter(Survey.logo_filename.isnot(None), Survey.logo_variants.is_(None)).all()
+    for survey in surveys:
+        path = safe_join(logo_pipeline.legacy_root, survey.logo_filename)
+        if path is None or not os.path.isfile(path):
+            click.echo(f"survey {survey.id}: {survey.logo_filename} is missing")
+            continue
+        try:
+            os.makedirs(logo_pipeline.root, exist_ok=True)
+            key = logo_pipeline.process(survey.id, path)
+        except (UnidentifiedImageError, OSError) as e:
+            db.session.rollback()
+            click.echo(f"survey {survey.id}: {e}")
+            continue
+        sizes = ", ".join(
+            f"{w}w {os.path.getsize(os.path.join(logo_pipeline.root, f'{key}-{w}.webp')):,} B"
+            for w in survey.logo_variants["widths"]
+        )
+        click.echo(f"survey {survey.id}: {os.path.getsize(path):,} B original -> WebP {sizes}")
+    if surveys:
+        click.echo("The originals stay in static/survey_logos until `flask logos prune-legacy`.")
+
+
+@logos_cli.command("prune-legacy")
+@click.option("--dry-run", is_flag=True, help="Only list the files that would go.")
+def prune_legacy_command(dry_run):
+    """Delete pre-pipeline logos in static/survey_logos; run after `reprocess`."""
+    pruned = logo_pipeline.prune_legacy(dry_run=dry_run)
+    for name in pruned:
+        click.echo(name)
+    click.echo(f"{len(pruned)} file(s) {'would be ' if dry_run else ''}removed")
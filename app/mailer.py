@@ -0,0 +1,332 @@
+# mailer.py
+"""
+Queued email delivery.
+
+Messages are rendered by the caller (app/utils.py) and stored in
+mail_outbox before anything touches the network, so a restart or an SMTP
+outage never loses mail. A fixed pool of MAIL_WORKERS threads per process
+delivers them: each worker claims a batch of due rows (FOR UPDATE SKIP
+LOCKED on PostgreSQL, so several processes can share the outbox), and
+sends them over its own SMTP connection, which stays open between
+messages until it has been idle for MAIL_IDLE_SECONDS or has carried
+MAIL_MAX_PER_CONNECTION messages.
+
+Claiming a row pushes its next_attempt_at forward by MAIL_LEASE_SECONDS, so
+a worker that dies mid-send just lets the row come due again. Temporary
+failures (connection errors, 4xx replies) are retried with exponential
+backoff up to MAIL_MAX_ATTEMPTS; 5xx replies mark the message failed.
+Sent rows keep their envelope for MAIL_OUTBOX_RETENTION_DAYS but drop the
+message bytes.
+"""
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from flask_mail import sanitize_address
+from sqlalchemy import select, update, delete, func
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnection:
+    """One reusable SMTP session, opened on first use and reopened after idling or errors."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._smtp = None
+        self._last_used = 0.0
+        self._sent = 0
+
+    def _open(self):
+        s = self.settings
+        factory = smtplib.SMTP_SSL if s["use_ssl"] else smtplib.SMTP
+        smtp = factory(s["server"], s["port"], timeout=s["timeout"])
+        if s["use_tls"] and not s["use_ssl"]:
+            smtp.starttls()
+        if s["username"] and s["password"]:
+            smtp.login(s["username"], s["password"])
+        self._smtp = smtp
+        self._sent = 0
+
+    def send(self, sender, recipients, message):
+        """Send one message; returns the recipients the server refused (if only some were)."""
+        if self._smtp is not None and time.monotonic() - self._last_used > self.settings["idle_seconds"]:
+            self.close()  # servers drop idle sessions; don't find out mid-send
+        if self._smtp is None:
+            self._open()
+        try:
+            refused = self._smtp.sendmail(sender, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._open()
+            refused = self._smtp.sendmail(sender, recipients, message)
+        self._last_used = time.monotonic()
+        self._sent += 1
+        if self._sent >= self.settings["max_per_connection"]:
+            self.close()
+        return refused
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.settings["idle_seconds"]:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self._smtp.close()
+            except OSError:
+                pass
+        self._smtp = None
+
+
+def _is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException) and not isinstance(error, smtplib.SMTPAuthenticationError):
+        return error.smtp_code >= 500
+    return False
+
+
+class MailDispatcher:
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.batch_size = 20
+        self.poll_seconds = 30
+        self.settings = {}
+        self._threads = []
+        self._pid = None
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        self.workers = max(1, int(config.get("MAIL_WORKERS", 2)))
+        self.batch_size = max(1, int(config.get("MAIL_BATCH_SIZE", 20)))
+        self.poll_seconds = float(config.get("MAIL_POLL_SECONDS", 30))
+        self.lease_seconds = int(config.get("MAIL_LEASE_SECONDS", 300))
+        self.max_attempts = int(config.get("MAIL_MAX_ATTEMPTS", 8))
+        self.retry_base = float(config.get("MAIL_RETRY_BASE_SECONDS", 30))
+        self.retry_max = float(config.get("MAIL_RETRY_MAX_SECONDS", 3600))
+        self.retention_days = int(config.get("MAIL_OUTBOX_RETENTION_DAYS", 30))
+        self.suppress = bool(config.get("MAIL_SUPPRESS_SEND", app.testing))
+        self.settings = {
+            "server": config.get("MAIL_SERVER", "localhost"),
+            "port": int(config.get("MAIL_PORT", 25)),
+            "use_tls": bool(config.get("MAIL_USE_TLS")),
+            "use_ssl": bool(config.get("MAIL_USE_SSL")),
+            "username": config.get("MAIL_USERNAME"),
+            "password": config.get("MAIL_PASSWORD"),
+            "timeout": float(config.get("MAIL_TIMEOUT", 30)),
+            "idle_seconds": float(config.get("MAIL_IDLE_SECONDS", 60)),
+            "max_per_connection": int(config.get("MAIL_MAX_PER_CONNECTION", 100)),
+        }
+        app.cli.add_command(mail_cli)
+        # Workers start with the first request (after any fork), so mail
+        # queued before a restart goes out without waiting for new mail
+        app.before_request(self.ensure_started)
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def enqueue(self, msg):
+        """Store a flask_mail Message in the outbox and wake a worker. Commits the session."""
+        return self.enqueue_many([msg])[0]
+
+    def enqueue_many(self, messages):
+        """
+        Store several Messages in one commit, which also commits whatever the
+        caller changed in the session, so both land together or not at all.
+        """
+        from .models.mail import OutboxMessage
+
+        default_sender = self.app.config.get("MAIL_DEFAULT_SENDER")
+        rows = [
+            OutboxMessage(
+                sender=sanitize_address(msg.sender or default_sender),
+                recipients=sorted(sanitize_address(address) for address in msg.send_to),
+                subject=(msg.subject or "")[:255],
+                message=msg.as_bytes(),
+            )
+            for msg in messages
+        ]
+        db.session.add_all(rows)
+        db.session.flush()
+        ids = [row.id for row in rows]  # read before commit expires them
+        db.session.commit()
+        self._wake.set()
+        self.ensure_started()
+        return ids
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+    def ensure_started(self):
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._threads = []  # threads don't survive a fork
+                self._pid = os.getpid()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"mail-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        connection = SMTPConnection(self.settings)
+        while True:
+            with self.app.app_context():
+                try:
+                    delivered = self.deliver_due(connection)
+                    self._prune()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Mail worker pass failed")
+                    delivered = 0
+            if delivered >= self.batch_size:
+                self._wake.set()  # probably more waiting; let the others help
+                continue
+            connection.close_if_idle()
+            if self._wake.wait(self.poll_seconds):
+                self._wake.clear()
+
+    def _claim(self, limit):
+        from .models.mail import OutboxMessage
+
+        now = datetime.utcnow()
+        with self._claim_lock:  # SQLite has no row locks; keep this process's workers apart
+            rows = db.session.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            claimed = []
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+                claimed.append((row.id, row.sender, list(row.recipients), bytes(row.message), row.attempts))
+            db.session.commit()
+        return claimed
+
+    def deliver_due(self, connection, limit=None):
+        """Claim and send one batch of due messages; returns how many were claimed."""
+        claimed = self._claim(limit or self.batch_size)
+        for message_id, sender, recipients, message, attempts in claimed:
+            try:
+                if self.suppress:
+                    refused = {}
+                else:
+                    refused = connection.send(sender, recipients, message)
+            except (smtplib.SMTPException, OSError) as e:
+                if not isinstance(e, smtplib.SMTPResponseException) or isinstance(e, smtplib.SMTPAuthenticationError):
+                    connection.close()  # the session is in an unknown state
+                self._failed(message_id, attempts, e)
+                continue
+            if refused:
+                logger.warning("Mail %s: recipients refused: %s", message_id, refused)
+            self._sent(message_id)
+        return len(claimed)
+
+    def _sent(self, message_id):
+        from .models.mail import OutboxMessage
+
+        db.session.execute(
+            update(OutboxMessage).where(OutboxMessage.id == message_id)
+            .values(status="sent", sent_at=datetime.utcnow(), message=b"", last_error=None)
+        )
+        db.session.commit()
+
+    def _failed(self, message_id, attempts, error):
+        from .models.mail import OutboxMessage
+
+        values = {"last_error": f"{type(error).__name__}: {error}"[:2000]}
+        if _is_permanent(error) or attempts >= self.max_attempts:
+            values["status"] = "failed"
+            logger.error("Mail %s failed permanently after %d attempt(s): %s", message_id, attempts, error)
+        else:
+            delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            values["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning("Mail %s attempt %d failed (%s); retrying in %.0fs", message_id, attempts, error, delay)
+        db.session.execute(update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values))
+        db.session.commit()
+
+    def _prune(self):
+        from .models.mail import OutboxMessage
+
+        if self.retention_days <= 0 or time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        db.session.execute(
+            delete(OutboxMessage).where(OutboxMessage.status == "sent", OutboxMessage.sent_at < cutoff)
+        )
+        db.session.commit()
+
+    def counts(self):
+        from .models.mail import OutboxMessage
+
+        rows = db.session.execute(
+            select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+        ).all()
+        return {status: count for status, count in rows}
+
+
+mail_dispatcher = MailDispatcher()
+
+
+mail_cli = AppGroup("mail", help="Outgoing mail queue.")
+
+
+@mail_cli.command("status")
+def status_command():
+    """Show outbox counts by status."""
+    counts = mail_dispatcher.counts()
+    for status in ("pending", "sent", "failed"):
+        click.echo(f"{status}: {counts.get(status, 0)}")
+
+
+@mail_cli.command("send")
+def send_command():
+    """Deliver everything that is due now, in this process."""
+    connection = SMTPConnection(mail_dispatcher.settings)
+    total = 0
+    try:
+        while True:
+            claimed = mail_dispatcher.deliver_due(connection)
+            total += claimed
+            if claimed < mail_dispatcher.batch_size:
+                break
+    finally:
+        connection.close()
+    click.echo(f"{total} message(s) processed")
+
+
+@mail_cli.command("retry")
+def retry_command():
+    """Move failed messages back to pending."""
+    from .models.mail import OutboxMessage
+
+    result = db.session.execute(
+        update(OutboxMessage).where(OutboxMessage.status == "failed", OutboxMessage.message != b"")
+        .values(status="pending", attempts=0, next_attempt_at=datetime.utcnow())
+    )
+    db.session.commit()
+    click.echo(f"{result.rowcount} message(s) requeued")
@@ -0,0 +1,233 @@
+# metrics.py
+"""
+Request and SQL instrumentation, exported as Prometheus text on /metrics.
+
+Every request is timed per endpoint (the route name, so URLs with ids don't
+explode the label set) into a latency histogram. SQLAlchemy cursor events
+count and time every statement; the totals are attributed to the request
+that ran them and recorded per endpoint, and any statement slower than
+SLOW_QUERY_MS is logged (statement text only, never parameters). Responses
+carry a Server-Timing header with the same numbers for browser dev tools.
+
+The cost per request is a few perf_counter() calls and one short lock per
+histogram update, so it is meant to stay on in production. Metrics are per
+process: under gunicorn each worker serves its own numbers, so scrape them
+individually or aggregate with sum() by instance.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, g, has_app_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {} if labels else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+def sample_lines(name, help, samples, kind="gauge"):
+    """Exposition lines for a collected metric: samples is {(("label", value), ...): number} or one number."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    if not isinstance(samples, dict):
+        samples = {(): samples}
+    for labels, value in sorted(samples.items()):
+        lines.append(f"{name}{_labels([k for k, _ in labels], [v for _, v in labels])} {_number(value)}")
+    return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.slow_query_seconds = 0.5
+        self.token = None
+        self._collectors = []
+        self.requests = Counter("surveyzim_requests_total", "HTTP requests handled.", ("endpoint", "method", "status"))
+        self.latency = Histogram("surveyzim_request_duration_seconds", "Request latency.", ("endpoint", "method"))
+        self.request_statements = Histogram(
+            "surveyzim_request_sql_statements", "SQL statements executed per request.", ("endpoint",),
+            STATEMENT_BUCKETS,
+        )
+        self.request_sql_time = Histogram(
+            "surveyzim_request_sql_duration_seconds", "Time spent in SQL per request.", ("endpoint",)
+        )
+        self.statements = Histogram("surveyzim_sql_statement_duration_seconds", "SQL statement latency.")
+        self.slow_statements = Counter("surveyzim_sql_slow_statements_total", "Statements slower than SLOW_QUERY_MS.")
+
+    def init_app(self, app, db):
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+        self.slow_query_seconds = float(app.config.get("SLOW_QUERY_MS", 500)) / 1000.0
+        self.token = app.config.get("METRICS_TOKEN")
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self._endpoint)
+        with app.app_context():
+            for engine in db.engines.values():  # the primary and any read replica
+                event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self.register_collector(_cache_and_queue_samples)
+
+    def register_collector(self, collect):
+        """Add a callable returning extra exposition lines (see sample_lines) to /metrics."""
+        self._collectors.append(collect)
+
+    # -----------------------------
+    # Hooks
+    # -----------------------------
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_sql = [0, 0.0]
+
+    def _after_request(self, response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        statements, sql_seconds = g.pop("_metrics_sql", (0, 0.0))
+        endpoint = request.endpoint or "unmatched"
+        self.requests.inc(endpoint, request.method, str(response.status_code))
+        self.latency.observe(elapsed, endpoint, request.method)
+        self.request_statements.observe(statements, endpoint)
+        self.request_sql_time.observe(sql_seconds, endpoint)
+        response.headers.add(
+            "Server-Timing",
+            f'app;dur={elapsed * 1000:.1f}, db;dur={sql_seconds * 1000:.1f};desc="{statements} queries"',
+        )
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["_metrics_started"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.statements.observe(elapsed)
+        if has_app_context():
+            totals = g.get("_metrics_sql")
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.slow_statements.inc()
+            logger.warning("Slow query (%.0f ms): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+    # -----------------------------
+    # Exposition
+    # -----------------------------
+    def expose(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.request_statements, self.request_sql_time,
+                       self.statements, self.slow_statements):
+            lines.extend(metric.expose())
+        for collect in self._collectors:
+            try:
+                lines.extend(collect())
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return "\n".join(lines) + "\n"
+
+    def _endpoint(self):
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            abort(401)
+        return Response(self.expose(), mimetype="text/plain; version=0.0.4")
+
+
+metrics = Metrics()
+
+
+def _cache_and_queue_samples():
+    from .assets import asset_pipeline
+    from .ingestion import ingestor
+    from .mailer import mail_dispatcher
+    from .page_cache import page_cache
+    from .survey_cache import survey_cache
+
+    ingest = ingestor.snapshot()
+    caches = {"survey": survey_cache.stats(), "page": page_cache.stats()}
+    return (
+        sample_lines("surveyzim_ingest_queue_depth", "Responses waiting for the ingest flusher.", ingest["queue_depth"])
+        + sample_lines("surveyzim_ingest_flushed_total", "Responses written by the ingest flusher.",
+                       ingest["flushed"], "counter")
+        + sample_lines("surveyzim_ingest_spooled_total", "Responses spooled to disk.", ingest["spooled"], "counter")
+        + sample_lines("surveyzim_ingest_dead_lettered_total", "Responses the database rejected.",
+                       ingest["dead_lettered"], "counter")
+        + sample_lines("surveyzim_mail_outbox_messages", "Outbox messages by status.",
+                       {(("status", status),): count for status, count in mail_dispatcher.counts().items()})
+        + sample_lines("surveyzim_cache_hits_total", "Cache hits.",
+                       {(("cache", name),): stats["hits"] for name, stats in caches.items()}, "counter")
+        + sample_lines("surveyzim_cache_misses_total", "Cache misses.",
+                       {(("cache", name),): stats["misses"] for name, stats in caches.items()}, "counter")
+        + sample_lines("surveyzim_compression_input_bytes_total", "Dynamic response bytes before gzip.",
+                       asset_pipeline.dynamic["bytes_in"], "counter")
+        + sample_lines("surveyzim_compression_output_bytes_total", "Dynamic response bytes after gzip.",
+                       asset_pipeline.dynamic["bytes_out"], "counter")
+    )
@@ -0,0 +1,42 @@
+from datetime import datetime
+from .. import db  # import the same db instance from app/__init__.py
+
+class InvitationBatch(db.Model):
+    """One uploaded recipient list for a survey; see app/invitations.py"""
+    __tablename__ = "invitation_batch"
+
+    id = db.Column(db.Integer, primary_key=True)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    status = db.Column(db.String(12), nullable=False, default="uploaded")  # uploaded, importing, sending, sent, cancelled, failed
+    filename = db.Column(db.String(255))
+    subject = db.Column(db.String(255), nullable=False)
+    base_url = db.Column(db.String(500), nullable=False)  # host the invitation links point at
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)  # invalid, duplicate or over the limit
+    next_send_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # rate limit; also the import lease
+    error = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime)
+
+class Invitation(db.Model):
+    """One recipient of a batch; the token attributes opens, clicks and completions"""
+    __tablename__ = "invitation"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey("invitation_batch.id", ondelete="CASCADE"), nullable=False)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False)
+    email = db.Column(db.String(254), nullable=False)
+    name = db.Column(db.String(200))
+    token = db.Column(db.String(32), nullable=False, unique=True)
+    status = db.Column(db.String(10), nullable=False, default="pending")  # pending, queued, cancelled
+    queued_at = db.Column(db.DateTime)
+    opened_at = db.Column(db.DateTime)
+    clicked_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # A re-uploaded list never invites the same address to a survey twice
+        db.UniqueConstraint("survey_id", "email", name="uq_invitation_survey_email"),
+        db.Index("ix_invitation_batch_status", "batch_id", "status", "id"),
+    )
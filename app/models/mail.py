@@ -0,0 +1,22 @@
+from datetime import datetime
+from .. import db  # import the same db instance from app/__init__.py
+
+class OutboxMessage(db.Model):
+    """Outgoing email, stored before delivery so it survives restarts; see app/mailer.py"""
+    __tablename__ = "mail_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    status = db.Column(db.String(10), nullable=False, default="pending")  # pending, sent, failed
+    sender = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)  # envelope recipients
+    subject = db.Column(db.String(255))
+    message = db.Column(db.LargeBinary, nullable=False)  # RFC 5322 bytes; emptied once sent
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # also the claim lease
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_mail_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
@@ -1,6 +1,7 @@
 from datetime import datetime
 import json
 from slugify import slugify
+from sqlalchemy.dialects.postgresql import JSONB
 from .. import db  # import the same db instance from app/__init__.py
 
 class Survey(db.Model):
@@ -20,9 +21,15 @@ class Survey(db.Model):
     distribution_days = db.Column(db.Integer, default=0)  # How many days the survey is distributed
     max_responses = db.Column(db.Integer, default=0)      # Max allowed responses
     logo_filename = db.Column(db.String(255))
+    logo_variants = db.Column(db.JSON)  # Processed sizes (app/logos.py); None for logos from before the pipeline
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped whenever respondent-facing content changes
 
     questions = db.relationship("Question", backref="survey", lazy=True, cascade="all, delete-orphan")
     responses = db.relationship("SurveyResponse", backref="survey_responses", lazy=True)
+
+    __table_args__ = (
+        db.Index("ix_survey_user_created", "user_id", "created_at", "id"),
+    )
     
     def generate_slug(self):
         """Generate a unique slug based on the survey title"""
@@ -34,11 +41,15 @@ class Survey(db.Model):
             counter += 1
         self.slug = slug
 
+    def bump_version(self):
+        """Mark cached respondent-facing copies of this survey as stale"""
+        self.version = (self.version or 0) + 1
+
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.Text, nullable=False)
     qtype = db.Column(db.String(50), nullable=False)  # short, paragraph, multiple_choice, checkbox, dropdown, linear_scale
-    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id"))
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id"), index=True)
     word_count = db.Column(db.Integer, default=0)  # Word count of the question
     required = db.Column(db.Boolean, default=False)
     
@@ -55,23 +66,129 @@ class QuestionOption(db.Model):
     text = db.Column(db.String(200), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey("question.id"))
 
+class SurveyResponseCounter(db.Model):
+    """Sharded response counter; a survey's total is the sum of its shard rows"""
+    __tablename__ = "survey_response_counter"
+
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class QuestionTally(db.Model):
+    """Sharded running per-question totals: respondents, and value sum / sum of squares for scales"""
+    __tablename__ = "question_tally"
+
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True)
+    answered = db.Column(db.BigInteger, nullable=False, default=0)
+    value_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    value_sum_sq = db.Column(db.BigInteger, nullable=False, default=0)
+
+class AnswerTally(db.Model):
+    """Sharded running count per (question, option id or scale value)"""
+    __tablename__ = "answer_tally"
+
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), primary_key=True)
+    value = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ResponseRollup(db.Model):
+    """Responses per survey per time bucket (hourly, compacted to daily after a retention window)"""
+    __tablename__ = "response_rollup"
+
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True)
+    bucket_seconds = db.Column(db.Integer, primary_key=True)  # 3600 or 86400
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class TextIndexTerm(db.Model):
+    """Inverted-index entry for one term of a short/paragraph question; postings are delta-encoded varints"""
+    __tablename__ = "text_index_term"
+
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), primary_key=True)
+    term = db.Column(db.String(64), primary_key=True)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True)
+    doc_count = db.Column(db.Integer, nullable=False, default=0)  # responses containing the term
+    term_count = db.Column(db.Integer, nullable=False, default=0)  # total occurrences
+    last_response_id = db.Column(db.Integer, nullable=False, default=0)
+    postings = db.Column(db.LargeBinary, nullable=False, default=b"")
+
+    __table_args__ = (
+        db.Index("ix_text_index_term_question_doc_count", "question_id", "doc_count"),
+    )
+
+class TextIndexState(db.Model):
+    """How far each survey's text answers have been indexed"""
+    __tablename__ = "text_index_state"
+
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True)
+    indexed_through = db.Column(db.Integer, nullable=False, default=0)  # highest response id indexed
+
+class SurveySketch(db.Model):
+    """Serialized approximate-analytics sketch (HyperLogLog or count-min) for one survey"""
+    __tablename__ = "survey_sketch"
+
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True)
+    name = db.Column(db.String(32), primary_key=True)  # "respondents" or "terms:<question_id>"
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class SurveyResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), nullable=False)
     respondent_ip = db.Column(db.String(50))
     respondent_info = db.Column(db.Text)  # Could store browser, location, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    responses = db.Column(db.Text)  # Store responses as JSON string
+    responses = db.Column(db.JSON().with_variant(JSONB(), "postgresql"))  # JSONB on Postgres, GIN indexed
     
     # Relationship to survey
     survey = db.relationship('Survey', backref=db.backref('survey_responses', lazy=True))
     
     def set_responses(self, responses_dict):
-        """Convert responses dictionary to JSON string for storage"""
-        self.responses = json.dumps(responses_dict)
-    
-    def get_responses(self):
-        """Convert JSON string back to dictionary"""
-        return json.loads(self.responses) if self.responses else {}    
+        """Store the responses dictionary; the column type handles serialisation"""
+        self.responses = responses_dict
     
-    
\ No newline at end of file
+    def get_responses(self, compiled=None):
+        """Return the responses dictionary, expanding compact (v2) answers"""
+        from ..response_codec import decode_responses, is_compact, definition_for
+        data = self.responses or {}
+        if isinstance(data, str):  # rows written before the JSONB migration
+            data = json.loads(data)
+        if is_compact(data):
+            data = decode_responses(data, compiled or definition_for(self.survey_id))
+        return data
+
+    @classmethod
+    def answered(cls, question, value):
+        """
+        Containment filter for responses where `question` (a CompiledQuestion)
+        was answered with `value` (option text or id, or scale value), served
+        by the GIN index. Used for cross-tab segments (crosstab.segment).
+        """
+        from ..response_codec import encode_answer
+        encoded = encode_answer(question, [value] if question.qtype == "checkbox" else value)
+        return db.type_coerce(cls.responses, JSONB).contains({"a": {str(question.id): encoded}})
+
+class Answer(db.Model):
+    """One row per answered question (one per selected option for checkboxes)"""
+    __tablename__ = "answer"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    response_id = db.Column(db.Integer, db.ForeignKey("survey_response.id", ondelete="CASCADE"), nullable=False)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), nullable=False)
+    option_id = db.Column(db.Integer, db.ForeignKey("question_option.id", ondelete="SET NULL"))
+    numeric_value = db.Column(db.Integer)
+    text_value = db.Column(db.Text)
+
+    __table_args__ = (
+        # Per-option tallies and "respondents who picked X" joins are index-only
+        db.Index("ix_answer_question_option_response", "question_id", "option_id", "response_id"),
+        db.Index("ix_answer_question_numeric", "question_id", "numeric_value"),
+        db.Index("ix_answer_response_question", "response_id", "question_id"),
+        db.Index("ix_answer_survey_question", "survey_id", "question_id"),
+    )
+
@@ -0,0 +1,158 @@
+# page_cache.py
+"""
+Pre-rendered respondent pages.
+
+A published survey's take_survey page is identical for every anonymous
+respondent, so it is rendered once per (survey, version) and kept as bytes
+with its strong ETag (a hash of the body): in a per-process LRU and, so
+restarts and sibling workers skip the render too, as a file under
+PAGE_CACHE_DIR. Any change respondents can see bumps Survey.version, which
+changes the key; the survey cache (survey_cache.py) notices the bump.
+
+Keys also include a fingerprint of the templates involved and of the asset
+manifest, so a deploy that changes them never serves HTML rendered by (or
+linking the assets of) the old ones. Each entry also holds the page
+precompressed with every encoding assets.encodings() offers, built once per
+version, so serving it never compresses anything.
+
+Requests that would render differently (a signed-in user's navigation, a
+pending flash message) and the owner's preview bypass the cache. Both of
+those ride in cookies, so only cookieless requests get the shared page,
+and it goes out without Vary: Cookie (Flask adds that whenever anything,
+Flask-Login's hooks included, reads the session).
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from flask import g
+from flask.sessions import SecureCookieSessionInterface
+
+from .assets import asset_pipeline, compress, encodings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = ("take_survey.html", "layout.html", "_logo.html")
+
+
+class SharedPageSessionInterface(SecureCookieSessionInterface):
+    """Leaves Vary: Cookie off responses the view marked shared (see PageCache.share)."""
+
+    def save_session(self, app, session, response):
+        if g.get("_page_cache_shared") and not session and not session.modified:
+            session.accessed = False
+        super().save_session(app, session, response)
+
+
+class PageCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.root = None
+        self.max_age = 60
+        self.fingerprint = ""
+        self._entries = OrderedDict()  # (survey_id, version) -> (etag, {encoding or None: body})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_entries = max(1, int(app.config.get("PAGE_CACHE_SIZE", self.max_entries)))
+        self.max_age = int(app.config.get("PAGE_CACHE_MAX_AGE", self.max_age))
+        if app.config.get("PAGE_CACHE_DISK", True):
+            self.root = app.config.get("PAGE_CACHE_DIR") or os.path.join(app.instance_path, "pages")
+        digest = hashlib.sha256()
+        for name in TEMPLATES:
+            source, _, _ = app.jinja_loader.get_source(app.jinja_env, name)
+            digest.update(source.encode("utf-8"))
+        digest.update(asset_pipeline.digest.encode("utf-8"))
+        self.fingerprint = digest.hexdigest()[:12]
+        app.session_interface = SharedPageSessionInterface()
+
+    def _path(self, survey_id, version):
+        return os.path.join(self.root, f"{survey_id}-{version}-{self.fingerprint}.html")
+
+    def get(self, compiled, render):
+        """(etag, {encoding or None: body}) for the survey's page, calling render() -> str only on a miss."""
+        key = (compiled.id, compiled.version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        body = self._read(compiled)
+        if body is None:
+            body = render().encode("utf-8")
+            self._write(compiled, body)
+        variants = {None: body}
+        for encoding in encodings():
+            variants[encoding] = compress(body, encoding)
+        entry = (hashlib.sha256(body).hexdigest(), variants)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _read(self, compiled):
+        if self.root is None:
+            return None
+        try:
+            with open(self._path(compiled.id, compiled.version), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, compiled, body):
+        if self.root is None:
+            return
+        path = self._path(compiled.id, compiled.version)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+            # Older versions of this survey's page can never be served again
+            prefix = f"{compiled.id}-"
+            for name in os.listdir(self.root):
+                if name.startswith(prefix) and name.endswith(".html") and name != os.path.basename(path):
+                    os.remove(os.path.join(self.root, name))
+        except OSError:
+            logger.exception("Could not write cached page for survey %s", compiled.id)
+
+    @staticmethod
+    def share(response):
+        """Mark the response as the same for everyone; call only for cookieless requests."""
+        g._page_cache_shared = True
+        response.cache_control.public = True
+        return response
+
+    def invalidate(self, survey_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == survey_id]:
+                del self._entries[key]
+        if self.root is None:
+            return
+        try:
+            for name in os.listdir(self.root):
+                if name.startswith(f"{survey_id}-") and name.endswith(".html"):
+                    os.remove(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+page_cache = PageCache()
@@ -0,0 +1,116 @@
+# response_codec.py
+"""
+Compact, versioned encoding for SurveyResponse.responses.
+
+Version 1 (legacy) repeats the question text and type inside every answer:
+
+    {"12": {"question_text": "...", "question_type": "checkbox", "response": ["A", "C"]}}
+
+Version 2 keys answers by question id and stores only the value, with
+choice answers as option ids and scale answers as ints. Unanswered
+questions are omitted:
+
+    {"v": 2, "a": {"12": [301, 303], "13": 4, "14": "free text"}}
+
+decode_responses() turns either version back into the legacy shape, so
+callers such as the CSV export keep working unchanged. Answers that don't
+match a known option (or scale value) are kept as plain strings.
+"""
+
+ENCODING_VERSION = 2
+
+CHOICE_TYPES = ("multiple_choice", "dropdown")
+OPTION_TYPES = ("multiple_choice", "dropdown", "checkbox")
+
+
+def is_compact(blob):
+    return isinstance(blob, dict) and blob.get("v") == ENCODING_VERSION
+
+
+def _encode_scale(question, value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return value
+    if question.linear_scale_low <= number <= question.linear_scale_high:
+        return number
+    return value
+
+
+def encode_responses(compiled, raw):
+    """
+    Encode raw form answers for a CompiledSurvey.
+
+    `raw` maps question id to the submitted value: a string (or None) for
+    most types, a list of strings for checkboxes.
+    """
+    answers = {}
+    for question in compiled.questions:
+        value = raw.get(question.id)
+        if value is None or value == "" or value == []:
+            continue
+        answers[str(question.id)] = encode_answer(question, value)
+    return {"v": ENCODING_VERSION, "a": answers}
+
+
+def encode_answer(question, value):
+    """Encode one submitted value for a CompiledQuestion."""
+    if question.qtype in CHOICE_TYPES:
+        return question.option_ids.get(value, value)
+    if question.qtype == "checkbox":
+        ids = question.option_ids
+        return [ids.get(item, item) for item in value]
+    if question.qtype == "linear_scale":
+        return _encode_scale(question, value)
+    return value
+
+
+def decode_answer(question, value):
+    """Turn one stored v2 value back into what the respondent submitted."""
+    if value is None:
+        return None
+    if question.qtype in OPTION_TYPES:
+        texts = question.option_texts
+        if question.qtype == "checkbox":
+            return [texts.get(item, item) if isinstance(item, int) else item for item in value]
+        return texts.get(value, value) if isinstance(value, int) else value
+    if question.qtype == "linear_scale" and isinstance(value, int):
+        return str(value)
+    return value
+
+
+def decode_responses(blob, compiled):
+    """Return the legacy {question_id: {question_text, question_type, response}} shape."""
+    if not is_compact(blob):
+        return blob or {}
+    answers = blob.get("a", {})
+    decoded = {}
+    for question in compiled.questions:
+        decoded[str(question.id)] = {
+            "question_text": question.text,
+            "question_type": question.qtype,
+            "response": decode_answer(question, answers.get(str(question.id))),
+        }
+    return decoded
+
+
+def decode_values(blob, compiled):
+    """Answers in compiled.questions order, for either version; used by the CSV export."""
+    if is_compact(blob):
+        answers = blob.get("a", {})
+        return [decode_answer(q, answers.get(str(q.id))) for q in compiled.questions]
+    blob = blob or {}
+    return [(blob.get(str(q.id)) or {}).get("response") for q in compiled.questions]
+
+
+def definition_for(survey_id):
+    """CompiledSurvey for decoding, from the cache or (for drafts) the database."""
+    from .survey_cache import survey_cache, compile_survey
+    from .models.survey import Survey
+    from . import db
+
+    compiled = survey_cache.get_by_id(survey_id)
+    if compiled is not None:
+        return compiled
+    survey = db.session.get(Survey, survey_id)
+    return compile_survey(survey) if survey is not None else None
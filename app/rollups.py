@@ -0,0 +1,215 @@
+# rollups.py
+"""
+Time-bucketed response counts.
+
+Every stored response adds 1 to its survey's hourly bucket in
+response_rollup, in the submit transaction (the buffered ingestor folds a
+whole batch into one upsert per survey and hour). Hourly buckets older than
+ROLLUP_HOURLY_RETENTION_HOURS are compacted into daily buckets by a
+background pass (and `flask rollups compact`), so a survey keeps at most a
+week or so of hourly rows plus one row per day.
+
+series() answers "responses per hour/day between start and end" for many
+surveys from these rows alone, without touching survey_response. Ranges
+that have already been compacted only have daily resolution; asking for
+hours there puts the whole day's count in its first hour.
+"""
+import logging
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, delete, bindparam
+from . import db
+from .counters import upsert_add
+from .workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+GRANULARITIES = {"hour": HOUR, "day": DAY}
+
+
+def bucket_start(moment, seconds):
+    """Floor a naive UTC datetime to its hour or day bucket."""
+    if seconds == DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def record_many(events):
+    """Add (survey_id, created_at) events to their hourly buckets, in the caller's transaction."""
+    from .models.survey import ResponseRollup
+
+    buckets = {}
+    for survey_id, created_at in events:
+        key = (survey_id, bucket_start(created_at or datetime.utcnow(), HOUR))
+        buckets[key] = buckets.get(key, 0) + 1
+    for (survey_id, start), count in sorted(buckets.items()):
+        upsert_add(
+            ResponseRollup.__table__,
+            {"survey_id": survey_id, "bucket_seconds": HOUR, "bucket_start": start},
+            {"count": count},
+        )
+    compactor.ensure_started()
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def series(survey_ids, start, end, granularity="day"):
+    """
+    Zero-filled counts per bucket in [start, end) for each survey.
+
+    Returns (bucket_starts, {survey_id: [count, ...]}).
+    """
+    from .models.survey import ResponseRollup
+
+    seconds = GRANULARITIES[granularity]
+    start = bucket_start(start, seconds)
+    buckets = []
+    moment = start
+    while moment < end:
+        buckets.append(moment)
+        moment += timedelta(seconds=seconds)
+    positions = {moment: i for i, moment in enumerate(buckets)}
+
+    survey_ids = list(survey_ids)
+    counts = {survey_id: [0] * len(buckets) for survey_id in survey_ids}
+    if not survey_ids or not buckets:
+        return buckets, counts
+
+    rows = db.session.execute(
+        select(ResponseRollup.survey_id, ResponseRollup.bucket_seconds,
+               ResponseRollup.bucket_start, ResponseRollup.count)
+        .where(ResponseRollup.survey_id.in_(survey_ids),
+               ResponseRollup.bucket_start >= bucket_start(start, DAY),
+               ResponseRollup.bucket_start < end)
+    )
+    for survey_id, row_seconds, row_start, count in rows:
+        target = bucket_start(row_start, seconds) if row_seconds <= seconds else row_start
+        if target < start:
+            if row_seconds <= seconds:
+                continue
+            target = start  # a compacted day that began before the window
+        position = positions.get(target)
+        if position is not None:
+            counts[survey_id][position] += count
+    return buckets, counts
+
+
+# -----------------------------
+# Compaction
+# -----------------------------
+def compact(retention_hours=None, now=None):
+    """Fold hourly buckets older than the retention window into daily ones. Returns rows folded."""
+    from flask import current_app
+    from .models.survey import ResponseRollup
+
+    if retention_hours is None:
+        retention_hours = int(current_app.config.get("ROLLUP_HOURLY_RETENTION_HOURS", 168))
+    # Only whole days are compacted, so a day never has both kinds of bucket
+    cutoff = bucket_start((now or datetime.utcnow()) - timedelta(hours=retention_hours), DAY)
+
+    table = ResponseRollup.__table__
+    hourly = db.session.execute(
+        select(table.c.survey_id, table.c.bucket_start, table.c.count)
+        .where(table.c.bucket_seconds == HOUR, table.c.bucket_start < cutoff)
+        .with_for_update()
+    ).all()
+    if not hourly:
+        db.session.rollback()
+        return 0
+
+    daily = {}
+    for survey_id, start, count in hourly:
+        key = (survey_id, bucket_start(start, DAY))
+        daily[key] = daily.get(key, 0) + count
+    for (survey_id, start), count in sorted(daily.items()):
+        upsert_add(table, {"survey_id": survey_id, "bucket_seconds": DAY, "bucket_start": start}, {"count": count})
+    # Delete exactly the rows that were folded; anything inserted since is left for next time
+    db.session.execute(
+        delete(table).where(
+            table.c.survey_id == bindparam("sid"),
+            table.c.bucket_seconds == HOUR,
+            table.c.bucket_start == bindparam("start"),
+        ),
+        [{"sid": survey_id, "start": start} for survey_id, start, _ in hourly],
+    )
+    db.session.commit()
+    return len(hourly)
+
+
+def rebuild(survey_id=None, batch_size=5000):
+    """Recompute rollups from survey_response.created_at (for data stored before they existed)."""
+    from .models.survey import ResponseRollup, SurveyResponse
+
+    wipe = delete(ResponseRollup)
+    stmt = (
+        select(SurveyResponse.survey_id, SurveyResponse.created_at)
+        .where(SurveyResponse.created_at.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    if survey_id is not None:
+        wipe = wipe.where(ResponseRollup.survey_id == survey_id)
+        stmt = stmt.where(SurveyResponse.survey_id == survey_id)
+
+    db.session.execute(wipe)
+    buckets = {}
+    for sid, created_at in db.session.execute(stmt):
+        key = (sid, bucket_start(created_at, HOUR))
+        buckets[key] = buckets.get(key, 0) + 1
+    if buckets:
+        db.session.execute(ResponseRollup.__table__.insert(), [
+            {"survey_id": sid, "bucket_seconds": HOUR, "bucket_start": start, "count": count}
+            for (sid, start), count in buckets.items()
+        ])
+    db.session.commit()
+    return sum(buckets.values())
+
+
+class RollupCompactor(PeriodicWorker):
+    """Background thread running compact() every ROLLUP_COMPACT_SECONDS."""
+
+    thread_name = "rollup-compactor"
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = int(app.config.get("ROLLUP_COMPACT_SECONDS", 0))
+        app.cli.add_command(rollups_cli)
+
+    def tick(self):
+        with self.app.app_context():
+            try:
+                folded = compact()
+                if folded:
+                    logger.info("Compacted %d hourly response buckets", folded)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Response rollup compaction failed")
+
+
+compactor = RollupCompactor()
+
+
+rollups_cli = AppGroup("rollups", help="Response time-series rollup maintenance.")
+
+
+@rollups_cli.command("compact")
+@click.option("--retention-hours", type=int, default=None, help="Override ROLLUP_HOURLY_RETENTION_HOURS.")
+def compact_command(retention_hours):
+    """Fold old hourly buckets into daily ones."""
+    click.echo(f"{compact(retention_hours)} hourly bucket(s) compacted")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--survey-id", type=int, default=None, help="Only rebuild this survey.")
+def rebuild_command(survey_id):
+    """Recompute rollups from stored responses, then compact."""
+    total = rebuild(survey_id)
+    folded = compact()
+    click.echo(f"{total} response(s) bucketed, {folded} hourly bucket(s) compacted")
@@ -1,6 +1,7 @@
-from flask import render_template
+from flask import render_template, jsonify
 from flask_login import login_required
 from . import bp  # blueprint from __init__.py
+from ..ingestion import ingestor
 
 # Example admin dashboard route
 @bp.route("/admin/dashboard")
@@ -8,3 +9,9 @@ from . import bp  # blueprint from __init__.py
 def admin_dashboard():
     # You can add admin checks here later
     return render_template("admin_dashboard.html")
+
+# Queue depth and flush latency for the response ingestion pipeline
+@bp.route("/admin/ingest/stats")
+@login_required
+def ingest_stats():
+    return jsonify(ingestor.snapshot())
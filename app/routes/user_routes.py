@@ -1,4 +1,4 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, Response
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, send_file, session, make_response
 from flask_login import login_user, logout_user, login_required, current_user
 from . import bp  # blueprint variable
 from .. import db
@@ -6,14 +6,31 @@ from ..models.user import User
 from ..models.survey import Survey, Question, QuestionOption, SurveyResponse
 from ..forms import RegisterForm, LoginForm, SurveyForm, QuestionForm, ForgotPasswordForm, ResetPasswordForm
 from datetime import datetime, timedelta
-import json
-import csv
-from io import StringIO
+import logging
+from ..ingestion import ingestor
+from .. import counters, rollups
+from ..survey_cache import survey_cache
+from ..page_cache import page_cache
+from ..assets import preferred_encoding
+from ..response_codec import encode_responses, definition_for
+from ..exports import iter_csv, gzip_chunks
+from ..export_store import export_store
+from ..export_jobs import export_jobs, TooManyJobs
+from ..answers import answer_rows, record_answers
+from ..analytics import survey_analytics
+from ..tallies import record_tallies, tally_summary
+from ..crosstab import crosstab_cache, CrosstabError
+from ..dashboard import dashboard_page, DashboardError
+from .. import text_index, sketches
+from ..charts import chart_renderer, chart_spec, FORMATS as CHART_FORMATS, PACK_FORMATS
+from ..invitations import invitation_sender, InvitationError, OPEN_PIXEL
+from ..logos import logo_pipeline, LogoError
+from ..database import replica_reads
+from ..models.invitation import InvitationBatch
 from ..utils import send_survey_published_emails, send_forgot_password_email, send_welcome_user_email, verify_password_reset_token
 from sqlalchemy.orm import joinedload
 from typing import Optional
 import os
-from werkzeug.utils import secure_filename
 from flask import current_app
 import requests
 import uuid
@@ -26,6 +43,14 @@ WORD_LIMITS = {
     'enterprise': 5000
 }
 
+# Distribution window (days after publishing) for each package
+DISTRIBUTION_DAYS = {
+    'student': 10,
+    'basic': 14,
+    'extended': 30,
+    'enterprise': 60
+}
+
 # -----------------------------
 # Home Page
 # -----------------------------
@@ -90,7 +115,7 @@ def login():
             else:
                 flash("Invalid email or password.", "danger")
         else:
-            print("Form validation errors:", form.errors)
+            current_app.logger.debug("Login form validation errors: %s", form.errors)
 
     return render_template("login.html", form=form)
 
@@ -111,10 +136,52 @@ def logout():
 @bp.route("/dashboard")
 @login_required
 def dashboard():
-    surveys = Survey.query.filter_by(user_id=current_user.id).all()
-    # Handle None values by converting them to 0
-    total_responses = sum(survey.response_count or 0 for survey in surveys)
-    return render_template("dashboard.html", surveys=surveys, total_responses=total_responses)
+    """Paged with ?after= (keyset cursor); ?sort=created|title|responses|questions&order=asc|desc."""
+    sort = request.args.get("sort", "created")
+    order = request.args.get("order") or ("asc" if sort == "title" else "desc")
+    try:
+        page = dashboard_page(current_user.id, sort, order == "desc", request.args.get("after"),
+                              current_app.config.get("DASHBOARD_PAGE_SIZE", 25))
+    except DashboardError as e:
+        flash(str(e))
+        return redirect(url_for("main.dashboard"))
+    return render_template("dashboard.html", page=page, sort=sort, order=order)
+
+# -----------------------------
+# Response Time Series
+# -----------------------------
+@bp.route("/timeseries")
+@login_required
+@replica_reads
+def response_timeseries():
+    """
+    Responses per hour/day for the current user's surveys, from the rollup
+    buckets. ?survey_id= may repeat; ?start= is an ISO date (default: `days`
+    before now) and ?days= the window length (default 14, at most 90).
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({"error": "granularity must be 'hour' or 'day'"}), 400
+    days = max(1, min(request.args.get("days", 14, type=int), 90))
+    now = datetime.utcnow()
+    try:
+        start = datetime.fromisoformat(request.args["start"]) if request.args.get("start") else now - timedelta(days=days)
+    except ValueError:
+        return jsonify({"error": "start must be an ISO date"}), 400
+    end = min(start + timedelta(days=days), now + timedelta(hours=1))
+
+    requested = request.args.getlist("survey_id", type=int)
+    query = Survey.query.with_entities(Survey.id).filter_by(user_id=current_user.id)
+    if requested:
+        query = query.filter(Survey.id.in_(requested))
+    survey_ids = [survey_id for survey_id, in query]
+
+    buckets, counts = rollups.series(survey_ids, start, end, granularity)
+    return jsonify({
+        "granularity": granularity,
+        "buckets": [moment.isoformat() for moment in buckets],
+        "series": {str(survey_id): values for survey_id, values in counts.items()}
+    })
 # -----------------------------
 # Create Survey
 # -----------------------------
@@ -162,19 +229,13 @@ def create_survey():
         db.session.add(survey)
         db.session.commit()  # commit first to get survey.id
 
-        # --- ADD LOGO UPLOAD FUNCTIONALITY HERE ---
-        if 'logo' in request.files:
-            logo_file = request.files['logo']
-            if logo_file and logo_file.filename != '':
-                # Save the logo file
-                filename = secure_filename(logo_file.filename)
-                unique_filename = f"{current_user.id}_{survey.id}_{int(datetime.utcnow().timestamp())}_{filename}"
-                logo_path = os.path.join(current_app.root_path, 'static', 'survey_logos', unique_filename)
-                
-
-                # Update survey with logo filename
-                survey.logo_filename = unique_filename
-                db.session.commit()  # Commit the logo filename
+        # Logo: resized and converted in the background (app/logos.py)
+        logo_file = request.files.get('logo')
+        if logo_file and logo_file.filename != '':
+            try:
+                logo_pipeline.submit(survey.id, logo_file)
+            except LogoError as e:
+                flash(f"Logo not saved: {e}")
 
         # 2️⃣ Handle dynamic questions from the frontend
         question_texts = request.form.getlist("question_text[]")
@@ -225,7 +286,7 @@ def create_survey():
             # Handle options for multiple choice, checkbox, dropdown
             if q_type in ["multiple_choice", "checkbox", "dropdown"]:
                 option_names = request.form.getlist(f"question_option_{i}[]")
-                print(f"DEBUG: Found {len(option_names)} options for question {i}: {option_names}")
+                current_app.logger.debug("Found %d options for question %s: %s", len(option_names), i, option_names)
                 for opt_text in option_names:
                     if opt_text.strip():
                         option = QuestionOption(
@@ -264,27 +325,14 @@ def upload_survey_logo(survey_id):
         flash('No file selected.')
         return redirect(url_for("main.survey_view", survey_id=survey.id))
     
-    if logo_file:
-        # Delete old logo if exists
-        if survey.logo_filename:
-            old_logo_path = os.path.join(current_app.root_path, 'static', 'survey_logos', survey.logo_filename)
-            if os.path.exists(old_logo_path):
-                os.remove(old_logo_path)
-        
-        # Save new logo
-        filename = secure_filename(logo_file.filename)
-        unique_filename = f"{current_user.id}_{survey.id}_{int(datetime.utcnow().timestamp())}_{filename}"
-        logo_path = os.path.join(current_app.root_path, 'static', 'survey_logos', unique_filename)
-        
-        os.makedirs(os.path.dirname(logo_path), exist_ok=True)
-        logo_file.save(logo_path)
-        
-        # Update survey with new logo
-        survey.logo_filename = unique_filename
-        db.session.commit()
-        
-        flash('Logo uploaded successfully!')
-    
+    try:
+        logo_pipeline.submit(survey.id, logo_file)
+    except LogoError as e:
+        flash(str(e))
+        return redirect(url_for("main.survey_view", survey_id=survey.id))
+
+    # The old logo's files stay until garbage collection, for pages cached with them
+    flash('Logo uploaded! It will appear once it has been resized, usually within a few seconds.')
     return redirect(url_for("main.survey_view", survey_id=survey.id))
 
 @bp.route("/survey/<int:survey_id>/remove_logo", methods=["POST"])
@@ -297,12 +345,12 @@ def remove_survey_logo(survey_id):
         return redirect(url_for("main.dashboard"))
     
     if survey.logo_filename:
-        logo_path = os.path.join(current_app.root_path, 'static', 'survey_logos', survey.logo_filename)
-        if os.path.exists(logo_path):
-            os.remove(logo_path)
-        
+        # Files are left to logo garbage collection
         survey.logo_filename = None
+        survey.logo_variants = None
+        survey.bump_version()
         db.session.commit()
+        survey_cache.invalidate(survey.id)
         flash('Logo removed successfully!')
     
     return redirect(url_for("main.survey_view", survey_id=survey.id))
@@ -357,7 +405,7 @@ def survey_view(survey_id):
             if q_type in ["multiple_choice", "checkbox", "dropdown"]:
                 # Use consistent option naming
                 option_names = request.form.getlist(f"options[{i}][]")
-                print(f"DEBUG: Found {len(option_names)} options for question {i}: {option_names}")
+                current_app.logger.debug("Found %d options for question %s: %s", len(option_names), i, option_names)
                 
                 for opt_text in option_names:
                     if opt_text.strip():
@@ -415,23 +463,29 @@ def survey_view(survey_id):
     is_over_limit = total_word_count > word_limit
 
     # Distribution code
-    distribution_days_map = {
-        'student': 10,
-        'basic': 14,
-        'extended': 30,
-        'enterprise': 60
-    }
-    distribution_days = distribution_days_map.get(current_user.payment_status, 0)
+    distribution_days = DISTRIBUTION_DAYS.get(current_user.payment_status, 0)
     distribution_over = False
     if survey.published_at and distribution_days > 0:
         end_date = survey.published_at + timedelta(days=distribution_days)
         distribution_over = datetime.utcnow() > end_date
 
+    response_count = counters.get_count(survey.id)
+    analytics = None
+    if survey.published and response_count > 0:
+        compiled = definition_for(survey.id)
+        mode = request.args.get("mode") if request.args.get("mode") in ("exact", "approximate") else None
+        analytics = sketches.annotate(tally_summary(compiled), compiled, sketches.resolve_mode(response_count, mode))
+    invitation_batches = invitation_sender.batch_stats(survey.id) if survey.published else []
+
     return render_template(
         "survey_view.html",
         survey=survey,
         form=form,
         questions=questions,
+        response_count=response_count,
+        analytics=analytics,
+        invitation_batches=invitation_batches,
+        distribution_days=distribution_days,
         total_word_count=total_word_count,
         word_limit=word_limit,
         plan_name=plan_name,
@@ -552,7 +606,7 @@ def update_question(question_id):
     except Exception as e:
         db.session.rollback()
         flash("Error updating question. Please try again.")
-        print(f"Error updating question: {str(e)}")
+        current_app.logger.exception("Error updating question %s", question_id)
     
     return redirect(url_for("main.survey_view", survey_id=survey.id))
 
@@ -595,8 +649,11 @@ def delete_question(question_id):
 
     # Update survey word count before deleting the question
     survey.word_count -= question.word_count
+    if survey.published:
+        survey.bump_version()
     db.session.delete(question)
     db.session.commit()
+    survey_cache.invalidate(survey_id)
     
     # Recalculate total word count for the survey
     total_word_count = sum(len(q.text.split()) for q in survey.questions if q.text)
@@ -620,8 +677,13 @@ def delete_survey(survey_id):
         return redirect(url_for("main.dashboard"))
 
     Question.query.filter_by(survey_id=survey_id).delete()
+    counters.forget(survey_id)
     db.session.delete(survey)
     db.session.commit()
+    survey_cache.invalidate(survey_id)
+    export_store.invalidate(survey_id)
+    crosstab_cache.invalidate(survey_id)
+    page_cache.invalidate(survey_id)
     flash("Survey deleted successfully!")
     return redirect(url_for("main.dashboard"))
 # -----------------------------
@@ -636,12 +698,14 @@ def preview_survey(survey_id):
     
     preview = True
     
-    # Debug output
-    for q in questions:
-        print(f"Preview - Question: {q.text}")
-        print(f"Preview - Options: {[o.text for o in q.options]}")
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        for q in questions:
+            current_app.logger.debug("Preview - Question: %s, Options: %s", q.text, [o.text for o in q.options])
     
-    return render_template('take_survey.html', survey=survey, questions=questions, preview=preview)
+    # Never cached: previews show unpublished edits
+    response = make_response(render_template('take_survey.html', survey=survey, questions=questions, preview=preview))
+    response.cache_control.no_store = True
+    return response
 # -----------------------------
 # Publish Survey
 # -----------------------------
@@ -682,7 +746,9 @@ def publish_survey(survey_id):
     survey.published = True
     survey.published_at = datetime.utcnow()
     survey.survey_url = survey_url  # Store the URL
+    survey.bump_version()
     db.session.commit()
+    survey_cache.invalidate(survey.id)
     
     # Send emails asynchronously
     send_survey_published_emails(survey, current_user.email)
@@ -694,26 +760,48 @@ def publish_survey(survey_id):
 # Take Survey (For Respondents)
 # -----------------------------
 @bp.route("/survey/<string:slug>/take")
+@replica_reads
 def take_survey(slug):
-    survey = Survey.query.filter_by(slug=slug).first_or_404()
+    # Published surveys come from the compiled cache; only misses touch the DB
+    survey = survey_cache.get_by_slug(slug)
 
-    if not survey.published:
+    if survey is None:
+        Survey.query.filter_by(slug=slug).first_or_404()
         flash("This survey is not available.")
         return redirect(url_for("main.index"))
 
-    # ✅ FIXED: Use the correct relationship and eager loading
-    questions = Question.query.options(joinedload(Question.options))\
-               .filter_by(survey_id=survey.id)\
-               .order_by(Question.id).all()
+    # A signed-in visitor or a pending flash message changes the layout, and
+    # both live in cookies; only cookieless requests share the pre-rendered
+    # page (page_cache.share keeps Vary: Cookie off it).
+    login_cookies = {current_app.config.get("SESSION_COOKIE_NAME", "session"),
+                     current_app.config.get("REMEMBER_COOKIE_NAME", "remember_token")}
+    if login_cookies & request.cookies.keys():
+        response = make_response(_render_take_survey(survey))
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    etag, variants = page_cache.get(survey, lambda: _render_take_survey(survey))
+    # Each precompressed representation gets its own strong ETag
+    encoding = preferred_encoding(variants)
+    response = Response(variants[encoding], mimetype="text/html")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+    page_cache.share(response)
+    response.cache_control.max_age = page_cache.max_age
+    return response.make_conditional(request)
+
+def _render_take_survey(survey):
+    questions = survey.questions
     
     # Debug: Check if options are being loaded
-    print(f"Survey: {survey.title}")
-    print(f"Questions count: {len(questions)}")
-    for i, q in enumerate(questions):
-        print(f"Question {i+1}: {q.text}, Type: {q.qtype}")
-        print(f"Options count: {len(q.options)}")
-        for opt in q.options:
-            print(f"  - Option: {opt.text}")
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        current_app.logger.debug("Rendering survey %s (%d questions)", survey.title, len(questions))
+        for i, q in enumerate(questions):
+            current_app.logger.debug("Question %d: %s, Type: %s, Options: %s",
+                                     i + 1, q.text, q.qtype, [opt.text for opt in q.options])
 
     return render_template("take_survey.html", survey=survey, questions=questions)
 
@@ -722,38 +810,41 @@ def take_survey(slug):
 # -----------------------------
 @bp.route("/survey/<int:survey_id>/submit", methods=["POST"])
 def submit_survey_response(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
+    survey = survey_cache.get_by_id(survey_id)
     
     # Check if survey is published
-    if not survey.published:
+    if survey is None:
+        Survey.query.get_or_404(survey_id)
         flash("This survey is not available.")
         return redirect(url_for("main.index"))
+
+    # Enforce the plan's response cap (0 means unlimited)
+    if survey.max_responses and counters.get_count(survey.id) >= survey.max_responses:
+        flash("This survey has reached its maximum number of responses.")
+        return redirect(url_for("main.index"))
     
     # Process the responses
-    responses = {}
+    raw_answers = {}
     for question in survey.questions:
-        if question.qtype in ["multiple_choice", "dropdown", "linear_scale"]:
-            response_value = request.form.get(f"question_{question.id}")
-            responses[question.id] = {
-                "question_text": question.text,
-                "question_type": question.qtype,
-                "response": response_value
-            }
-        elif question.qtype == "checkbox":
-            response_values = request.form.getlist(f"question_{question.id}")
-            responses[question.id] = {
-                "question_text": question.text,
-                "question_type": question.qtype,
-                "response": response_values
-            }
-        else:  # short, paragraph
-            response_value = request.form.get(f"question_{question.id}")
-            responses[question.id] = {
-                "question_text": question.text,
-                "question_type": question.qtype,
-                "response": response_value
-            }
+        if question.qtype == "checkbox":
+            raw_answers[question.id] = request.form.getlist(f"question_{question.id}")
+        else:  # short, paragraph, multiple_choice, dropdown, linear_scale
+            raw_answers[question.id] = request.form.get(f"question_{question.id}")
+    responses = encode_responses(survey, raw_answers)
     
+    # Buffered mode: hand the row to the write-behind flusher and return
+    if ingestor.enabled:
+        ingestor.submit({
+            "survey_id": survey.id,
+            "respondent_ip": request.remote_addr,
+            "respondent_info": request.headers.get('User-Agent', 'Unknown'),
+            "created_at": datetime.utcnow(),
+            "responses": responses
+        })
+        _record_invitation_completion(survey.id)
+        flash("Thank you for completing the survey!")
+        return redirect(url_for("main.thank_you"))
+
     # Save the response to database
     try:
         survey_response = SurveyResponse(
@@ -764,18 +855,39 @@ def submit_survey_response(survey_id):
         survey_response.set_responses(responses)
         
         db.session.add(survey_response)
+        db.session.flush()  # Get the response id for its answer rows
+        answers = answer_rows(survey_response.id, survey, responses)
+        record_answers(answers)
+        record_tallies(answers)
         
         # Update response count
-        survey.response_count = SurveyResponse.query.filter_by(survey_id=survey.id).count()
+        counters.increment(survey.id)
+        rollups.record_many([(survey.id, survey_response.created_at)])
         
         db.session.commit()
-        
-        flash("Thank you for completing the survey!")
-        return redirect(url_for("main.thank_you"))
     except Exception as e:
         db.session.rollback()
         flash("An error occurred while submitting your response. Please try again.")
-        return redirect(url_for("main.take_survey", survey_id=survey.id))
+        return redirect(url_for("main.take_survey", slug=survey.slug))
+
+    # Committed: a failing hook must not ask the respondent to submit again
+    try:
+        if any(row["text_value"] is not None for row in answers):
+            text_index.indexer.mark_dirty(survey.id)
+        sketches.buffer.observe([(survey.id, survey_response.respondent_ip, survey_response.respondent_info)], answers)
+        _record_invitation_completion(survey.id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Post-commit hooks failed for survey %s", survey.id)
+
+    flash("Thank you for completing the survey!")
+    return redirect(url_for("main.thank_you"))
+
+def _record_invitation_completion(survey_id):
+    # Set by invitation_link when the respondent arrived from an invitation
+    token = session.pop(f"invite_{survey_id}", None)
+    if token:
+        invitation_sender.record_completion(survey_id, token)
 
 # -----------------------------
 # Payment Selection
@@ -889,11 +1001,143 @@ def contact():
 def thank_you():
     return render_template("thank_you.html")
 
+# -----------------------------
+# Response Analytics
+# -----------------------------
+@bp.route("/survey/<int:survey_id>/analytics")
+@login_required
+@replica_reads
+def survey_analytics_json(survey_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        return jsonify({"error": "Permission denied"}), 403
+    compiled = definition_for(survey.id)
+    # Running tallies by default; ?exact=1 recomputes from the answer table
+    summary = survey_analytics(compiled) if request.args.get("exact") else tally_summary(compiled)
+    # Unique respondents and top terms: ?mode=exact|approximate, else ANALYTICS_MODE
+    mode = request.args.get("mode")
+    if mode not in (None, "exact", "approximate"):
+        return jsonify({"error": "mode must be exact or approximate"}), 400
+    mode = sketches.resolve_mode(counters.get_count(survey.id), mode)
+    return jsonify(sketches.annotate(summary, compiled, mode))
+
+@bp.route("/survey/<int:survey_id>/crosstab")
+@login_required
+@replica_reads
+def survey_crosstab(survey_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        return jsonify({"error": "Permission denied"}), 403
+
+    question_a = request.args.get("a", type=int)
+    question_b = request.args.get("b", type=int)
+    if question_a is None or question_b is None:
+        return jsonify({"error": "Choose two questions to compare."}), 400
+    filter_question = request.args.get("filter_question", type=int)
+    filter_values = request.args.getlist("filter_value", type=int)
+    if filter_question is not None and not filter_values:
+        return jsonify({"error": "Choose at least one answer to filter by."}), 400
+
+    try:
+        result = crosstab_cache.get(definition_for(survey.id), question_a, question_b,
+                                    filter_question, filter_values)
+    except CrosstabError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+# -----------------------------
+# Text Answer Search
+# -----------------------------
+def _owned_text_question(survey_id, question_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        return None
+    question = Question.query.filter_by(id=question_id, survey_id=survey.id).first_or_404()
+    if question.qtype not in text_index.TEXT_TYPES:
+        return None
+    return question
+
+@bp.route("/survey/<int:survey_id>/questions/<int:question_id>/terms")
+@login_required
+def text_answer_terms(survey_id, question_id):
+    question = _owned_text_question(survey_id, question_id)
+    if question is None:
+        return jsonify({"error": "Not a text question you own"}), 403
+    text_index.refresh(survey_id, max_batches=2)
+    limit = max(1, min(request.args.get("limit", 20, type=int), 200))
+    return jsonify({"question_id": question.id, "terms": text_index.top_terms(question.id, limit)})
+
+@bp.route("/survey/<int:survey_id>/questions/<int:question_id>/search")
+@login_required
+def text_answer_search(survey_id, question_id):
+    question = _owned_text_question(survey_id, question_id)
+    if question is None:
+        return jsonify({"error": "Not a text question you own"}), 403
+    text_index.refresh(survey_id, max_batches=2)
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    return jsonify(text_index.search(question.id, request.args.get("q", ""), page, per_page))
+
+# -----------------------------
+# Result Charts
+# -----------------------------
+def _owned_survey_results(survey_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        return None, None
+    compiled = definition_for(survey.id)
+    return compiled, tally_summary(compiled)
+
+@bp.route("/survey/<int:survey_id>/charts/<int:question_id>.<string:fmt>")
+@login_required
+@replica_reads
+def survey_chart(survey_id, question_id, fmt):
+    if fmt not in CHART_FORMATS:
+        return jsonify({"error": "Unsupported chart format"}), 404
+    compiled, summary = _owned_survey_results(survey_id)
+    if compiled is None:
+        return jsonify({"error": "Permission denied"}), 403
+
+    stats = next((q for q in summary["questions"] if q["id"] == question_id), None)
+    spec = chart_spec(compiled, stats) if stats is not None else None
+    if spec is None:
+        return jsonify({"error": "No chart for this question"}), 404
+
+    path = chart_renderer.chart(spec, fmt)
+    response = send_file(path, mimetype=CHART_FORMATS[fmt], conditional=True,
+                         etag=os.path.splitext(os.path.basename(path))[0])
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@bp.route("/survey/<int:survey_id>/report.<string:fmt>")
+@login_required
+@replica_reads
+def survey_report_pack(survey_id, fmt):
+    if fmt not in PACK_FORMATS:
+        return jsonify({"error": "Unsupported report format"}), 404
+    compiled, summary = _owned_survey_results(survey_id)
+    if compiled is None:
+        flash("You don't have permission to access this survey.")
+        return redirect(url_for("main.dashboard"))
+
+    specs = [spec for spec in (chart_spec(compiled, q) for q in summary["questions"]) if spec is not None]
+    if not specs:
+        flash("This survey has no questions that can be charted.")
+        return redirect(url_for("main.survey_view", survey_id=survey_id))
+
+    path = chart_renderer.report_pack(compiled, specs, fmt)
+    response = send_file(path, mimetype=PACK_FORMATS[fmt], as_attachment=True,
+                         download_name=f"survey_{survey_id}_report.{fmt}", conditional=True,
+                         etag=os.path.splitext(os.path.basename(path))[0])
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 # -----------------------------
 # Export Survey Responses
 # -----------------------------
 @bp.route("/survey/<int:survey_id>/export")
 @login_required
+@replica_reads
 def export_survey_responses(survey_id):
     survey = Survey.query.get_or_404(survey_id)
     
@@ -902,48 +1146,158 @@ def export_survey_responses(survey_id):
         flash("You don't have permission to export responses from this survey.")
         return redirect(url_for("main.dashboard"))
     
-    responses = SurveyResponse.query.filter_by(survey_id=survey.id).all()
-    
-    # Create CSV content
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    headers = ['Response ID', 'Date', 'IP Address']
-    for question in survey.questions:
-        headers.append(question.text)
-    
-    writer.writerow(headers)
-    
-    # Write data
-    for response in responses:
-        row = [
-            response.id,
-            response.created_at.strftime('%Y-%m-%d %H:%M'),
-            response.respondent_ip
-        ]
-        
-        response_data = response.get_responses()
-        for question in survey.questions:
-            answer = response_data.get(str(question.id), {})
-            if isinstance(answer.get('response'), list):
-                row.append(', '.join(answer.get('response', [])))
-            else:
-                row.append(answer.get('response', ''))
-        
-        writer.writerow(row)
-    
-    # Prepare response
-    output.seek(0)
+    compiled = definition_for(survey.id)
+    filename = f"survey_{survey.id}_responses.csv"
+
+    # Materialized export: append new rows, then serve from disk (ETag/Range aware)
+    if export_store.enabled:
+        path, meta = export_store.get(compiled)
+        response = send_file(
+            path,
+            mimetype="text/csv",
+            as_attachment=True,
+            download_name=filename,
+            conditional=True,
+            etag=f"{survey.id}-{meta['version']}-{meta['high_water_id']}",
+            max_age=0
+        )
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    headers = {"Content-Disposition": f"attachment;filename={filename}"}
+
+    # Rows are streamed from a server-side cursor and encoded as they go
+    chunks = iter_csv(compiled)
+    if current_app.config.get("EXPORT_GZIP", True) and "gzip" in request.headers.get("Accept-Encoding", ""):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    headers["Vary"] = "Accept-Encoding"
+
     return Response(
-        output.getvalue(),
+        stream_with_context(chunks),
         mimetype="text/csv",
-        headers={
-            "Content-Disposition": f"attachment;filename=survey_{survey.id}_responses.csv",
-            "Content-type": "text/csv"
-        }
+        headers=headers
+    )
+
+# -----------------------------
+# Background Export Jobs
+# -----------------------------
+def _export_job_json(job):
+    data = {
+        "job_id": job["id"],
+        "state": job["state"],
+        "rows_done": job["rows_done"],
+        "rows_total": job["rows_total"],
+        "percent": min(100, int(100 * job["rows_done"] / job["rows_total"])) if job["rows_total"] else (100 if job["state"] == "finished" else 0),
+        "progress_url": url_for("main.export_job_status", job_id=job["id"]),
+        "error": job["error"]
+    }
+    if job["state"] == "finished":
+        data["download_url"] = url_for("main.export_job_download", job_id=job["id"])
+    return data
+
+@bp.route("/survey/<int:survey_id>/export/jobs", methods=["POST"])
+@login_required
+def request_export_job(survey_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        return jsonify({"error": "Permission denied"}), 403
+
+    try:
+        job = export_jobs.submit(survey.id, current_user.id)
+    except TooManyJobs:
+        return jsonify({"error": "You already have exports running. Please wait for them to finish."}), 429
+    return jsonify(_export_job_json(job)), 202
+
+@bp.route("/export/jobs/<string:job_id>")
+@login_required
+def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        return jsonify({"error": "Export not found"}), 404
+    return jsonify(_export_job_json(job))
+
+@bp.route("/export/jobs/<string:job_id>/download")
+@login_required
+def export_job_download(job_id):
+    job = export_jobs.get(job_id)
+    if job is None or job["user_id"] != current_user.id or job["state"] != "finished":
+        flash("That export is no longer available. Please request a new one.")
+        return redirect(url_for("main.dashboard"))
+    return send_file(
+        export_jobs.artifact_path(job_id),
+        mimetype="text/csv",
+        as_attachment=True,
+        download_name=f"survey_{job['survey_id']}_responses.csv",
+        conditional=True
     )
 
+# -----------------------------
+# Survey Invitations
+# -----------------------------
+@bp.route("/survey/<int:survey_id>/invitations", methods=["POST"])
+@login_required
+def upload_invitations(survey_id):
+    survey = Survey.query.get_or_404(survey_id)
+    if survey.user_id != current_user.id:
+        flash("You don't have permission to invite respondents to this survey.")
+        return redirect(url_for("main.dashboard"))
+
+    if not survey.published:
+        flash("Publish the survey before sending invitations.")
+        return redirect(url_for("main.survey_view", survey_id=survey.id))
+
+    recipients = request.files.get("recipients")
+    if recipients is None or recipients.filename == "":
+        flash("No file selected.")
+        return redirect(url_for("main.survey_view", survey_id=survey.id))
+
+    # Only spooled here; importing and sending happen on the sender thread
+    try:
+        invitation_sender.create_batch(
+            survey, current_user.id, recipients, request.host_url,
+            subject=request.form.get("subject", "").strip() or None
+        )
+    except InvitationError as e:
+        flash(str(e))
+        return redirect(url_for("main.survey_view", survey_id=survey.id))
+
+    flash("Recipient list uploaded! Invitations will be sent in the background.")
+    return redirect(url_for("main.survey_view", survey_id=survey.id))
+
+@bp.route("/survey/<int:survey_id>/invitations/<int:batch_id>/cancel", methods=["POST"])
+@login_required
+def cancel_invitations(survey_id, batch_id):
+    batch = InvitationBatch.query.get_or_404(batch_id)
+    if batch.survey_id != survey_id or batch.user_id != current_user.id:
+        flash("You don't have permission to manage these invitations.")
+        return redirect(url_for("main.dashboard"))
+
+    if invitation_sender.cancel(batch.id):
+        flash("Invitations cancelled. Any already queued will still be delivered.")
+    else:
+        flash("Those invitations have already finished sending.")
+    return redirect(url_for("main.survey_view", survey_id=survey_id))
+
+@bp.route("/i/<string:token>")
+def invitation_link(token):
+    survey_id = invitation_sender.record_click(token)
+    survey = survey_cache.get_by_id(survey_id) if survey_id else None
+    if survey is None:
+        flash("This survey is not available.")
+        return redirect(url_for("main.index"))
+
+    # Read back by submit_survey_response to attribute the completion
+    session[f"invite_{survey.id}"] = token
+    return redirect(url_for("main.take_survey", slug=survey.slug))
+
+@bp.route("/i/<string:token>/open.gif")
+def invitation_opened(token):
+    invitation_sender.record_open(token)
+    response = Response(OPEN_PIXEL, mimetype="image/gif")
+    response.cache_control.no_store = True
+    return response
+
 @bp.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
     form = ForgotPasswordForm()
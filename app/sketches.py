@@ -0,0 +1,378 @@
+# sketches.py
+"""
+Bounded-error analytics for very large surveys.
+
+Two mergeable sketches are kept per survey in survey_sketch:
+
+- "respondents": a HyperLogLog (2^14 one-byte registers, 16 KB) over a
+  hash of respondent_ip + respondent_info (User-Agent). The standard error
+  is 1.04 / sqrt(2^14) ~= 0.8%, so ~99.7% of estimates are within 2.4% (3
+  standard errors) of the true count.
+- "terms:<question_id>": a count-min sketch (depth 4, width 2048) of how
+  many responses mention each term of a short/paragraph question, plus the
+  current heavy-hitter candidates. A term's estimate never undercounts and
+  overcounts by at most e/2048 (~0.13%) of the question's total term
+  mentions with probability 1 - e^-4 (~98%).
+
+linear_scale answers don't need a quantile sketch here: their values are
+small bounded integers, so the value histogram in answer_tally (see
+tallies.tally_summary) already gives exact quantiles in O(scale width).
+
+Each worker process folds new responses into local delta sketches and
+merges them into the stored ones every SKETCH_FLUSH_SECONDS (HLL merge is
+a register-wise max, count-min merge is addition), so workers never
+contend per submit. `flask sketches rebuild` recomputes them from the
+stored responses.
+
+ANALYTICS_MODE picks what survey_view and the analytics JSON use:
+"exact", "approximate", or "auto" (approximate once a survey has
+ANALYTICS_APPROX_THRESHOLD responses). ?mode=exact overrides it per
+request.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import threading
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+RESPONDENTS = "respondents"
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def respondent_key(ip, user_agent):
+    return f"{ip or ''}|{user_agent or ''}"
+
+
+# -----------------------------
+# HyperLogLog
+# -----------------------------
+class HyperLogLog:
+    precision = 14
+
+    def __init__(self, registers=None):
+        m = 1 << self.precision
+        self.registers = np.zeros(m, dtype=np.uint8) if registers is None else registers
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, text):
+        h = _hash64(text)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))  # linear counting for small sets
+        return int(round(raw))
+
+    def is_empty(self):
+        return not self.registers.any()
+
+    def to_bytes(self):
+        return b"H" + bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:1] != b"H" or data[1] != cls.precision:
+            raise ValueError("not a HyperLogLog of this precision")
+        return cls(np.frombuffer(data[2:], dtype=np.uint8).copy())
+
+
+# -----------------------------
+# Count-min with heavy hitters
+# -----------------------------
+class CountMinTopK:
+    depth = 4
+    width = 2048
+    candidates_kept = 100
+
+    def __init__(self, table=None, total=0, candidates=None):
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32) if table is None else table
+        self.total = total
+        self.candidates = candidates or {}
+
+    def _cells(self, term):
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], "big") % self.width for row in range(self.depth)]
+
+    def add(self, term, count=1):
+        cells = self._cells(term)
+        for row, cell in enumerate(cells):
+            self.table[row, cell] += count
+        self.total += count
+        self.candidates[term] = 0  # re-estimated when the candidates are trimmed
+
+    def estimate(self, term):
+        return int(min(self.table[row, cell] for row, cell in enumerate(self._cells(term))))
+
+    def _trim(self):
+        estimates = {term: self.estimate(term) for term in self.candidates}
+        kept = sorted(estimates.items(), key=lambda item: (-item[1], item[0]))[:self.candidates_kept]
+        self.candidates = dict(kept)
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        self.candidates.update(other.candidates)
+        self._trim()
+        return self
+
+    def top(self, n):
+        self._trim()
+        return list(self.candidates.items())[:n]
+
+    def error_bound(self):
+        """Maximum overcount (absolute) with probability 1 - e^-depth."""
+        return math.ceil(math.e / self.width * self.total)
+
+    def is_empty(self):
+        return self.total == 0
+
+    def to_bytes(self):
+        self._trim()
+        header = json.dumps({"total": self.total, "candidates": self.candidates}).encode("utf-8")
+        return b"C" + struct.pack(">I", len(header)) + header + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:1] != b"C":
+            raise ValueError("not a count-min sketch")
+        (length,) = struct.unpack(">I", data[1:5])
+        header = json.loads(data[5:5 + length])
+        table = np.frombuffer(data[5 + length:], dtype=np.uint32).reshape(cls.depth, cls.width).copy()
+        return cls(table, header["total"], header["candidates"])
+
+
+def _decode(name, data):
+    return HyperLogLog.from_bytes(data) if name == RESPONDENTS else CountMinTopK.from_bytes(data)
+
+
+def _empty(name):
+    return HyperLogLog() if name == RESPONDENTS else CountMinTopK()
+
+
+# -----------------------------
+# Persistence
+# -----------------------------
+def load(survey_id, name):
+    from .models.survey import SurveySketch
+
+    data = db.session.execute(
+        select(SurveySketch.data).where(SurveySketch.survey_id == survey_id, SurveySketch.name == name)
+    ).scalar()
+    return _decode(name, bytes(data)) if data is not None else _empty(name)
+
+
+def merge_into_store(survey_id, name, delta):
+    """Merge a delta sketch into the stored one (read-modify-write under a row lock)."""
+    from .models.survey import SurveySketch
+
+    for attempt in range(2):
+        row = db.session.execute(
+            select(SurveySketch).where(SurveySketch.survey_id == survey_id, SurveySketch.name == name)
+            .with_for_update()
+        ).scalar()
+        try:
+            if row is None:
+                db.session.add(SurveySketch(survey_id=survey_id, name=name, data=delta.to_bytes()))
+            else:
+                row.data = _decode(name, bytes(row.data)).merge(delta).to_bytes()
+            db.session.commit()
+            return
+        except IntegrityError:
+            # Another worker created the row first; merge into theirs
+            db.session.rollback()
+            if attempt:
+                raise
+
+
+class SketchBuffer(PeriodicWorker):
+    """Per-process delta sketches, merged into survey_sketch every SKETCH_FLUSH_SECONDS."""
+
+    thread_name = "sketch-flusher"
+
+    def __init__(self):
+        super().__init__()
+        self._deltas = {}
+        self._deltas_pid = None  # the process whose observations _deltas holds
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = int(app.config.get("SKETCH_FLUSH_SECONDS", 10))
+        app.cli.add_command(sketches_cli)
+        atexit.register(self.flush)
+
+    def observe(self, respondents, answer_rows=()):
+        """
+        Fold stored responses into the local deltas: respondents are
+        (survey_id, ip, user_agent) tuples, answer_rows their Answer row dicts.
+        """
+        from .text_index import tokenize
+
+        with self._lock:
+            if self._deltas_pid != os.getpid():
+                self._deltas = {}  # inherited from the parent across a fork
+                self._deltas_pid = os.getpid()
+            for survey_id, ip, user_agent in respondents:
+                self._delta(survey_id, RESPONDENTS).add(respondent_key(ip, user_agent))
+            for row in answer_rows:
+                if row["text_value"] is not None:
+                    sketch = self._delta(row["survey_id"], f"terms:{row['question_id']}")
+                    for term in set(tokenize(row["text_value"])):
+                        sketch.add(term)
+        self.ensure_started()
+
+    def _delta(self, survey_id, name):
+        key = (survey_id, name)
+        if key not in self._deltas:
+            self._deltas[key] = _empty(name)
+        return self._deltas[key]
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        if not deltas or self.app is None:
+            return
+        with self.app.app_context():
+            for (survey_id, name), delta in sorted(deltas.items(), key=lambda item: item[0]):
+                try:
+                    merge_into_store(survey_id, name, delta)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Failed to merge %s sketch for survey %s", name, survey_id)
+
+    def tick(self):
+        self.flush()
+
+
+buffer = SketchBuffer()
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def resolve_mode(response_count, requested=None):
+    """'exact' or 'approximate' for a survey of this size."""
+    from flask import current_app
+
+    mode = requested or current_app.config.get("ANALYTICS_MODE", "auto")
+    if mode == "auto":
+        threshold = int(current_app.config.get("ANALYTICS_APPROX_THRESHOLD", 10000))
+        return "approximate" if response_count >= threshold else "exact"
+    return "approximate" if mode == "approximate" else "exact"
+
+
+def annotate(summary, compiled, mode, top_n=10):
+    """
+    Add unique-respondent and text top-term figures to a tally summary,
+    from the sketches ("approximate") or from the raw tables ("exact").
+    Read-only: exact top terms come from the text index as it stands,
+    which the indexer thread keeps current.
+    """
+    from .models.survey import SurveyResponse
+    from . import text_index
+
+    summary["mode"] = mode
+    if mode == "approximate":
+        hll = load(compiled.id, RESPONDENTS)
+        summary["unique_respondents"] = {"value": hll.estimate(), "relative_error": round(hll.relative_error, 4)}
+    else:
+        identity = SurveyResponse.respondent_ip + "|" + func.coalesce(SurveyResponse.respondent_info, "")
+        value = db.session.execute(
+            select(func.count(func.distinct(identity))).where(SurveyResponse.survey_id == compiled.id)
+        ).scalar_one()
+        summary["unique_respondents"] = {"value": value, "relative_error": 0.0}
+
+    for stats in summary["questions"]:
+        if stats["type"] not in text_index.TEXT_TYPES:
+            continue
+        if mode == "approximate":
+            sketch = load(compiled.id, f"terms:{stats['id']}")
+            stats["top_terms"] = [{"term": term, "responses": count} for term, count in sketch.top(top_n)]
+            stats["top_terms_error"] = sketch.error_bound()
+        else:
+            stats["top_terms"] = [
+                {"term": row["term"], "responses": row["responses"]}
+                for row in text_index.top_terms(stats["id"], top_n)
+            ]
+            stats["top_terms_error"] = 0
+    return summary
+
+
+# -----------------------------
+# Rebuild
+# -----------------------------
+def rebuild(survey_id):
+    """Recompute a survey's sketches from its stored responses and answers."""
+    from .models.survey import Answer, SurveyResponse, SurveySketch
+    from .text_index import tokenize
+
+    sketches = {RESPONDENTS: HyperLogLog()}
+    for ip, user_agent in db.session.execute(
+        select(SurveyResponse.respondent_ip, SurveyResponse.respondent_info)
+        .where(SurveyResponse.survey_id == survey_id)
+        .execution_options(yield_per=5000)
+    ):
+        sketches[RESPONDENTS].add(respondent_key(ip, user_agent))
+    for question_id, text in db.session.execute(
+        select(Answer.question_id, Answer.text_value)
+        .where(Answer.survey_id == survey_id, Answer.text_value.isnot(None))
+        .execution_options(yield_per=5000)
+    ):
+        sketch = sketches.setdefault(f"terms:{question_id}", CountMinTopK())
+        for term in set(tokenize(text)):
+            sketch.add(term)
+
+    db.session.execute(delete(SurveySketch).where(SurveySketch.survey_id == survey_id))
+    for name, sketch in sketches.items():
+        db.session.add(SurveySketch(survey_id=survey_id, name=name, data=sketch.to_bytes()))
+    db.session.commit()
+    return sketches
+
+
+sketches_cli = AppGroup("sketches", help="Approximate analytics sketch maintenance.")
+
+
+@sketches_cli.command("rebuild")
+@click.option("--survey-id", type=int, default=None, help="Only rebuild this survey.")
+def rebuild_command(survey_id):
+    """Recompute sketches from stored responses."""
+    from .models.survey import Survey
+
+    if survey_id is not None:
+        survey_ids = [survey_id]
+    else:
+        survey_ids = db.session.execute(select(Survey.id).order_by(Survey.id)).scalars().all()
+    for sid in survey_ids:
+        sketches = rebuild(sid)
+        click.echo(f"survey {sid}: ~{sketches[RESPONDENTS].estimate()} unique respondent(s)")
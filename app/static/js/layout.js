@@ -0,0 +1,137 @@
+// Basic interactivity for the UI
+document.addEventListener('DOMContentLoaded', function() {
+    // Add question button functionality
+    const addQuestionBtn = document.getElementById('add-question');
+    if (addQuestionBtn) {
+        addQuestionBtn.addEventListener('click', function() {
+            const questionList = document.getElementById('question-list');
+            const newQuestion = document.createElement('div');
+            newQuestion.className = 'neu-card question-item';
+            newQuestion.innerHTML = `
+                <div class="form-group">
+                    <label>Question Text</label>
+                    <input type="text" class="neu-input" name="question-text" placeholder="Enter your question">
+                </div>
+                <div class="form-group">
+                    <label>Question Type</label>
+                    <select class="neu-input" name="question-type">
+                        <option value="multiple_choice">Multiple Choice</option>
+                        <option value="text">Text Input</option>
+                        <option value="rating">Rating Scale</option>
+                        <option value="checkbox">Checkboxes</option>
+                    </select>
+                </div>
+                <div class="option-list">
+                    <div class="option-item">
+                        <input type="text" class="neu-input" name="option-text" placeholder="Option 1">
+                        <button type="button" class="neu-btn remove-option">
+                            <i class="fas fa-times"></i>
+                        </button>
+                    </div>
+                </div>
+                <button type="button" class="neu-btn add-option">
+                    <i class="fas fa-plus"></i> Add Option
+                </button>
+                <div class="question-actions">
+                    <button type="button" class="neu-btn neu-btn-danger remove-question">
+                        <i class="fas fa-trash"></i> Delete Question
+                    </button>
+                </div>
+            `;
+            questionList.appendChild(newQuestion);
+
+            // Add event listeners to the new elements
+            const removeQuestionBtn = newQuestion.querySelector('.remove-question');
+            removeQuestionBtn.addEventListener('click', function() {
+                questionList.removeChild(newQuestion);
+            });
+
+            const addOptionBtn = newQuestion.querySelector('.add-option');
+            addOptionBtn.addEventListener('click', function() {
+                const optionList = newQuestion.querySelector('.option-list');
+                const newOption = document.createElement('div');
+                newOption.className = 'option-item';
+                newOption.innerHTML = `
+                    <input type="text" class="neu-input" name="option-text" placeholder="Option">
+                    <button type="button" class="neu-btn remove-option">
+                        <i class="fas fa-times"></i>
+                    </button>
+                `;
+                optionList.appendChild(newOption);
+
+                // Add event listener to remove button
+                const removeOptionBtn = newOption.querySelector('.remove-option');
+                removeOptionBtn.addEventListener('click', function() {
+                    optionList.removeChild(newOption);
+                });
+            });
+
+            // Add event listeners to existing remove option buttons
+            const removeOptionBtns = newQuestion.querySelectorAll('.remove-option');
+            removeOptionBtns.forEach(btn => {
+                btn.addEventListener('click', function() {
+                    this.parentElement.remove();
+                });
+            });
+        });
+    }
+
+    // Add event listeners to existing remove question buttons
+    const removeQuestionBtns = document.querySelectorAll('.remove-question');
+    removeQuestionBtns.forEach(btn => {
+        btn.addEventListener('click', function() {
+            this.closest('.question-item').remove();
+        });
+    });
+
+    // Add event listeners to existing add option buttons
+    const addOptionBtns = document.querySelectorAll('.add-option');
+    addOptionBtns.forEach(btn => {
+        btn.addEventListener('click', function() {
+            const optionList = this.previousElementSibling;
+            const newOption = document.createElement('div');
+            newOption.className = 'option-item';
+            newOption.innerHTML = `
+                <input type="text" class="neu-input" name="option-text" placeholder="Option">
+                <button type="button" class="neu-btn remove-option">
+                    <i class="fas fa-times"></i>
+                </button>
+            `;
+            optionList.appendChild(newOption);
+
+            // Add event listener to remove button
+            const removeOptionBtn = newOption.querySelector('.remove-option');
+            removeOptionBtn.addEventListener('click', function() {
+                optionList.removeChild(newOption);
+            });
+        });
+    });
+
+    // Add event listeners to existing remove option buttons
+    const removeOptionBtns = document.querySelectorAll('.remove-option');
+    removeOptionBtns.forEach(btn => {
+        btn.addEventListener('click', function() {
+            this.parentElement.remove();
+        });
+    });
+});
+
+// Draw a response-count sparkline into an <svg class="sparkline">
+function drawSparkline(svg, values, labels) {
+    const width = svg.width.baseVal.value || 120;
+    const height = svg.height.baseVal.value || 28;
+    const max = Math.max(1, ...values);
+    const step = values.length > 1 ? width / (values.length - 1) : width;
+    const points = values.map((v, i) => `${(i * step).toFixed(1)},${(height - 2 - (v / max) * (height - 4)).toFixed(1)}`);
+    svg.innerHTML = '';
+    const line = document.createElementNS('http://www.w3.org/2000/svg', 'polyline');
+    line.setAttribute('points', points.join(' '));
+    line.setAttribute('fill', 'none');
+    line.setAttribute('stroke', '#4a90e2');
+    line.setAttribute('stroke-width', '1.5');
+    svg.appendChild(line);
+    const total = values.reduce((a, b) => a + b, 0);
+    const title = document.createElementNS('http://www.w3.org/2000/svg', 'title');
+    title.textContent = `${total} responses` + (labels && labels.length ? ` since ${labels[0].slice(0, 10)}` : '');
+    svg.appendChild(title);
+}
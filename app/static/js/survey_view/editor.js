@@ -0,0 +1,702 @@
+// ---- CONSTANTS FROM SERVER ----
+const serverData = document.getElementById('server-data').dataset;
+const wordLimit = Number(serverData.wordLimit);
+const currentPlanName = serverData.planName;
+const initialTotalWords = Number(serverData.totalWordCount);
+
+// Update the displayed plan info
+const planNameElement = document.getElementById('plan-name-display');
+if (planNameElement) {
+    planNameElement.textContent = currentPlanName;
+}
+
+const wordLimitElement = document.getElementById('word-limit-display');
+if (wordLimitElement) {
+    wordLimitElement.textContent = wordLimit;
+}
+
+// ---- INITIALIZE TOTAL WORDS ----
+let totalWords = initialTotalWords;
+
+// Store questions and options
+let questions = [];
+
+// DOM elements
+const questionsContainer = document.getElementById('questions-container');
+const existingQuestionsList = document.getElementById('existing-questions-list');
+const totalWordCountElement = document.getElementById('total-word-count');
+const wordProgressElement = document.getElementById('word-progress');
+const wordLimitWarning = document.getElementById('word-limit-warning');
+const publishBtn = document.getElementById('publish-btn');
+const submitBtn = document.getElementById('submit-questions');
+
+// Function to count words in text
+function countWords(text) {
+    if (!text || !text.trim()) return 0;
+    return text.trim().split(/\s+/).length;
+}
+
+function updateTotalWordCount() {
+// Start with words already saved in DB (only question text)
+let liveTotal = initialTotalWords;
+
+// Add unsaved questions (only text, no options)
+const newQuestionElements = questionsContainer.querySelectorAll('.question-item');
+newQuestionElements.forEach(qElement => {
+    const text = qElement.querySelector('.question-text-input')?.value || "";
+    liveTotal += countWords(text);
+});
+
+// Update global tracker + UI
+totalWords = liveTotal;
+totalWordCountElement.textContent = totalWords;
+
+// Update progress bar
+const progressPercent = Math.min(100, (totalWords / wordLimit) * 100);
+wordProgressElement.style.width = `${progressPercent}%`;
+
+// Change progress bar color
+if (progressPercent > 90) {
+    wordProgressElement.style.background = 'var(--danger)';
+} else if (progressPercent > 75) {
+    wordProgressElement.style.background = 'var(--warning)';
+} else {
+    wordProgressElement.style.background = 'var(--primary)';
+}
+
+// Show/hide warning
+if (totalWords > wordLimit) {
+    wordLimitWarning.style.display = 'block';
+    if (publishBtn) {
+        publishBtn.disabled = true;
+        publishBtn.title = 'Word limit exceeded. Cannot publish.';
+    }
+} else {
+    wordLimitWarning.style.display = 'none';
+    if (publishBtn) {
+        publishBtn.disabled = false;
+        publishBtn.title = '';
+    }
+}
+
+// Enable/disable save button
+if (submitBtn) {
+    submitBtn.disabled = totalWords > wordLimit;
+    submitBtn.title = totalWords > wordLimit ? 'Word limit exceeded. Reduce content to save.' : '';
+}
+}
+
+
+
+// Function to create a new question block
+function createQuestionBlock() {
+    const questionId = Date.now(); // Unique ID for the question
+    const qDiv = document.createElement("div");
+    qDiv.className = "neu-card question-item";
+    qDiv.dataset.id = questionId;
+    qDiv.style.marginBottom = "15px";
+    qDiv.innerHTML = `
+        <div style="display:flex; justify-content:space-between; align-items:center;">
+            <label><strong>New Question</strong></label>
+            <button type="button" class="neu-btn neu-btn-danger delete-question">
+                <i class="fas fa-trash"></i>
+            </button>
+        </div>
+        <div class="form-group">
+            <input type="text" name="question_text" class="neu-input question-text-input" placeholder="Enter your question" required>
+            <div class="question-word-count">
+                <span class="question-word-count-value">0</span> words in this question
+            </div>
+        </div>
+        <div class="form-group">
+            <select name="question_type" class="neu-input question-type">
+                <option value="short">Short answer</option>
+                <option value="paragraph">Paragraph</option>
+                <option value="multiple_choice">Multiple choice</option>
+                <option value="checkbox">Checkboxes</option>
+                <option value="dropdown">Dropdown</option>
+                <option value="linear_scale">Linear Scale</option>
+            </select>
+        </div>
+        <div class="form-group">
+            <label>
+                <input type="checkbox" name="question_required" value="true"> Required
+            </label>
+        </div>
+        <div class="options-container" style="display:none; margin-top:10px;">
+            <div class="options-list"></div>
+            <button type="button" class="add-option neu-btn neu-btn-secondary">
+                <i class="fas fa-plus"></i> Add Option
+            </button>
+        </div>
+    `;
+    questionsContainer.appendChild(qDiv);
+
+    // Add event listeners
+    const typeSelect = qDiv.querySelector(".question-type");
+    const optionsContainer = qDiv.querySelector(".options-container");
+    const questionInput = qDiv.querySelector(".question-text-input");
+    const questionWordCount = qDiv.querySelector(".question-word-count-value");
+    const deleteBtn = qDiv.querySelector(".delete-question");
+    const addOptionBtn = qDiv.querySelector(".add-option");
+    const optionsList = qDiv.querySelector(".options-list");
+
+    // Update word count when question text changes
+    questionInput.addEventListener("input", function() {
+        const words = countWords(this.value);
+        questionWordCount.textContent = words;
+        updateTotalWordCount();
+    });
+
+    // Show options only for MCQ, checkbox, dropdown
+    typeSelect.addEventListener("change", () => {
+        const optionsContainer = qDiv.querySelector(".options-container");
+        const linearScaleContainer = qDiv.querySelector(".linear-scale-fields");
+
+        // Hide all containers first
+        optionsContainer.style.display = "none";
+        linearScaleContainer.style.display = "none";
+
+        // Show relevant container
+        if (["multiple_choice","checkbox","dropdown"].includes(typeSelect.value)) {
+            optionsContainer.style.display = "block";
+        } else if (typeSelect.value === "linear_scale") {
+            linearScaleContainer.style.display = "block";
+        }
+    });
+
+    // Add option dynamically - FIXED VERSION
+addOptionBtn.addEventListener("click", () => {
+const optionDiv = document.createElement("div");
+optionDiv.className = "option-input-group";
+optionDiv.innerHTML = `
+    <input type="text" class="neu-input option-text-input" placeholder="Option text">
+    <button type="button" class="neu-btn neu-btn-danger delete-option">
+        <i class="fas fa-trash"></i>
+    </button>
+`;
+optionsList.appendChild(optionDiv);
+
+// Add event listener to option text input
+const optionInput = optionDiv.querySelector(".option-text-input");
+optionInput.addEventListener("input", updateTotalWordCount);
+
+// Add event listener to delete option button
+optionDiv.querySelector(".delete-option").addEventListener("click", () => {
+    optionsList.removeChild(optionDiv);
+    updateTotalWordCount();
+});
+});
+
+    // Delete question
+    deleteBtn.addEventListener("click", () => {
+        questionsContainer.removeChild(qDiv);
+        // Remove from questions array
+        questions = questions.filter(q => q.id !== questionId);
+        updateTotalWordCount();
+    });
+
+    // Return the question element
+    return qDiv;
+}
+
+// Function to render existing questions
+function renderExistingQuestions() {
+    if (questions.length === 0) {
+        return;
+    }
+
+    const existingQuestionsContainer = document.getElementById('existing-questions-list');
+    existingQuestionsContainer.innerHTML = '';
+
+    questions.forEach(q => {
+        const questionItem = document.createElement("div");
+        questionItem.className = "neu-card question-item";
+        questionItem.style.marginBottom = "15px";
+        questionItem.style.padding = "15px";
+
+        let optionsHtml = '';
+        if (q.options && q.options.length > 0) {
+            optionsHtml = '<ul style="margin-top:5px; padding-left: 20px;">';
+            q.options.forEach(opt => {
+                optionsHtml += `<li>${opt.text}</li>`;
+            });
+            optionsHtml += '</ul>';
+        }
+
+        questionItem.innerHTML = `
+            <div style="display:flex; justify-content:space-between; align-items:flex-start;">
+                <div>
+                    <strong>${q.text}</strong> (${q.type}) - ${q.wordCount} words
+                    ${optionsHtml}
+                </div>
+                <div>
+                    <button type="button" class="neu-btn neu-btn-danger delete-existing-question" data-id="${q.id}">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </div>
+            </div>
+        `;
+
+        existingQuestionsContainer.appendChild(questionItem);
+
+        // Add event listener to delete button
+        questionItem.querySelector(".delete-existing-question").addEventListener("click", () => {
+            questions = questions.filter(question => question.id !== q.id);
+            renderExistingQuestions();
+            updateTotalWordCount();
+        });
+    });
+}
+
+// Add new question
+document.getElementById("add-question").addEventListener("click", () => {
+    createQuestionBlock();
+});
+
+// Replace the form submission handler with this fixed version:
+document.getElementById("question-form").addEventListener("submit", async (e) => {
+e.preventDefault();
+
+// Collect unsaved questions
+const questionElements = questionsContainer.querySelectorAll('.question-item');
+const formData = new FormData();
+
+// In the form submission handler, add linear scale data collection
+questionElements.forEach((qElement, index) => {
+const text = qElement.querySelector('.question-text-input').value;
+const type = qElement.querySelector('.question-type').value;
+
+formData.append('question_text[]', text);
+formData.append('question_type[]', type);
+
+// Handle options for multiple choice types
+if (["multiple_choice","checkbox","dropdown"].includes(type)) {
+    const optionInputs = qElement.querySelectorAll('.option-text-input');
+    optionInputs.forEach(optInput => {
+        if (optInput.value.trim()) {
+            formData.append(`options[${index}][]`, optInput.value.trim());
+        }
+    });
+}
+
+// Handle linear scale data
+if (type === "linear_scale") {
+    const lowValue = qElement.querySelector('.linear-scale-low').value;
+    const highValue = qElement.querySelector('.linear-scale-high').value;
+    const lowLabel = qElement.querySelector('.linear-scale-low-label').value;
+    const highLabel = qElement.querySelector('.linear-scale-high-label').value;
+
+    formData.append('linear_scale_low[]', lowValue);
+    formData.append('linear_scale_high[]', highValue);
+    formData.append('linear_scale_low_label[]', lowLabel);
+    formData.append('linear_scale_high_label[]', highLabel);
+}
+});
+
+
+// Send data to server
+try {
+    const response = await fetch("", {
+        method: "POST",
+        body: formData
+    });
+
+    if (response.ok) {
+        location.reload();
+    } else {
+        alert('Error saving questions');
+    }
+} catch (error) {
+    console.error('Error:', error);
+    alert('Error saving questions');
+}
+});
+
+// Edit Question Functionality
+document.addEventListener('DOMContentLoaded', function() {
+// Edit button click handler
+document.addEventListener('click', function(e) {
+    if (e.target.closest('.edit-question-btn')) {
+        const questionItem = e.target.closest('.question-item');
+        toggleEditMode(questionItem, true);
+    }
+
+    // Cancel edit button
+    if (e.target.closest('.cancel-edit-btn')) {
+        const questionItem = e.target.closest('.question-item');
+        toggleEditMode(questionItem, false);
+    }
+
+    // Add option in edit mode
+    if (e.target.closest('.add-edit-option')) {
+        const optionsList = e.target.closest('.edit-options-container').querySelector('.edit-options-list');
+        addOptionToEditForm(optionsList);
+    }
+
+    // Remove option in edit mode
+    if (e.target.closest('.remove-option')) {
+        const optionGroup = e.target.closest('.option-input-group');
+        optionGroup.remove();
+        updateTotalWordCount();
+        validateOptions(optionGroup.closest('.edit-options-container'));
+    }
+});
+
+// Question type change in edit mode
+document.addEventListener('change', function(e) {
+if (e.target.classList.contains('edit-question-type')) {
+    const editMode = e.target.closest('.question-edit-mode');
+    const optionsContainer = editMode.querySelector('.edit-options-container');
+    const linearScaleContainer = editMode.querySelector('.edit-linear-scale-fields');
+
+    // Hide all containers first
+    if (optionsContainer) optionsContainer.style.display = 'none';
+    if (linearScaleContainer) linearScaleContainer.style.display = 'none';
+
+    // Show relevant container
+    const selectedType = e.target.value;
+    if (['multiple_choice', 'checkbox', 'dropdown'].includes(selectedType)) {
+        if (optionsContainer) optionsContainer.style.display = 'block';
+        optionsContainer.classList.add('show-options');
+
+        // Ensure at least one option exists
+        const optionsList = optionsContainer.querySelector('.edit-options-list');
+        if (optionsList.children.length === 0) {
+            addOptionToEditForm(optionsList);
+        }
+
+        validateOptions(optionsContainer);
+    } else if (selectedType === 'linear_scale') {
+        if (linearScaleContainer) linearScaleContainer.style.display = 'block';
+    } else {
+        // For other question types, hide validation message
+        const validationMessage = editMode.querySelector('.option-validation-message');
+        if (validationMessage) validationMessage.style.display = 'none';
+    }
+}
+
+// Update word count when editing question text
+if (e.target.classList.contains('edit-question-text')) {
+    const words = countWords(e.target.value);
+    const wordCountElement = e.target.closest('.form-group').querySelector('.edit-question-word-count');
+    wordCountElement.textContent = words;
+    updateTotalWordCount();
+}
+
+// Update word count when editing option text
+if (e.target.classList.contains('edit-option-text')) {
+    updateTotalWordCount();
+}
+});
+
+// Form submission validation for edit forms
+document.addEventListener('submit', function(e) {
+    if (e.target.classList.contains('edit-question-form')) {
+        const questionType = e.target.querySelector('.edit-question-type').value;
+        const optionsContainer = e.target.querySelector('.edit-options-container');
+
+        if (["multiple_choice", "checkbox", "dropdown"].includes(questionType)) {
+            const options = optionsContainer.querySelectorAll('.edit-option-text');
+            const hasValidOptions = Array.from(options).some(opt => opt.value.trim() !== '');
+
+            if (!hasValidOptions) {
+                e.preventDefault();
+                validateOptions(optionsContainer);
+                alert('Multiple choice, checkbox, and dropdown questions must have at least one option.');
+                return false;
+            }
+        }
+
+        // Update total word count before submitting
+        updateTotalWordCount();
+    }
+});
+
+// Initialize word count on page load
+updateTotalWordCount();
+});
+
+// Toggle between view and edit mode
+function toggleEditMode(questionItem, showEdit) {
+const viewMode = questionItem.querySelector('.question-view-mode');
+const editMode = questionItem.querySelector('.question-edit-mode');
+
+if (showEdit) {
+    viewMode.style.display = 'none';
+    editMode.style.display = 'block';
+
+    // Initialize word count for the edit form
+    const questionInput = editMode.querySelector('.edit-question-text');
+    const words = countWords(questionInput.value);
+    editMode.querySelector('.edit-question-word-count').textContent = words;
+
+    // Update total word count
+    updateTotalWordCount();
+
+    // Validate options if needed
+    const questionType = editMode.querySelector('.edit-question-type').value;
+    if (["multiple_choice", "checkbox", "dropdown"].includes(questionType)) {
+        const optionsContainer = editMode.querySelector('.edit-options-container');
+        validateOptions(optionsContainer);
+    }
+} else {
+    viewMode.style.display = 'block';
+    editMode.style.display = 'none';
+}
+}
+
+// Add option to edit form
+function addOptionToEditForm(optionsList) {
+const optionDiv = document.createElement('div');
+optionDiv.className = 'option-input-group';
+optionDiv.style.display = 'flex';
+optionDiv.style.alignItems = 'center';
+optionDiv.style.gap = '10px';
+optionDiv.style.marginBottom = '8px';
+
+optionDiv.innerHTML = `
+    <input type="text" class="neu-input edit-option-text" name="options[]" placeholder="Option text" required>
+    <button type="button" class="neu-btn neu-btn-danger remove-option">
+        <i class="fas fa-trash"></i>
+    </button>
+`;
+
+optionsList.appendChild(optionDiv);
+
+// Add event listener to the new option input
+const optionInput = optionDiv.querySelector('.edit-option-text');
+optionInput.addEventListener('input', updateTotalWordCount);
+
+// Validate options after adding
+const optionsContainer = optionsList.closest('.edit-options-container');
+validateOptions(optionsContainer);
+}
+
+// Validate options for multiple choice questions
+function validateOptions(optionsContainer) {
+const options = optionsContainer.querySelectorAll('.edit-option-text');
+const hasValidOptions = Array.from(options).some(opt => opt.value.trim() !== '');
+const validationMessage = optionsContainer.querySelector('.option-validation-message');
+
+if (!hasValidOptions && options.length > 0) {
+    validationMessage.style.display = 'block';
+    return false;
+} else {
+    validationMessage.style.display = 'none';
+    return true;
+}
+}
+
+// Enhanced word count function that includes both new and edited questions
+function updateTotalWordCount() {
+let liveTotal = 0;
+
+// 1. Count words from existing questions that are NOT being edited
+const existingQuestionItems = document.querySelectorAll('#existing-questions-list .question-item');
+existingQuestionItems.forEach(item => {
+    const viewMode = item.querySelector('.question-view-mode');
+    const editMode = item.querySelector('.question-edit-mode');
+
+    // If question is in view mode (not being edited), use stored word count
+    if (viewMode.style.display !== 'none') {
+        const questionId = item.dataset.questionId;
+        const originalWordCount = parseInt(item.querySelector('.edit-question-word-count')?.textContent || '0');
+        liveTotal += originalWordCount;
+    }
+    // If question is being edited, count the current text
+    else if (editMode.style.display !== 'none') {
+        const editInput = editMode.querySelector('.edit-question-text');
+        const text = editInput ? editInput.value : '';
+        liveTotal += countWords(text);
+    }
+});
+
+// 2. Add words from new unsaved questions
+const newQuestionElements = questionsContainer.querySelectorAll('.question-item');
+newQuestionElements.forEach(qElement => {
+    const text = qElement.querySelector('.question-text-input')?.value || "";
+    liveTotal += countWords(text);
+});
+
+// Update global tracker + UI
+totalWords = liveTotal;
+totalWordCountElement.textContent = totalWords;
+
+// Update progress bar
+const progressPercent = Math.min(100, (totalWords / wordLimit) * 100);
+wordProgressElement.style.width = `${progressPercent}%`;
+
+// Change progress bar color based on usage
+if (progressPercent > 90) {
+    wordProgressElement.style.background = 'var(--danger)';
+} else if (progressPercent > 75) {
+    wordProgressElement.style.background = 'var(--warning)';
+} else {
+    wordProgressElement.style.background = 'var(--primary)';
+}
+
+// Show/hide warning and disable buttons if over limit
+if (totalWords > wordLimit) {
+    wordLimitWarning.style.display = 'block';
+    if (publishBtn) {
+        publishBtn.disabled = true;
+        publishBtn.title = 'Word limit exceeded. Cannot publish.';
+    }
+    if (submitBtn) {
+        submitBtn.disabled = true;
+        submitBtn.title = 'Word limit exceeded. Reduce content to save.';
+    }
+} else {
+    wordLimitWarning.style.display = 'none';
+    if (publishBtn) {
+        publishBtn.disabled = false;
+        publishBtn.title = '';
+    }
+    if (submitBtn) {
+        submitBtn.disabled = false;
+        submitBtn.title = '';
+    }
+}
+
+console.log('Word count update:', {
+    existing: liveTotal,
+    total: totalWords,
+    limit: wordLimit
+});
+}
+
+// Toggle between view and edit mode
+function toggleEditMode(questionItem, showEdit) {
+const viewMode = questionItem.querySelector('.question-view-mode');
+const editMode = questionItem.querySelector('.question-edit-mode');
+
+if (showEdit) {
+    viewMode.style.display = 'none';
+    editMode.style.display = 'block';
+
+    // Initialize word count for the edit form
+    const questionInput = editMode.querySelector('.edit-question-text');
+    const words = countWords(questionInput.value);
+    editMode.querySelector('.edit-question-word-count').textContent = words;
+
+    // Update total word count
+    updateTotalWordCount();
+
+    // Validate options if needed
+    const questionType = editMode.querySelector('.edit-question-type').value;
+    if (["multiple_choice", "checkbox", "dropdown"].includes(questionType)) {
+        const optionsContainer = editMode.querySelector('.edit-options-container');
+        validateOptions(optionsContainer);
+    }
+} else {
+    viewMode.style.display = 'block';
+    editMode.style.display = 'none';
+
+    // Update total word count when canceling edit
+    updateTotalWordCount();
+}
+}
+
+// Add option to edit form
+function addOptionToEditForm(optionsList) {
+const optionDiv = document.createElement('div');
+optionDiv.className = 'option-input-group';
+optionDiv.style.display = 'flex';
+optionDiv.style.alignItems = 'center';
+optionDiv.style.gap = '10px';
+optionDiv.style.marginBottom = '8px';
+
+optionDiv.innerHTML = `
+    <input type="text" class="neu-input edit-option-text" name="options[]" placeholder="Option text" required>
+    <button type="button" class="neu-btn neu-btn-danger remove-option">
+        <i class="fas fa-trash"></i>
+    </button>
+`;
+
+optionsList.appendChild(optionDiv);
+
+const optionInput = optionDiv.querySelector('.edit-option-text');
+optionInput.addEventListener('input', updateTotalWordCount);
+
+const optionsContainer = optionsList.closest('.edit-options-container');
+validateOptions(optionsContainer);
+}
+
+// Validate options for multiple choice questions
+function validateOptions(optionsContainer) {
+const options = optionsContainer.querySelectorAll('.edit-option-text');
+const hasValidOptions = Array.from(options).some(opt => opt.value.trim() !== '');
+const validationMessage = optionsContainer.querySelector('.option-validation-message');
+
+if (!hasValidOptions && options.length > 0) {
+    validationMessage.style.display = 'block';
+    return false;
+} else {
+    validationMessage.style.display = 'none';
+    return true;
+}
+}
+
+// Enhanced logo upload with drag & drop
+document.addEventListener('DOMContentLoaded', function() {
+const logoInput = document.getElementById('logo');
+const logoUploadArea = document.querySelector('.logo-upload-area');
+
+if (logoUploadArea && logoInput) {
+    // Click to upload
+    logoUploadArea.addEventListener('click', function() {
+        logoInput.click();
+    });
+
+    // Drag & drop functionality
+    ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
+        logoUploadArea.addEventListener(eventName, preventDefaults, false);
+    });
+
+    function preventDefaults(e) {
+        e.preventDefault();
+        e.stopPropagation();
+    }
+
+    ['dragenter', 'dragover'].forEach(eventName => {
+        logoUploadArea.addEventListener(eventName, highlight, false);
+    });
+
+    ['dragleave', 'drop'].forEach(eventName => {
+        logoUploadArea.addEventListener(eventName, unhighlight, false);
+    });
+
+    function highlight() {
+        logoUploadArea.classList.add('dragover');
+    }
+
+    function unhighlight() {
+        logoUploadArea.classList.remove('dragover');
+    }
+
+    logoUploadArea.addEventListener('drop', handleDrop, false);
+
+    function handleDrop(e) {
+        const dt = e.dataTransfer;
+        const files = dt.files;
+        logoInput.files = files;
+
+        // Trigger change event
+        const event = new Event('change', { bubbles: true });
+        logoInput.dispatchEvent(event);
+    }
+
+    // Preview selected file
+    logoInput.addEventListener('change', function() {
+        if (this.files && this.files[0]) {
+            const reader = new FileReader();
+            reader.onload = function(e) {
+                // You could add a preview here if needed
+                console.log('File selected:', this.files[0].name);
+            };
+            reader.readAsDataURL(this.files[0]);
+        }
+    });
+}
+});
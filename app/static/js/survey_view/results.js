@@ -0,0 +1,171 @@
+// Response sparklines from the rollup time series
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.response-trend svg.sparkline').forEach(svg => {
+        fetch(svg.dataset.url, { credentials: 'same-origin' })
+            .then(r => r.json())
+            .then(data => drawSparkline(svg, data.series[document.getElementById('server-data').dataset.surveyId] || [], data.buckets));
+    });
+});
+
+// Text answers: top terms and keyword search with drill-down
+document.querySelectorAll('.text-insights').forEach(function (box) {
+    const termsBox = box.querySelector('.text-terms');
+    const form = box.querySelector('.text-search');
+    const results = box.querySelector('.text-results');
+
+    function runSearch(query) {
+        form.elements.q.value = query;
+        results.textContent = 'Searching…';
+        fetch(`${box.dataset.searchUrl}?q=${encodeURIComponent(query)}`, { credentials: 'same-origin' })
+            .then(r => r.json())
+            .then(data => {
+                results.innerHTML = '';
+                const summary = document.createElement('p');
+                summary.className = 'text-muted';
+                summary.textContent = `${data.total} matching response${data.total === 1 ? '' : 's'}`;
+                results.appendChild(summary);
+                const list = document.createElement('ul');
+                data.results.forEach(item => {
+                    const li = document.createElement('li');
+                    li.textContent = item.text;
+                    list.appendChild(li);
+                });
+                results.appendChild(list);
+            })
+            .catch(() => { results.textContent = 'Search failed. Please try again.'; });
+    }
+
+    termsBox.querySelectorAll('.term-chip').forEach(chip => {
+        chip.addEventListener('click', () => runSearch(chip.dataset.term));
+    });
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        if (form.elements.q.value.trim()) runSearch(form.elements.q.value.trim());
+    });
+});
+
+// Cross-tab picker: fetch the contingency table and render it with row percentages
+(function () {
+    const form = document.getElementById('crosstab-form');
+    if (!form) return;
+    const filterQuestion = document.getElementById('crosstab-filter-question');
+    const filterValue = document.getElementById('crosstab-filter-value');
+    const output = document.getElementById('crosstab-result');
+
+    filterQuestion.addEventListener('change', function () {
+        const option = filterQuestion.selectedOptions[0];
+        filterValue.innerHTML = '';
+        if (!option.value) {
+            filterValue.style.display = 'none';
+            return;
+        }
+        const choices = JSON.parse(option.dataset.choices);
+        const labels = JSON.parse(option.dataset.labels);
+        choices.forEach((choice, i) => filterValue.add(new Option(labels[i], choice)));
+        filterValue.style.display = '';
+    });
+
+    function cell(tag, text) {
+        const el = document.createElement(tag);
+        el.textContent = text;
+        el.style.padding = '4px 8px';
+        return el;
+    }
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        const params = new URLSearchParams();
+        params.append('a', form.elements.a.value);
+        params.append('b', form.elements.b.value);
+        if (filterQuestion.value) {
+            params.append('filter_question', filterQuestion.value);
+            Array.from(filterValue.selectedOptions).forEach(o => params.append('filter_value', o.value));
+        }
+        output.textContent = 'Loading…';
+        fetch(`${form.dataset.url}?${params}`, { credentials: 'same-origin' })
+            .then(r => r.json())
+            .then(result => {
+                output.innerHTML = '';
+                if (result.error) {
+                    output.textContent = result.error;
+                    return;
+                }
+                const table = document.createElement('table');
+                table.className = 'crosstab-table';
+                const head = table.insertRow();
+                head.appendChild(cell('th', ''));
+                result.question_b.categories.forEach(label => head.appendChild(cell('th', label)));
+                head.appendChild(cell('th', 'Total'));
+                result.question_a.categories.forEach((label, i) => {
+                    const row = table.insertRow();
+                    row.appendChild(cell('th', label));
+                    result.counts[i].forEach((count, j) =>
+                        row.appendChild(cell('td', `${count} (${result.row_percentages[i][j]}%)`)));
+                    row.appendChild(cell('td', result.row_totals[i]));
+                });
+                output.appendChild(table);
+
+                const chi = result.chi_square;
+                const summary = document.createElement('p');
+                summary.className = 'text-muted';
+                summary.textContent = `${result.respondents} respondents` + (chi.statistic === null ? '' :
+                    ` · χ² = ${chi.statistic}, df = ${chi.df}, p = ${chi.p_value.toPrecision(3)}, Cramér's V = ${chi.cramers_v}`) +
+                    (result.multi_select ? ' · no χ² test: checkbox answers count once per selected option' : '');
+                output.appendChild(summary);
+            })
+            .catch(() => { output.textContent = 'Could not load the comparison. Please try again.'; });
+    });
+})();
+
+// Export runs as a background job; poll its progress until the file is ready
+(function () {
+    const button = document.getElementById('export-btn');
+    if (!button) return;
+    const status = document.getElementById('export-status');
+
+    function poll(progressUrl) {
+        fetch(progressUrl, { credentials: 'same-origin' })
+            .then(r => r.json())
+            .then(job => {
+                if (job.state === 'finished') {
+                    status.textContent = 'Export ready.';
+                    button.disabled = false;
+                    window.location = job.download_url;
+                } else if (job.state === 'failed' || job.error) {
+                    status.textContent = job.error || 'Export failed. Please try again.';
+                    button.disabled = false;
+                } else {
+                    status.textContent = `Preparing export… ${job.percent}% (${job.rows_done} of ${job.rows_total} responses)`;
+                    setTimeout(() => poll(progressUrl), 1500);
+                }
+            })
+            .catch(() => setTimeout(() => poll(progressUrl), 3000));
+    }
+
+    button.addEventListener('click', function () {
+        button.disabled = true;
+        status.textContent = 'Starting export…';
+        fetch(button.dataset.jobUrl, { method: 'POST', credentials: 'same-origin' })
+            .then(r => r.json())
+            .then(job => {
+                if (job.error && !job.job_id) {
+                    status.textContent = job.error;
+                    button.disabled = false;
+                    return;
+                }
+                poll(job.progress_url);
+            })
+            .catch(() => {
+                status.textContent = 'Could not start the export. Please try again.';
+                button.disabled = false;
+            });
+    });
+})();
+
+function copySurveyLink() {
+    const linkInput = document.getElementById('survey-link');
+    linkInput.select();
+    document.execCommand('copy');
+    alert('Survey link copied to clipboard!');
+}
@@ -0,0 +1,21 @@
+// Function to ensure scrollbar is always visible when content overflows
+function ensureScrollbarVisibility() {
+    const container = document.getElementById('existing-questions-container');
+    const content = document.getElementById('existing-questions-list');
+
+    if (content.scrollHeight > container.clientHeight) {
+        container.style.borderColor = '#e0e0e0'; // Show border to indicate scrollable area
+    } else {
+        container.style.borderColor = 'transparent'; // Hide border if no scroll needed
+    }
+}
+
+// Check on page load and after any DOM changes
+document.addEventListener('DOMContentLoaded', ensureScrollbarVisibility);
+
+// Optional: Use a MutationObserver to detect when questions are added/removed
+const observer = new MutationObserver(ensureScrollbarVisibility);
+observer.observe(document.getElementById('existing-questions-list'), { 
+    childList: true, 
+    subtree: true 
+});
@@ -0,0 +1,18 @@
+// Initialize progress bar and warning from server data
+document.addEventListener("DOMContentLoaded", function() {
+    // Get data from the hidden element
+    const serverData = document.getElementById('server-data');
+    const progressWidth = parseInt(serverData.dataset.progressWidth);
+    const isOverLimit = serverData.dataset.isOverLimit === 'true';
+
+    // Set progress bar width
+    document.getElementById('word-progress').style.width = progressWidth + '%';
+
+    // Show/hide warning
+    document.getElementById('word-limit-warning').style.display = isOverLimit ? 'block' : 'none';
+
+    // Change progress bar color if over limit
+    if (isOverLimit) {
+        document.getElementById('word-progress').style.backgroundColor = 'var(--danger)';
+    }
+});
@@ -0,0 +1,173 @@
+# survey_cache.py
+"""
+Process-local cache of compiled published surveys.
+
+Published surveys can't be edited, so the respondent routes (take_survey and
+submit_survey_response) read an immutable CompiledSurvey from here instead
+of reloading Survey, Question and QuestionOption rows on every hit. Entries
+are keyed by id (with a slug index), evicted LRU once SURVEY_CACHE_SIZE is
+reached, and tied to Survey.version: anything that changes what respondents
+see (publish, unpublish, delete, logo change) bumps the version and
+invalidates the local entry. Other processes notice the bump the next time
+they revalidate, at most every SURVEY_CACHE_REVALIDATE_SECONDS, with a
+single-row version probe.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from . import db
+
+CompiledOption = namedtuple("CompiledOption", "id text")
+
+CompiledQuestion = namedtuple(
+    "CompiledQuestion",
+    "id text qtype required linear_scale_low linear_scale_high "
+    "linear_scale_low_label linear_scale_high_label options option_ids option_texts",
+)
+
+CompiledSurvey = namedtuple(
+    "CompiledSurvey",
+    "id slug version title description logo_filename logo_variants published max_responses "
+    "questions questions_by_id",
+)
+
+
+def compile_survey(survey):
+    """Build the immutable respondent-facing view of a Survey and its questions."""
+    questions = []
+    for q in sorted(survey.questions, key=lambda q: q.id):
+        options = tuple(CompiledOption(o.id, o.text) for o in sorted(q.options, key=lambda o: o.id))
+        questions.append(CompiledQuestion(
+            id=q.id,
+            text=q.text,
+            qtype=q.qtype,
+            required=bool(q.required),
+            linear_scale_low=q.linear_scale_low if q.linear_scale_low is not None else 1,
+            linear_scale_high=q.linear_scale_high if q.linear_scale_high is not None else 5,
+            linear_scale_low_label=q.linear_scale_low_label or '',
+            linear_scale_high_label=q.linear_scale_high_label or '',
+            options=options,
+            option_ids=MappingProxyType({o.text: o.id for o in reversed(options)}),
+            option_texts=MappingProxyType({o.id: o.text for o in options}),
+        ))
+    questions = tuple(questions)
+    return CompiledSurvey(
+        id=survey.id,
+        slug=survey.slug,
+        version=survey.version or 0,
+        title=survey.title,
+        description=survey.description,
+        logo_filename=survey.logo_filename,
+        logo_variants=survey.logo_variants,
+        published=bool(survey.published),
+        max_responses=survey.max_responses or 0,
+        questions=questions,
+        questions_by_id=MappingProxyType({q.id: q for q in questions}),
+    )
+
+
+class SurveyCache:
+    """LRU of CompiledSurvey keyed by id, with a slug -> id index."""
+
+    def __init__(self, max_entries=512, revalidate_seconds=30):
+        self.max_entries = max_entries
+        self.revalidate_seconds = revalidate_seconds
+        self._entries = OrderedDict()   # id -> (CompiledSurvey, checked_at)
+        self._slugs = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_entries = max(1, int(app.config.get("SURVEY_CACHE_SIZE", self.max_entries)))
+        self.revalidate_seconds = float(app.config.get("SURVEY_CACHE_REVALIDATE_SECONDS", self.revalidate_seconds))
+
+    def get_by_id(self, survey_id):
+        """Return the CompiledSurvey for a published survey, or None."""
+        compiled = self._lookup(survey_id)
+        if compiled is not None:
+            return compiled
+        from .models.survey import Survey
+        return self._load(Survey.id == survey_id)
+
+    def get_by_slug(self, slug):
+        with self._lock:
+            survey_id = self._slugs.get(slug)
+            if survey_id is None:
+                self.misses += 1
+        if survey_id is not None:
+            compiled = self._lookup(survey_id)
+            if compiled is not None:
+                return compiled
+        from .models.survey import Survey
+        return self._load(Survey.slug == slug)
+
+    def invalidate(self, survey_id):
+        with self._lock:
+            entry = self._entries.pop(survey_id, None)
+            if entry is not None:
+                self._slugs.pop(entry[0].slug, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._slugs.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _lookup(self, survey_id):
+        with self._lock:
+            entry = self._entries.get(survey_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            compiled, checked_at = entry
+            if time.monotonic() - checked_at < self.revalidate_seconds:
+                self._entries.move_to_end(survey_id)
+                self.hits += 1
+                return compiled
+
+        # Stale: confirm the version still matches before trusting it
+        from .models.survey import Survey
+        row = db.session.execute(
+            select(Survey.version, Survey.published).where(Survey.id == survey_id)
+        ).first()
+        if row is None or not row.published or (row.version or 0) != compiled.version:
+            self.invalidate(survey_id)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            if survey_id in self._entries:
+                self._entries[survey_id] = (compiled, time.monotonic())
+                self._entries.move_to_end(survey_id)
+            self.hits += 1
+        return compiled
+
+    def _load(self, criterion):
+        from .models.survey import Survey, Question
+        survey = db.session.execute(
+            select(Survey)
+            .options(selectinload(Survey.questions).selectinload(Question.options))
+            .where(criterion)
+        ).scalar_one_or_none()
+        if survey is None or not survey.published:
+            return None
+        compiled = compile_survey(survey)
+        with self._lock:
+            self._entries[compiled.id] = (compiled, time.monotonic())
+            self._entries.move_to_end(compiled.id)
+            self._slugs[compiled.slug] = compiled.id
+            while len(self._entries) > self.max_entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._slugs.pop(evicted.slug, None)
+        return compiled
+
+
+survey_cache = SurveyCache()
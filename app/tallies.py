@@ -0,0 +1,310 @@
+# tallies.py
+"""
+Running per-question answer tallies.
+
+Every stored response adds its answers to two small tables, in the same
+transaction as the response itself:
+
+- answer_tally: one row per (question, value), where value is the option id
+  for choice/checkbox questions and the picked number for linear_scale, so
+  it holds both option counts and scale histograms;
+- question_tally: one row per question with the number of respondents who
+  answered it and, for linear_scale, the sum and sum of squares of their
+  values (enough for mean and standard deviation).
+
+Like the response counters, both tables are sharded: each transaction
+adds to one of TALLY_SHARDS rows per key, chosen at random, and readers sum
+the shards. Concurrent submits to the same survey then mostly lock
+different rows instead of queueing on one row per question. Reading a
+survey's results is O(questions x shards) instead of O(responses).
+Increments are upserts applied in key order within one shard, so
+concurrent submits can't deadlock. `flask tallies rebuild` recomputes
+everything from the stored responses (into shard 0) and reports any drift.
+"""
+import math
+import random
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, delete, insert
+from . import db
+from .counters import upsert_add
+
+
+# -----------------------------
+# Deltas
+# -----------------------------
+def tally_deltas(rows):
+    """
+    Fold Answer row dicts (see answers.answer_rows) into increments.
+
+    Returns (value_deltas, question_deltas):
+    {(survey_id, question_id, value): count} and
+    {(survey_id, question_id): [answered, value_sum, value_sum_sq]}.
+    """
+    values = {}
+    questions = {}
+    seen = set()
+    for row in rows:
+        key = (row["survey_id"], row["question_id"])
+        totals = questions.setdefault(key, [0, 0, 0])
+        if (row["response_id"], row["question_id"]) not in seen:
+            seen.add((row["response_id"], row["question_id"]))
+            totals[0] += 1
+        if row["option_id"] is not None:
+            value = row["option_id"]
+        elif row["numeric_value"] is not None:
+            value = row["numeric_value"]
+            totals[1] += value
+            totals[2] += value * value
+        else:
+            continue
+        values[key + (value,)] = values.get(key + (value,), 0) + 1
+    return values, questions
+
+
+def _shards():
+    from flask import current_app
+    return max(1, int(current_app.config.get("TALLY_SHARDS", 8)))
+
+
+def record_tallies(rows):
+    """Add a batch of Answer rows to one random tally shard, in the caller's transaction."""
+    from .models.survey import AnswerTally, QuestionTally
+
+    values, questions = tally_deltas(rows)
+    shard = random.randrange(_shards())
+    for (survey_id, question_id), (answered, value_sum, value_sum_sq) in sorted(questions.items()):
+        upsert_add(
+            QuestionTally.__table__,
+            {"question_id": question_id, "shard": shard},
+            {"answered": answered, "value_sum": value_sum, "value_sum_sq": value_sum_sq},
+            defaults={"survey_id": survey_id},
+        )
+    for (survey_id, question_id, value), count in sorted(values.items()):
+        upsert_add(
+            AnswerTally.__table__,
+            {"question_id": question_id, "value": value, "shard": shard},
+            {"count": count},
+            defaults={"survey_id": survey_id},
+        )
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def _question_totals():
+    """Select of (question_id, answered, value_sum, value_sum_sq) summed over shards."""
+    from .models.survey import QuestionTally
+
+    return (
+        select(QuestionTally.question_id, func.sum(QuestionTally.answered),
+               func.sum(QuestionTally.value_sum), func.sum(QuestionTally.value_sum_sq))
+        .group_by(QuestionTally.question_id)
+    )
+
+
+def _value_totals():
+    """Select of (question_id, value, count) summed over shards."""
+    from .models.survey import AnswerTally
+
+    return (
+        select(AnswerTally.question_id, AnswerTally.value, func.sum(AnswerTally.count))
+        .group_by(AnswerTally.question_id, AnswerTally.value)
+    )
+
+
+def answered_count(question_id):
+    """Respondents who answered the question, from the tallies."""
+    from .models.survey import QuestionTally
+
+    return int(db.session.execute(
+        select(func.sum(QuestionTally.answered)).where(QuestionTally.question_id == question_id)
+    ).scalar() or 0)
+
+
+def _percentages(counts, base):
+    return [round(count * 100.0 / base, 1) if base else 0.0 for count in counts]
+
+
+def _median_from_histogram(values, counts, n):
+    """Median of n observations given as a sorted value histogram."""
+    lower_rank, upper_rank = (n - 1) // 2, n // 2
+    lower = upper = None
+    seen = 0
+    for value, count in zip(values, counts):
+        if lower is None and seen + count > lower_rank:
+            lower = value
+        if seen + count > upper_rank:
+            upper = value
+            break
+        seen += count
+    return (lower + upper) / 2.0
+
+
+def tally_summary(compiled):
+    """
+    Per-question results from the tally tables, in the same shape as
+    analytics.survey_analytics (minus checkbox selection combinations).
+    """
+    from . import counters
+    from .models.survey import AnswerTally, QuestionTally
+
+    question_rows = {
+        question_id: (int(answered), int(value_sum), int(value_sum_sq))
+        for question_id, answered, value_sum, value_sum_sq in db.session.execute(
+            _question_totals().where(QuestionTally.survey_id == compiled.id)
+        )
+    }
+    value_counts = {}
+    for question_id, value, count in db.session.execute(
+        _value_totals().where(AnswerTally.survey_id == compiled.id)
+    ):
+        value_counts.setdefault(question_id, {})[value] = int(count)
+
+    questions = []
+    for question in compiled.questions:
+        answered, value_sum, value_sum_sq = question_rows.get(question.id, (0, 0, 0))
+        counts_by_value = value_counts.get(question.id, {})
+        stats = {"answered": answered}
+        if question.qtype in ("multiple_choice", "dropdown", "checkbox"):
+            counts = [counts_by_value.get(option.id, 0) for option in question.options]
+            stats.update(
+                options=[option.text for option in question.options],
+                counts=counts,
+                percentages=_percentages(counts, answered),
+            )
+        elif question.qtype == "linear_scale":
+            scale = list(range(question.linear_scale_low, question.linear_scale_high + 1))
+            counts = [counts_by_value.get(value, 0) for value in scale]
+            stats.update(values=scale, counts=counts, percentages=_percentages(counts, answered),
+                         mean=None, median=None, stdev=None, min=None, max=None)
+            if answered:
+                observed = [value for value, count in zip(scale, counts) if count]
+                variance = (value_sum_sq - value_sum * value_sum / answered) / (answered - 1) if answered > 1 else 0.0
+                stats.update(
+                    mean=round(value_sum / answered, 3),
+                    median=_median_from_histogram(scale, counts, sum(counts)) if observed else None,
+                    stdev=round(math.sqrt(max(variance, 0.0)), 3),
+                    min=observed[0] if observed else None,
+                    max=observed[-1] if observed else None,
+                )
+        stats.update(id=question.id, text=question.text, type=question.qtype)
+        questions.append(stats)
+
+    return {
+        "survey_id": compiled.id,
+        "responses": counters.get_count(compiled.id),
+        "questions": questions,
+    }
+
+
+# -----------------------------
+# Rebuild
+# -----------------------------
+def _stored_tallies(survey_id):
+    from .models.survey import AnswerTally, QuestionTally
+
+    values = {
+        (survey_id, question_id, value): int(count)
+        for question_id, value, count in db.session.execute(
+            _value_totals().where(AnswerTally.survey_id == survey_id)
+        )
+    }
+    questions = {
+        (survey_id, question_id): [int(answered), int(value_sum), int(value_sum_sq)]
+        for question_id, answered, value_sum, value_sum_sq in db.session.execute(
+            _question_totals().where(QuestionTally.survey_id == survey_id)
+        )
+    }
+    return values, questions
+
+
+def rebuild_survey(survey_id, check_only=False):
+    """
+    Recompute one survey's tallies from its stored responses. Returns the
+    number of tally rows that differed; unless check_only, they're rewritten.
+    """
+    from .answers import answer_rows
+    from .exports import iter_response_rows
+    from .models.survey import AnswerTally, QuestionTally, Survey
+    from .response_codec import definition_for
+
+    compiled = definition_for(survey_id)
+    if compiled is None:
+        return 0
+
+    # Lock the survey row, then its tally rows (every shard), so submits in
+    # flight land either before the recount (and are included) or after the
+    # rewrite (and add on top). The survey row covers shard rows that don't
+    # exist yet: inserting one takes a key-share lock on it through the
+    # foreign key, which waits for FOR UPDATE.
+    db.session.execute(select(Survey.id).where(Survey.id == survey_id).with_for_update())
+    db.session.execute(select(QuestionTally.question_id)
+                       .where(QuestionTally.survey_id == survey_id).with_for_update())
+    db.session.execute(select(AnswerTally.question_id)
+                       .where(AnswerTally.survey_id == survey_id).with_for_update())
+
+    values, questions = {}, {}
+    for response_id, _, _, blob in iter_response_rows(survey_id):
+        if not blob:
+            continue
+        batch_values, batch_questions = tally_deltas(answer_rows(response_id, compiled, blob))
+        for key, count in batch_values.items():
+            values[key] = values.get(key, 0) + count
+        for key, totals in batch_questions.items():
+            current = questions.setdefault(key, [0, 0, 0])
+            for i, amount in enumerate(totals):
+                current[i] += amount
+
+    stored_values, stored_questions = _stored_tallies(survey_id)
+    drift = sum(1 for key in set(values) | set(stored_values) if values.get(key, 0) != stored_values.get(key, 0))
+    drift += sum(1 for key in set(questions) | set(stored_questions)
+                 if questions.get(key, [0, 0, 0]) != stored_questions.get(key, [0, 0, 0]))
+
+    if drift and not check_only:
+        db.session.execute(delete(AnswerTally).where(AnswerTally.survey_id == survey_id))
+        db.session.execute(delete(QuestionTally).where(QuestionTally.survey_id == survey_id))
+        if questions:
+            db.session.execute(insert(QuestionTally.__table__), [
+                {"survey_id": sid, "question_id": qid, "shard": 0, "answered": answered,
+                 "value_sum": value_sum, "value_sum_sq": value_sum_sq}
+                for (sid, qid), (answered, value_sum, value_sum_sq) in questions.items()
+            ])
+        if values:
+            db.session.execute(insert(AnswerTally.__table__), [
+                {"survey_id": sid, "question_id": qid, "value": value, "shard": 0, "count": count}
+                for (sid, qid, value), count in values.items()
+            ])
+    if check_only:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return drift
+
+
+tallies_cli = AppGroup("tallies", help="Running answer tally maintenance.")
+
+
+@tallies_cli.command("rebuild")
+@click.option("--survey-id", type=int, default=None, help="Only rebuild this survey.")
+@click.option("--check", is_flag=True, help="Only report drift; don't rewrite anything.")
+def rebuild_command(survey_id, check):
+    """Recompute answer tallies from the stored responses."""
+    from .models.survey import Survey
+
+    if survey_id is not None:
+        survey_ids = [survey_id]
+    else:
+        survey_ids = db.session.execute(select(Survey.id).order_by(Survey.id)).scalars().all()
+    drifted = 0
+    for sid in survey_ids:
+        drift = rebuild_survey(sid, check_only=check)
+        if drift:
+            drifted += 1
+            click.echo(f"survey {sid}: {drift} tally row(s) {'differ' if check else 'rewritten'}")
+    click.echo(f"{drifted} of {len(survey_ids)} survey(s) had drifted")
+
+
+def init_app(app):
+    app.cli.add_command(tallies_cli)
@@ -0,0 +1,365 @@
+# text_index.py
+"""
+Incremental inverted index over short and paragraph answers.
+
+For every text question, text_index_term holds one row per term with its
+document frequency, total occurrences and a posting list of
+(response_id, term frequency) pairs. Posting lists are stored as
+delta-encoded varints: response ids only grow, so each entry is usually one
+or two bytes, and new responses are indexed by appending to the blob.
+
+Indexing happens in batches of TEXT_INDEX_BATCH_SIZE responses past each
+survey's high-water mark (text_index_state). Surveys are marked dirty on
+submit and picked up by a background pass every TEXT_INDEX_INTERVAL_SECONDS;
+searches also catch up first so results are current. Responses younger
+than TEXT_INDEX_LAG_SECONDS are left for the next pass so a transaction
+that commits slightly out of id order isn't skipped. `flask textindex
+rebuild` re-indexes a survey from scratch.
+
+On top of the index: keyword search (all terms must match, ranked by
+tf-idf), top-N terms, and drill-down to the responses mentioning a term.
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, update, delete, insert, bindparam, func
+from . import db
+from .counters import upsert_add
+from .tallies import answered_count
+from .workers import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = ("short", "paragraph")
+MAX_TERM_LENGTH = 64
+
+TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can could did do does
+for from had has have he her him his how i if in into is it its just me more most my no not
+of on or our out so some than that the their them then there these they this to too up us
+very was we were what when which who will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased terms of `text`, minus stopwords and one-letter tokens."""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+# -----------------------------
+# Posting lists
+# -----------------------------
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(pairs, previous_id=0):
+    """Encode ascending (response_id, tf) pairs as varint (id delta, tf) pairs."""
+    values = []
+    for response_id, tf in pairs:
+        values.append(response_id - previous_id)
+        values.append(tf)
+        previous_id = response_id
+    if values and max(values) < 0x80:
+        return bytes(values)  # common case: every varint is a single byte
+    out = bytearray()
+    for value in values:
+        if value < 0x80:
+            out.append(value)
+        else:
+            _write_varint(out, value)
+    return bytes(out)
+
+
+def decode_postings(blob):
+    """Inverse of encode_postings: {response_id: tf}, in ascending id order."""
+    blob = bytes(blob)
+    if not blob:
+        return {}
+    if max(blob) < 0x80:
+        values = list(blob)
+    else:
+        values = []
+        value = shift = 0
+        for byte in blob:
+            value |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            values.append(value)
+            value = shift = 0
+    return dict(zip(accumulate(values[0::2]), values[1::2]))
+
+
+# -----------------------------
+# Indexing
+# -----------------------------
+def _settings():
+    config = current_app.config
+    return (
+        int(config.get("TEXT_INDEX_BATCH_SIZE", 5000)),
+        int(config.get("TEXT_INDEX_LAG_SECONDS", 5)),
+    )
+
+
+def _apply_batch(survey_id, rows):
+    """Merge (response_id, question_id, text) rows into the term table."""
+    from .models.survey import TextIndexTerm
+
+    additions = {}  # (question_id, term) -> [(response_id, tf), ...] ascending
+    for response_id, question_id, text in rows:
+        for token, tf in Counter(tokenize(text)).items():
+            additions.setdefault((question_id, token), []).append((response_id, tf))
+    if not additions:
+        return
+
+    table = TextIndexTerm.__table__
+    existing = {}
+    for question_id in {question_id for question_id, _ in additions}:
+        terms = [term for qid, term in additions if qid == question_id]
+        for start in range(0, len(terms), 1000):
+            for row in db.session.execute(
+                select(table.c.term, table.c.doc_count, table.c.term_count,
+                       table.c.last_response_id, table.c.postings)
+                .where(table.c.question_id == question_id, table.c.term.in_(terms[start:start + 1000]))
+            ):
+                existing[(question_id, row.term)] = row
+
+    updates, inserts = [], []
+    for (question_id, term), pairs in additions.items():
+        pairs.sort()
+        docs = len(pairs)
+        occurrences = sum(tf for _, tf in pairs)
+        row = existing.get((question_id, term))
+        if row is None:
+            inserts.append({
+                "question_id": question_id, "term": term, "survey_id": survey_id,
+                "doc_count": docs, "term_count": occurrences,
+                "last_response_id": pairs[-1][0], "postings": encode_postings(pairs),
+            })
+            continue
+        if pairs[0][0] > row.last_response_id:
+            postings = bytes(row.postings) + encode_postings(pairs, row.last_response_id)
+        else:
+            # Out-of-order ids (e.g. after a partial rebuild): merge and re-encode
+            merged = decode_postings(row.postings)
+            docs = occurrences = 0
+            for response_id, tf in pairs:
+                docs += response_id not in merged
+                occurrences += tf - merged.get(response_id, 0)
+                merged[response_id] = tf
+            postings = encode_postings(sorted(merged.items()))
+        updates.append({
+            "qid": question_id, "t": term,
+            "doc_count": row.doc_count + docs, "term_count": row.term_count + occurrences,
+            "last_response_id": max(row.last_response_id, pairs[-1][0]), "postings": postings,
+        })
+
+    if inserts:
+        db.session.execute(insert(table), inserts)
+    if updates:
+        db.session.execute(
+            update(table)
+            .where(table.c.question_id == bindparam("qid"), table.c.term == bindparam("t"))
+            .values(doc_count=bindparam("doc_count"), term_count=bindparam("term_count"),
+                    last_response_id=bindparam("last_response_id"), postings=bindparam("postings")),
+            updates,
+        )
+
+
+def refresh(survey_id, max_batches=None):
+    """Index text answers newer than the survey's high-water mark. Returns responses indexed."""
+    from .models.survey import Answer, SurveyResponse, TextIndexState
+
+    batch_size, lag = _settings()
+    # The state row doubles as the per-survey indexing lock
+    upsert_add(TextIndexState.__table__, {"survey_id": survey_id}, {"indexed_through": 0})
+    db.session.commit()
+
+    indexed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        high_water = db.session.execute(
+            select(TextIndexState.indexed_through)
+            .where(TextIndexState.survey_id == survey_id).with_for_update()
+        ).scalar_one()
+
+        # Next batch: responses (not answer rows) past the mark, old enough to be committed
+        pending = (
+            select(Answer.response_id)
+            .join(SurveyResponse, SurveyResponse.id == Answer.response_id)
+            .where(Answer.survey_id == survey_id, Answer.text_value.isnot(None),
+                   Answer.response_id > high_water,
+                   SurveyResponse.created_at <= datetime.utcnow() - timedelta(seconds=lag))
+            .distinct()
+            .order_by(Answer.response_id)
+        )
+        upper = db.session.execute(pending.offset(batch_size).limit(1)).scalar()
+        if upper is None:
+            last = db.session.execute(pending.order_by(None).with_only_columns(func.max(Answer.response_id))).scalar()
+            if last is None:
+                db.session.commit()
+                break
+            upper = last + 1
+
+        rows = db.session.execute(
+            select(Answer.response_id, Answer.question_id, Answer.text_value)
+            .where(Answer.survey_id == survey_id, Answer.text_value.isnot(None),
+                   Answer.response_id > high_water, Answer.response_id < upper)
+            .order_by(Answer.response_id)
+        ).all()
+        _apply_batch(survey_id, rows)
+        db.session.execute(
+            update(TextIndexState).where(TextIndexState.survey_id == survey_id)
+            .values(indexed_through=upper - 1)
+        )
+        db.session.commit()
+        indexed += len({row.response_id for row in rows})
+        batches += 1
+    return indexed
+
+
+def rebuild(survey_id):
+    """Drop and rebuild one survey's index."""
+    from .models.survey import TextIndexTerm, TextIndexState
+
+    db.session.execute(delete(TextIndexTerm).where(TextIndexTerm.survey_id == survey_id))
+    db.session.execute(delete(TextIndexState).where(TextIndexState.survey_id == survey_id))
+    db.session.commit()
+    return refresh(survey_id)
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def top_terms(question_id, limit=20):
+    """Most widespread terms: [{"term", "responses", "occurrences"}]."""
+    from .models.survey import TextIndexTerm
+
+    rows = db.session.execute(
+        select(TextIndexTerm.term, TextIndexTerm.doc_count, TextIndexTerm.term_count)
+        .where(TextIndexTerm.question_id == question_id)
+        .order_by(TextIndexTerm.doc_count.desc(), TextIndexTerm.term)
+        .limit(limit)
+    )
+    return [{"term": term, "responses": docs, "occurrences": count} for term, docs, count in rows]
+
+
+def search(question_id, query, page=1, per_page=20):
+    """
+    Responses whose answer to `question_id` contains every term of `query`,
+    best tf-idf match first. A one-word query is the "responses mentioning
+    X" drill-down.
+    """
+    from .models.survey import Answer, TextIndexTerm
+
+    terms = sorted(set(tokenize(query)))
+    result = {"query": query, "terms": terms, "total": 0, "page": page, "per_page": per_page, "results": []}
+    if not terms:
+        return result
+
+    rows = db.session.execute(
+        select(TextIndexTerm.term, TextIndexTerm.doc_count, TextIndexTerm.postings)
+        .where(TextIndexTerm.question_id == question_id, TextIndexTerm.term.in_(terms))
+    ).all()
+    if len(rows) < len(terms):
+        return result  # some term never occurs
+
+    answered = answered_count(question_id) or max(row.doc_count for row in rows)
+
+    rows.sort(key=lambda row: row.doc_count)
+    scores = None
+    for row in rows:
+        postings = decode_postings(row.postings)
+        idf = math.log(1 + answered / row.doc_count)
+        if scores is None:
+            scores = {response_id: tf * idf for response_id, tf in postings.items()}
+        else:
+            scores = {response_id: score + postings[response_id] * idf
+                      for response_id, score in scores.items() if response_id in postings}
+        if not scores:
+            return result
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    result["total"] = len(ranked)
+    page_items = ranked[(page - 1) * per_page:page * per_page]
+    texts = dict(db.session.execute(
+        select(Answer.response_id, Answer.text_value)
+        .where(Answer.question_id == question_id, Answer.response_id.in_([rid for rid, _ in page_items]))
+    ).all()) if page_items else {}
+    result["results"] = [
+        {"response_id": response_id, "score": round(score, 4), "text": texts.get(response_id, "")}
+        for response_id, score in page_items
+    ]
+    return result
+
+
+# -----------------------------
+# Background indexing
+# -----------------------------
+class TextIndexer(PeriodicWorker):
+    """Indexes surveys marked dirty by submits every TEXT_INDEX_INTERVAL_SECONDS."""
+
+    thread_name = "text-indexer"
+
+    def __init__(self):
+        super().__init__()
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = int(app.config.get("TEXT_INDEX_INTERVAL_SECONDS", 0))
+        app.cli.add_command(textindex_cli)
+
+    def mark_dirty(self, survey_id):
+        with self._lock:
+            self._dirty.add(survey_id)
+        self.ensure_started()
+
+    def tick(self):
+        with self._lock:
+            surveys, self._dirty = self._dirty, set()
+        with self.app.app_context():
+            for survey_id in sorted(surveys):
+                try:
+                    refresh(survey_id)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Text indexing failed for survey %s", survey_id)
+
+
+indexer = TextIndexer()
+
+
+textindex_cli = AppGroup("textindex", help="Text answer index maintenance.")
+
+
+@textindex_cli.command("rebuild")
+@click.option("--survey-id", type=int, default=None, help="Only rebuild this survey.")
+def rebuild_command(survey_id):
+    """Re-index short/paragraph answers from the answer table."""
+    from .models.survey import Survey
+
+    if survey_id is not None:
+        survey_ids = [survey_id]
+    else:
+        survey_ids = db.session.execute(select(Survey.id).order_by(Survey.id)).scalars().all()
+    for sid in survey_ids:
+        click.echo(f"survey {sid}: {rebuild(sid)} response(s) indexed")
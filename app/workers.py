@@ -0,0 +1,75 @@
+# workers.py
+"""
+Per-process background threads.
+
+Threads don't survive a fork, and gunicorn's preload_app forks after
+create_app, so the extensions that keep a daemon thread (flushers,
+compactors, senders) start it lazily and start it again when the pid
+changes. DaemonThread is that start-up logic; PeriodicWorker adds the
+sleep-then-work loop most of them run.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonThread:
+    """A daemon thread running `target`, started on demand once per process."""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self):
+        if self.is_alive():
+            return
+        with self._lock:
+            if self.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+
+    def join(self, timeout=None):
+        if self.is_alive():
+            self._thread.join(timeout)
+
+
+class PeriodicWorker:
+    """
+    Base for extensions calling tick() every `interval` seconds in a
+    background thread. Subclasses name the thread, set `interval` in init_app
+    (0 or less leaves the thread off) and implement tick().
+    """
+
+    thread_name = "periodic-worker"
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0
+        self._worker = DaemonThread(self.thread_name, self._run)
+
+    def ensure_started(self):
+        if self.interval > 0:
+            self._worker.ensure_started()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception:
+                # tick() handles its own errors; this only keeps the thread alive
+                logger.exception("%s pass failed", self.thread_name)
+
+    def tick(self):
+        raise NotImplementedError
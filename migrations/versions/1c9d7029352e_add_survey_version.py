@@ -0,0 +1,26 @@
+"""Add survey.version for respondent cache invalidation
+
+Revision ID: 1c9d7029352e
+Revises: 2ec7c2473d88
+Create Date: 2026-10-17 10:02:17.904533
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c9d7029352e'
+down_revision = '2ec7c2473d88'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,33 @@
+"""Add response_rollup time-bucket table
+
+Revision ID: 21864b66e538
+Revises: eb82a3cd29a6
+Create Date: 2026-10-17 16:42:19.083516
+
+Fill it for existing responses with `flask rollups rebuild`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '21864b66e538'
+down_revision = 'eb82a3cd29a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('response_rollup',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_seconds', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id', 'bucket_seconds', 'bucket_start')
+    )
+
+
+def downgrade():
+    op.drop_table('response_rollup')
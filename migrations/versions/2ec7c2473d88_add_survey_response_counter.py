@@ -0,0 +1,36 @@
+"""Add sharded survey_response_counter table
+
+Revision ID: 2ec7c2473d88
+Revises: bfb95ec19ad0
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ec7c2473d88'
+down_revision = 'bfb95ec19ad0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('survey_response_counter',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id', 'shard')
+    )
+
+    # Seed shard 0 of every survey with its current real response count
+    op.execute("""
+        INSERT INTO survey_response_counter (survey_id, shard, count)
+        SELECT survey_id, 0, COUNT(*) FROM survey_response GROUP BY survey_id
+    """)
+
+
+def downgrade():
+    op.drop_table('survey_response_counter')
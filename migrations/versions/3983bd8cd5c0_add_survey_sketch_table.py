@@ -0,0 +1,34 @@
+"""Add survey_sketch table for approximate analytics
+
+Revision ID: 3983bd8cd5c0
+Revises: 713eaa8b6fe5
+Create Date: 2026-10-17 19:04:27.318845
+
+Existing surveys have no sketches until `flask sketches rebuild` runs;
+new responses are folded in as they arrive.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3983bd8cd5c0'
+down_revision = '713eaa8b6fe5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('survey_sketch',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('survey_sketch')
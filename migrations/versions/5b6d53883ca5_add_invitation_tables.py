@@ -0,0 +1,64 @@
+"""Add invitation_batch and invitation tables for bulk survey invitations
+
+Revision ID: 5b6d53883ca5
+Revises: f5082b6fa846
+Create Date: 2026-10-17 21:04:12.318840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b6d53883ca5'
+down_revision = 'f5082b6fa846'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('invitation_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.String(length=12), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('base_url', sa.String(length=500), nullable=False),
+    sa.Column('imported', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('next_send_at', sa.DateTime(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_invitation_batch_survey_id', 'invitation_batch', ['survey_id'])
+    op.create_table('invitation',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=254), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=True),
+    sa.Column('token', sa.String(length=32), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('queued_at', sa.DateTime(), nullable=True),
+    sa.Column('opened_at', sa.DateTime(), nullable=True),
+    sa.Column('clicked_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['invitation_batch.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('survey_id', 'email', name='uq_invitation_survey_email'),
+    sa.UniqueConstraint('token')
+    )
+    op.create_index('ix_invitation_batch_status', 'invitation', ['batch_id', 'status', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_invitation_batch_status', table_name='invitation')
+    op.drop_table('invitation')
+    op.drop_index('ix_invitation_batch_survey_id', table_name='invitation_batch')
+    op.drop_table('invitation_batch')
@@ -0,0 +1,25 @@
+"""Add indexes for the dashboard's aggregate query
+
+Revision ID: 5e7b2f249b2c
+Revises: 3983bd8cd5c0
+Create Date: 2026-10-17 19:42:10.904512
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b2f249b2c'
+down_revision = '3983bd8cd5c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_survey_user_created', 'survey', ['user_id', 'created_at', 'id'])
+    op.create_index('ix_question_survey_id', 'question', ['survey_id'])
+
+
+def downgrade():
+    op.drop_index('ix_question_survey_id', table_name='question')
+    op.drop_index('ix_survey_user_created', table_name='survey')
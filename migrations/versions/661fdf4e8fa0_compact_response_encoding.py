@@ -0,0 +1,126 @@
+"""Rewrite survey_response.responses into the compact v2 encoding
+
+Revision ID: 661fdf4e8fa0
+Revises: 1c9d7029352e
+Create Date: 2026-10-17 11:26:53.170842
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '661fdf4e8fa0'
+down_revision = '1c9d7029352e'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Kept local so the migration doesn't depend on app code that may change later
+CHOICE_TYPES = ('multiple_choice', 'dropdown')
+OPTION_TYPES = ('multiple_choice', 'dropdown', 'checkbox')
+
+
+def _load_definition(bind, survey_id):
+    questions = {}
+    rows = bind.execute(sa.text(
+        "SELECT id, text, qtype, linear_scale_low, linear_scale_high "
+        "FROM question WHERE survey_id = :sid ORDER BY id"
+    ), {'sid': survey_id}).all()
+    for qid, text, qtype, low, high in rows:
+        questions[qid] = {
+            'text': text, 'qtype': qtype,
+            'low': low if low is not None else 1, 'high': high if high is not None else 5,
+            'by_text': {}, 'by_id': {},
+        }
+    if questions:
+        options = bind.execute(sa.text(
+            "SELECT id, text, question_id FROM question_option "
+            "WHERE question_id IN :qids ORDER BY id"
+        ).bindparams(sa.bindparam('qids', expanding=True)), {'qids': list(questions)}).all()
+        for oid, text, qid in options:
+            questions[qid]['by_text'].setdefault(text, oid)
+            questions[qid]['by_id'][oid] = text
+    return questions
+
+
+def _encode(blob, questions):
+    answers = {}
+    for key, answer in blob.items():
+        question = questions.get(int(key)) if key.isdigit() else None
+        value = answer.get('response') if isinstance(answer, dict) else answer
+        if question is None or value is None or value == '' or value == []:
+            continue
+        if question['qtype'] in CHOICE_TYPES:
+            value = question['by_text'].get(value, value)
+        elif question['qtype'] == 'checkbox':
+            value = [question['by_text'].get(item, item) for item in value]
+        elif question['qtype'] == 'linear_scale':
+            try:
+                number = int(value)
+                if question['low'] <= number <= question['high']:
+                    value = number
+            except (TypeError, ValueError):
+                pass
+        answers[key] = value
+    return {'v': 2, 'a': answers}
+
+
+def _decode(blob, questions):
+    decoded = {}
+    answers = blob.get('a', {})
+    for qid, question in questions.items():
+        value = answers.get(str(qid))
+        if value is not None and question['qtype'] in OPTION_TYPES:
+            if question['qtype'] == 'checkbox':
+                value = [question['by_id'].get(item, item) if isinstance(item, int) else item for item in value]
+            elif isinstance(value, int):
+                value = question['by_id'].get(value, value)
+        elif question['qtype'] == 'linear_scale' and isinstance(value, int):
+            value = str(value)
+        decoded[str(qid)] = {
+            'question_text': question['text'],
+            'question_type': question['qtype'],
+            'response': value,
+        }
+    return decoded
+
+
+def _rewrite(convert):
+    """Walk survey_response in id order, reading and updating BATCH_SIZE rows at a time."""
+    bind = op.get_bind()
+    definitions = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, survey_id, responses FROM survey_response "
+            "WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        updates = []
+        for rid, survey_id, raw in rows:
+            last_id = rid
+            if not raw:
+                continue
+            blob = json.loads(raw)
+            if survey_id not in definitions:
+                definitions[survey_id] = _load_definition(bind, survey_id)
+            converted = convert(blob, definitions[survey_id])
+            if converted is not None:
+                updates.append({'rid': rid, 'responses': json.dumps(converted, separators=(',', ':'))})
+        if updates:
+            bind.execute(sa.text(
+                "UPDATE survey_response SET responses = :responses WHERE id = :rid"
+            ), updates)
+
+
+def upgrade():
+    _rewrite(lambda blob, questions: None if blob.get('v') == 2 else _encode(blob, questions))
+
+
+def downgrade():
+    _rewrite(lambda blob, questions: _decode(blob, questions) if blob.get('v') == 2 else None)
@@ -0,0 +1,49 @@
+"""Add inverted text index tables for short/paragraph answers
+
+Revision ID: 713eaa8b6fe5
+Revises: 21864b66e538
+Create Date: 2026-10-17 17:31:52.664120
+
+The index fills itself as surveys are searched; `flask textindex rebuild`
+builds it up front.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '713eaa8b6fe5'
+down_revision = '21864b66e538'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('text_index_term',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=64), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('doc_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('term_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_response_id', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('postings', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id', 'term')
+    )
+    op.create_index('ix_text_index_term_survey_id', 'text_index_term', ['survey_id'])
+    op.create_index('ix_text_index_term_question_doc_count', 'text_index_term', ['question_id', 'doc_count'])
+    op.create_table('text_index_state',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('indexed_through', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id')
+    )
+
+
+def downgrade():
+    op.drop_table('text_index_state')
+    op.drop_index('ix_text_index_term_question_doc_count', table_name='text_index_term')
+    op.drop_index('ix_text_index_term_survey_id', table_name='text_index_term')
+    op.drop_table('text_index_term')
@@ -0,0 +1,66 @@
+"""Shard question_tally and answer_tally rows
+
+Revision ID: 9d3f6a1c7e52
+Revises: c41e7a9d2b63
+Create Date: 2026-10-18 10:05:37.204418
+
+Existing rows become shard 0, so totals are unchanged.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6a1c7e52'
+down_revision = 'c41e7a9d2b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('question_tally', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+        batch_op.drop_constraint('question_tally_pkey', type_='primary')
+        batch_op.create_primary_key('question_tally_pkey', ['question_id', 'shard'])
+
+    with op.batch_alter_table('answer_tally', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+        batch_op.drop_constraint('answer_tally_pkey', type_='primary')
+        batch_op.create_primary_key('answer_tally_pkey', ['question_id', 'value', 'shard'])
+
+
+def downgrade():
+    # Fold the shards back into one row per key before dropping the column
+    op.execute("""
+        CREATE TEMPORARY TABLE answer_tally_folded AS
+        SELECT question_id, value, survey_id, SUM(count) AS count
+        FROM answer_tally GROUP BY question_id, value, survey_id
+    """)
+    op.execute("DELETE FROM answer_tally")
+    with op.batch_alter_table('answer_tally', schema=None) as batch_op:
+        batch_op.drop_constraint('answer_tally_pkey', type_='primary')
+        batch_op.drop_column('shard')
+        batch_op.create_primary_key('answer_tally_pkey', ['question_id', 'value'])
+    op.execute("""
+        INSERT INTO answer_tally (question_id, value, survey_id, count)
+        SELECT question_id, value, survey_id, count FROM answer_tally_folded
+    """)
+    op.execute("DROP TABLE answer_tally_folded")
+
+    op.execute("""
+        CREATE TEMPORARY TABLE question_tally_folded AS
+        SELECT question_id, survey_id, SUM(answered) AS answered,
+               SUM(value_sum) AS value_sum, SUM(value_sum_sq) AS value_sum_sq
+        FROM question_tally GROUP BY question_id, survey_id
+    """)
+    op.execute("DELETE FROM question_tally")
+    with op.batch_alter_table('question_tally', schema=None) as batch_op:
+        batch_op.drop_constraint('question_tally_pkey', type_='primary')
+        batch_op.drop_column('shard')
+        batch_op.create_primary_key('question_tally_pkey', ['question_id'])
+    op.execute("""
+        INSERT INTO question_tally (question_id, survey_id, answered, value_sum, value_sum_sq)
+        SELECT question_id, survey_id, answered, value_sum, value_sum_sq FROM question_tally_folded
+    """)
+    op.execute("DROP TABLE question_tally_folded")
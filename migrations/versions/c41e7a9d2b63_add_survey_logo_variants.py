@@ -0,0 +1,26 @@
+"""Add survey.logo_variants for processed logo sizes
+
+Revision ID: c41e7a9d2b63
+Revises: 5b6d53883ca5
+Create Date: 2026-10-17 22:41:09.318772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a9d2b63'
+down_revision = '5b6d53883ca5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('logo_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.drop_column('logo_variants')
@@ -0,0 +1,48 @@
+"""Add normalized answer table
+
+Revision ID: c4c3b03d8796
+Revises: 661fdf4e8fa0
+Create Date: 2026-10-17 12:40:05.611873
+
+Existing responses are backfilled with `flask answers backfill`, which runs
+in resumable batches outside the migration transaction.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4c3b03d8796'
+down_revision = '661fdf4e8fa0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('answer',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('response_id', sa.Integer(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('option_id', sa.Integer(), nullable=True),
+    sa.Column('numeric_value', sa.Integer(), nullable=True),
+    sa.Column('text_value', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['response_id'], ['survey_response.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['option_id'], ['question_option.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_answer_question_option_response', 'answer', ['question_id', 'option_id', 'response_id'])
+    op.create_index('ix_answer_question_numeric', 'answer', ['question_id', 'numeric_value'])
+    op.create_index('ix_answer_response_question', 'answer', ['response_id', 'question_id'])
+    op.create_index('ix_answer_survey_question', 'answer', ['survey_id', 'question_id'])
+
+
+def downgrade():
+    op.drop_index('ix_answer_survey_question', table_name='answer')
+    op.drop_index('ix_answer_response_question', table_name='answer')
+    op.drop_index('ix_answer_question_numeric', table_name='answer')
+    op.drop_index('ix_answer_question_option_response', table_name='answer')
+    op.drop_table('answer')
@@ -0,0 +1,96 @@
+"""Convert survey_response.responses to JSONB with GIN indexing
+
+Revision ID: e887f1bbfdb5
+Revises: c4c3b03d8796
+Create Date: 2026-10-17 13:55:38.402716
+
+Runs online on PostgreSQL: a shadow JSONB column is kept in sync by a
+trigger while existing rows are copied over in committed batches, then the
+columns are swapped in one short transaction and the indexes are built
+CONCURRENTLY. Other databases just get the column type change.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e887f1bbfdb5'
+down_revision = 'c4c3b03d8796'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def _copy_in_batches(bind, source_expr, target):
+    max_id = bind.execute(sa.text("SELECT COALESCE(MAX(id), 0) FROM survey_response")).scalar()
+    start = 0
+    while start < max_id:
+        with op.get_context().autocommit_block():
+            bind.execute(sa.text(
+                f"UPDATE survey_response SET {target} = {source_expr} "
+                f"WHERE id > :start AND id <= :end AND {target} IS NULL AND responses IS NOT NULL"
+            ), {'start': start, 'end': start + BATCH_SIZE})
+        start += BATCH_SIZE
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('survey_response', schema=None) as batch_op:
+            batch_op.alter_column('responses', existing_type=sa.Text(), type_=sa.JSON())
+        return
+
+    op.add_column('survey_response', sa.Column('responses_jsonb', postgresql.JSONB(), nullable=True))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION survey_response_sync_jsonb() RETURNS trigger AS $$
+        BEGIN
+            NEW.responses_jsonb := NEW.responses::jsonb;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER survey_response_sync_jsonb
+        BEFORE INSERT OR UPDATE OF responses ON survey_response
+        FOR EACH ROW EXECUTE FUNCTION survey_response_sync_jsonb()
+    """)
+
+    _copy_in_batches(bind, 'responses::jsonb', 'responses_jsonb')
+
+    # Short swap: rows written since the last batch are covered by the trigger
+    with op.get_context().autocommit_block():
+        op.execute("BEGIN")
+        op.execute("LOCK TABLE survey_response IN ACCESS EXCLUSIVE MODE")
+        op.execute("UPDATE survey_response SET responses_jsonb = responses::jsonb "
+                   "WHERE responses_jsonb IS NULL AND responses IS NOT NULL")
+        op.execute("DROP TRIGGER survey_response_sync_jsonb ON survey_response")
+        op.execute("DROP FUNCTION survey_response_sync_jsonb()")
+        op.execute("ALTER TABLE survey_response DROP COLUMN responses")
+        op.execute("ALTER TABLE survey_response RENAME COLUMN responses_jsonb TO responses")
+        op.execute("COMMIT")
+
+    with op.get_context().autocommit_block():
+        # Containment lookups such as responses @> '{"a": {"12": 301}}'
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_survey_response_responses_gin "
+                   "ON survey_response USING gin (responses jsonb_path_ops)")
+        # Per-survey scans in id order (exports, backfills)
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_survey_response_survey_id_id "
+                   "ON survey_response (survey_id, id)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('survey_response', schema=None) as batch_op:
+            batch_op.alter_column('responses', existing_type=sa.JSON(), type_=sa.Text())
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_survey_response_survey_id_id")
+    op.execute("DROP INDEX IF EXISTS ix_survey_response_responses_gin")
+    op.alter_column('survey_response', 'responses',
+               existing_type=postgresql.JSONB(),
+               type_=sa.Text(),
+               postgresql_using='responses::text')
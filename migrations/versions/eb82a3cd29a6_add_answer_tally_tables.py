@@ -0,0 +1,50 @@
+"""Add running question_tally and answer_tally tables
+
+Revision ID: eb82a3cd29a6
+Revises: e887f1bbfdb5
+Create Date: 2026-10-17 15:20:07.551930
+
+The tables start empty; fill them for existing responses with
+`flask tallies rebuild`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eb82a3cd29a6'
+down_revision = 'e887f1bbfdb5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('question_tally',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('answered', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('value_sum', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('value_sum_sq', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+    op.create_index('ix_question_tally_survey_id', 'question_tally', ['survey_id'])
+    op.create_table('answer_tally',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id', 'value')
+    )
+    op.create_index('ix_answer_tally_survey_id', 'answer_tally', ['survey_id'])
+
+
+def downgrade():
+    op.drop_index('ix_answer_tally_survey_id', table_name='answer_tally')
+    op.drop_table('answer_tally')
+    op.drop_index('ix_question_tally_survey_id', table_name='question_tally')
+    op.drop_table('question_tally')
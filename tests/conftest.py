@@ -0,0 +1,71 @@
+import pytest
+
+from app import create_app, db
+from app.invitations import InvitationSender
+from app.mailer import MailDispatcher
+from app.page_cache import page_cache
+from app.survey_cache import survey_cache
+
+
+@pytest.fixture
+def make_app(tmp_path, tmp_path_factory, monkeypatch):
+    """create_app() on SQLite files under tmp_path, with extra config; tables are created."""
+    # Tests drive the outbox and invitation sender themselves
+    monkeypatch.setattr(MailDispatcher, "ensure_started", lambda self: None)
+    monkeypatch.setattr(InvitationSender, "ensure_started", lambda self: None)
+    assets = tmp_path_factory.getbasetemp() / "assets"  # built once per session
+
+    def make(**config):
+        settings = {
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "ASSET_BUILD_DIR": str(assets),
+            "PAGE_CACHE_DISK": False,
+            "EXPORT_STORE_DIR": str(tmp_path / "exports"),
+            "EXPORT_JOB_DIR": str(tmp_path / "export_jobs"),
+            "CHART_DIR": str(tmp_path / "charts"),
+            "INVITE_SPOOL_DIR": str(tmp_path / "invitations"),
+            "LOGO_DIR": str(tmp_path / "logos"),
+            "INGEST_SPOOL_PATH": str(tmp_path / "ingest_spool.jsonl"),
+            "INGEST_DEAD_LETTER_PATH": str(tmp_path / "ingest_dead_letter.jsonl"),
+            "METRICS_ENABLED": False,
+        }
+        settings.update(config)
+        # Process-wide caches are keyed by survey id, which every test database reuses
+        survey_cache.clear()
+        page_cache.clear()
+        app = create_app(settings)
+        with app.app_context():
+            # Default bind only: db keeps the "replica" metadata of earlier tests' apps
+            db.create_all(bind_key=None)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    # No context is pushed here: requests must each get their own, as in production
+    return make_app()
+
+
+@pytest.fixture
+def owner(app):
+    """A signed-up user; returns its id."""
+    from app.models.user import User
+
+    with app.app_context():
+        user = User(username="owner", email="owner@example.com", payment_status="basic",
+                    word_limit=1500, plan_name="Basic")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, owner):
+    client = app.test_client()
+    client.post("/login", data={"email": "owner@example.com", "password": "password"})
+    return client
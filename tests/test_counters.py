@@ -0,0 +1,27 @@
+from sqlalchemy import insert
+
+from app import counters, db
+from app.counters import reconciler
+
+
+def test_reconcile_rewrites_a_drifted_counter(app, owner):
+    from app.models.survey import Survey, SurveyResponse
+
+    with app.app_context():
+        survey = Survey(title="Counted", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.commit()
+        db.session.execute(insert(SurveyResponse.__table__), [
+            {"survey_id": survey.id, "responses": {}} for _ in range(3)])
+        counters.increment(survey.id, 5)
+        db.session.commit()
+
+        assert counters.reconcile_survey(survey.id) == (5, 3)
+        assert counters.get_count(survey.id) == 3
+        assert db.session.get(Survey, survey.id).response_count == 3
+        assert counters.reconcile_survey(survey.id) == (3, 3)
+
+
+def test_the_periodic_reconciler_is_opt_in(app):
+    assert reconciler.interval == 0
@@ -0,0 +1,103 @@
+import os
+import random
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app import db
+from app.crosstab import crosstab, segment
+from app.response_codec import definition_for
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def survey_app(request, make_app):
+    """The app on SQLite, and on PostgreSQL (where segments use the GIN index) when TEST_POSTGRES_URL is set."""
+    config = {}
+    if request.param == "postgresql":
+        if not os.environ.get("TEST_POSTGRES_URL"):
+            pytest.skip("set TEST_POSTGRES_URL to run against PostgreSQL")
+        config["SQLALCHEMY_DATABASE_URI"] = os.environ["TEST_POSTGRES_URL"]
+    app = make_app(**config)
+    yield app
+    if request.param == "postgresql":
+        with app.app_context():
+            db.drop_all()
+
+
+@pytest.fixture
+def answered(survey_app):
+    """A published survey with 60 responses; returns (survey id, [(colour, drinks, rating), ...])."""
+    from app.models.survey import Question, QuestionOption, Survey
+    from app.models.user import User
+
+    with survey_app.app_context():
+        user = User(username="owner", email="owner@example.com", payment_status="extended")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.flush()
+        survey = Survey(title="Segmented", user_id=user.id, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        colour = Question(text="Colour", qtype="multiple_choice", survey_id=survey.id)
+        colour.options = [QuestionOption(text=text) for text in ("Red", "Green", "Blue")]
+        drinks = Question(text="Drinks", qtype="checkbox", survey_id=survey.id)
+        drinks.options = [QuestionOption(text=text) for text in ("Tea", "Coffee")]
+        rating = Question(text="Rating", qtype="linear_scale", survey_id=survey.id,
+                          linear_scale_low=1, linear_scale_high=5)
+        db.session.add_all([colour, drinks, rating])
+        db.session.commit()
+        survey_id = survey.id
+        questions = [q.id for q in (colour, drinks, rating)]
+
+    client = survey_app.test_client()
+    rng = random.Random(11)
+    submitted = []
+    for _ in range(60):
+        picked = (rng.choice(["Red", "Green", "Blue"]), rng.sample(["Tea", "Coffee"], rng.randint(0, 2)),
+                  rng.randint(1, 5))
+        data = {f"question_{qid}": value for qid, value in zip(questions, picked)}
+        data[f"question_{questions[2]}"] = str(picked[2])
+        assert client.post(f"/survey/{survey_id}/submit", data=data).status_code == 302
+        submitted.append(picked)
+    return survey_id, submitted
+
+
+def test_segment_filters_by_checkbox_and_scale_answers(survey_app, answered):
+    survey_id, submitted = answered
+    with survey_app.app_context():
+        compiled = definition_for(survey_id)
+        colour, drinks, rating = compiled.questions
+        tea = drinks.option_ids["Tea"]
+
+        assert len(segment(compiled, drinks, [tea])) == sum("Tea" in d for _, d, _ in submitted)
+        assert len(segment(compiled, rating, [4, 5])) == sum(r >= 4 for _, _, r in submitted)
+        assert len(segment(compiled, rating, [])) == 0
+
+        result = crosstab(compiled, colour.id, rating.id, drinks.id, [tea])
+        tea_drinkers = [(c, r) for c, d, r in submitted if "Tea" in d]
+        assert result["respondents"] == len(tea_drinkers)
+        assert result["counts"][0][4] == sum(1 for c, r in tea_drinkers if (c, r) == ("Red", 5))
+
+
+def test_segments_are_jsonb_containment_on_postgresql(survey_app, answered):
+    from app.models.survey import SurveyResponse
+
+    with survey_app.app_context():
+        drinks = definition_for(answered[0]).questions[1]
+        clause = SurveyResponse.answered(drinks, drinks.option_ids["Coffee"])
+        sql = str(clause.compile(dialect=postgresql.dialect()))
+    assert "@>" in sql  # the operator the jsonb_path_ops GIN index serves
+
+
+def test_chi_square_is_null_for_checkbox_tables(survey_app, answered):
+    with survey_app.app_context():
+        colour, drinks, rating = definition_for(answered[0]).questions
+        single = crosstab(definition_for(answered[0]), colour.id, rating.id)
+        multi = crosstab(definition_for(answered[0]), colour.id, drinks.id)
+
+    assert single["chi_square"]["statistic"] is not None and 0 <= single["chi_square"]["p_value"] <= 1
+    assert not single["multi_select"]
+    assert multi["multi_select"]
+    assert multi["chi_square"]["statistic"] is None and multi["chi_square"]["p_value"] is None
+    assert sum(map(sum, multi["counts"])) > 0  # the table itself is still there
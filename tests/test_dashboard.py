@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db, counters
+from app.dashboard import SORTS
+
+
+@pytest.fixture
+def surveys(request, app, owner):
+    """The owner's surveys (30, or as parametrized), with 0..n-1 responses."""
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        start = datetime(2026, 1, 1)
+        for i in range(getattr(request, "param", 30)):
+            survey = Survey(title=f"Survey {i:02}", user_id=owner, published=i % 2 == 0,
+                            created_at=start + timedelta(hours=i))
+            survey.generate_slug()
+            db.session.add(survey)
+            db.session.flush()
+            db.session.add_all(Question(text=f"Q{n}", qtype="short", survey_id=survey.id) for n in range(i % 4))
+            counters.increment(survey.id, i)
+        db.session.commit()
+
+
+def count_statements(app, fn):
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+    return statements
+
+
+@pytest.mark.parametrize("surveys", [1, 30, 120], indirect=True)
+def test_dashboard_statement_count_is_independent_of_survey_count_page_size_and_sort(app, client, surveys):
+    counts = {}
+    for page_size in (1, 5, 25, 100):
+        app.config["DASHBOARD_PAGE_SIZE"] = page_size
+        for sort in SORTS:
+            for order in ("asc", "desc"):
+                def view():
+                    response = client.get(f"/dashboard?sort={sort}&order={order}")
+                    assert response.status_code == 200
+                counts[page_size, sort, order] = len(count_statements(app, view))
+
+    assert set(counts.values()) == {2}, counts  # the signed-in user, then the dashboard query
+
+
+def test_dashboard_next_page_costs_the_same(app, client, owner, surveys):
+    from app.dashboard import dashboard_page
+
+    app.config["DASHBOARD_PAGE_SIZE"] = 7
+    with app.app_context():
+        first = dashboard_page(owner, "responses", True, None, 7)
+    assert len(first["surveys"]) == 7
+    assert first["total_surveys"] == 30
+    assert first["total_responses"] == sum(range(30))
+
+    statements = count_statements(
+        app, lambda: client.get(f"/dashboard?sort=responses&after={first['next_cursor']}")
+    )
+    assert len(statements) == 2
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+import pytest
+
+from app import db
+from app.export_jobs import POINTER_GRACE_SECONDS, QUEUED_STALE_AFTER_SECONDS, export_jobs
+
+
+class HeldPool:
+    """Stands in for the worker pool: records submitted jobs instead of running them."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+
+@pytest.fixture
+def pool(app, monkeypatch):
+    held = HeldPool()
+    monkeypatch.setattr(export_jobs, "_pool", lambda: held)
+    return held
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Exported", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Comments", qtype="short", survey_id=survey.id))
+        db.session.commit()
+        return survey.id
+
+
+def age(job_id, seconds):
+    path = export_jobs._job_path(job_id)
+    with open(path, encoding="utf-8") as f:
+        job = json.load(f)
+    job["updated_at"] -= seconds
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+
+
+def test_a_queued_job_nobody_started_goes_stale(app, owner, survey_id, pool):
+    with app.app_context():
+        job = export_jobs.submit(survey_id, owner)
+        assert export_jobs.submit(survey_id, owner)["id"] == job["id"]
+
+        age(job["id"], QUEUED_STALE_AFTER_SECONDS + 1)
+        assert export_jobs.get(job["id"])["state"] == "failed"
+
+        # It no longer dedupes new requests, and its worker won't pick it up late
+        again = export_jobs.submit(survey_id, owner)
+        assert again["id"] != job["id"]
+        export_jobs._run(job["id"])
+        assert export_jobs.get(job["id"])["rows_done"] == 0
+
+
+def test_a_fresh_claim_is_not_released_before_its_job_is_readable(app, owner, survey_id, pool):
+    with app.app_context():
+        os.makedirs(export_jobs.root, exist_ok=True)
+        pointer = export_jobs._pointer_path(survey_id)
+        with open(pointer, "w") as f:
+            f.write("0123456789abcdef")  # another request's job, not on disk yet
+        assert export_jobs._active_for_survey(survey_id) is None
+        assert os.path.exists(pointer)
+
+        # Once the grace period has passed the claim is presumed abandoned
+        claimed_at = time.time() - POINTER_GRACE_SECONDS - 1
+        os.utime(pointer, (claimed_at, claimed_at))
+        job = export_jobs.submit(survey_id, owner)
+        with open(pointer) as f:
+            assert f.read() == job["id"]
+
+
+def test_the_job_is_written_before_the_survey_is_claimed(app, owner, survey_id, pool, monkeypatch):
+    real_open = os.open
+    queued_at_claim = []
+
+    def watching_open(path, *args):
+        if path == export_jobs._pointer_path(survey_id):
+            queued_at_claim.extend(j["id"] for j in export_jobs._jobs() if j["state"] == "queued")
+        return real_open(path, *args)
+
+    monkeypatch.setattr(os, "open", watching_open)
+    with app.app_context():
+        job = export_jobs.submit(survey_id, owner)
+    assert queued_at_claim == [job["id"]]
+
+
+@pytest.mark.parametrize("store", [True, False])
+def test_progress_counts_responses_not_lines(app, owner, survey_id, pool, store):
+    from app.export_store import export_store
+    from app.response_codec import definition_for
+
+    app.config.update(EXPORT_STORE_ENABLED=store, EXPORT_STORE_LAG_SECONDS=0, EXPORT_BATCH_SIZE=2)
+    export_store.init_app(app)
+    with app.app_context():
+        question_id = definition_for(survey_id).questions[0].id
+    client = app.test_client()
+    for i in range(5):
+        client.post(f"/survey/{survey_id}/submit", data={f"question_{question_id}": f"line one\nline two\n{i}"})
+
+    with app.app_context():
+        job = export_jobs.submit(survey_id, owner)
+        export_jobs._run(job["id"])
+        job = export_jobs.get(job["id"])
+    assert (job["state"], job["rows_done"], job["rows_total"]) == ("finished", 5, 5)
@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, update
+
+from app import db
+from app.export_store import export_store
+from app.response_codec import definition_for
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Exported", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Comments", qtype="short", survey_id=survey.id))
+        db.session.commit()
+        return survey.id
+
+
+def add_response(survey_id, response_id, age_seconds):
+    from app.models.survey import SurveyResponse
+
+    db.session.execute(insert(SurveyResponse.__table__).values(
+        id=response_id, survey_id=survey_id, respondent_ip="10.0.0.1",
+        created_at=datetime.utcnow() - timedelta(seconds=age_seconds), responses={},
+    ))
+    db.session.commit()
+
+
+def exported_ids(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return sorted(int(row[0]) for row in list(csv.reader(io.StringIO(f.read())))[1:])
+
+
+def test_a_lower_id_committed_late_is_not_skipped(app, survey_id):
+    from app.models.survey import SurveyResponse
+
+    app.config["EXPORT_STORE_LAG_SECONDS"] = 5
+    export_store.init_app(app)
+    with app.app_context():
+        compiled = definition_for(survey_id)
+        # Response 2 is still uncommitted while 3 (just submitted) is visible
+        add_response(survey_id, 1, 60)
+        add_response(survey_id, 3, 0)
+        path, meta = export_store.get(compiled)
+        assert exported_ids(path) == [1]
+        assert meta["high_water_id"] == 1
+
+        # 2 commits; by the next download both have settled
+        add_response(survey_id, 2, 60)
+        db.session.execute(update(SurveyResponse).where(SurveyResponse.id == 3)
+                           .values(created_at=datetime.utcnow() - timedelta(seconds=60)))
+        db.session.commit()
+        path, meta = export_store.get(compiled)
+        assert exported_ids(path) == [1, 2, 3]
+        assert (meta["high_water_id"], meta["rows"]) == (3, 3)
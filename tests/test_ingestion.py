@@ -0,0 +1,51 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.ingestion import ingestor
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Survey
+
+    with app.app_context():
+        survey = Survey(title="Spooled", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.commit()
+        return survey.id
+
+
+def write_spool(path, survey_id, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(count):
+            f.write(json.dumps({"survey_id": survey_id, "respondent_ip": "10.0.0.1", "respondent_info": "test",
+                                "created_at": datetime.utcnow().isoformat(), "responses": {}}) + "\n")
+
+
+def test_replay_files_left_by_dead_processes_are_taken_over(app, survey_id):
+    from app.models.survey import SurveyResponse
+
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    prefix = ingestor.spool_path
+    write_spool(f"{prefix}.{dead.pid}.replay", survey_id, 2)  # crashed mid-replay
+    write_spool(f"{prefix}.{os.getpid()}.replay", survey_id, 1)  # this process's previous flusher
+    write_spool(f"{prefix}.{os.getppid()}.replay", survey_id, 4)  # a live process's, in progress
+    write_spool(prefix, survey_id, 3)
+
+    ingestor._replay_spool(leftovers=True)
+    with app.app_context():
+        assert SurveyResponse.query.count() == 6
+    assert glob.glob(f"{prefix}*") == [f"{prefix}.{os.getppid()}.replay"]
+
+    # Nothing spooled is a quiet no-op
+    os.remove(f"{prefix}.{os.getppid()}.replay")
+    ingestor._replay_spool(leftovers=True)
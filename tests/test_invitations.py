@@ -0,0 +1,143 @@
+import csv
+import io
+import re
+import time
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.invitations import invitation_sender, parse_recipients
+from app.response_codec import definition_for
+
+
+@pytest.fixture
+def app(make_app, monkeypatch):
+    monkeypatch.setenv("SURVEYZIM_EMAIL", "invites@surveyzim.example")  # read into MAIL_USERNAME
+    return make_app()
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Customer check-in", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="How was your visit?", qtype="short", survey_id=survey.id))
+        db.session.commit()
+        return survey.id
+
+
+def recipient_csv(count):
+    """A header, `count` valid recipients, plus a duplicate and two unusable rows."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Name", "Email"])
+    for i in range(count):
+        writer.writerow([f"Person {i}", f"person{i}@example.com"])
+    writer.writerow(["Again", "PERSON0@example.com"])
+    writer.writerow(["Nobody", "not-an-address"])
+    writer.writerow(["", ""])
+    return out.getvalue().encode("utf-8")
+
+
+def test_parse_recipients_with_and_without_a_header():
+    assert list(parse_recipients([["E-mail", "Full name"], ["a@x.org", "Ann"], ["bad", "B"]])) == [
+        ("a@x.org", "Ann"), None]
+    assert list(parse_recipients([["b@x.org"], ["C@X.org", "Cy"]])) == [("b@x.org", None), ("c@x.org", "Cy")]
+
+
+def test_50k_recipients_upload_at_once_and_import_in_the_background(app, client, survey_id):
+    from app.models.invitation import Invitation, InvitationBatch
+
+    started = time.perf_counter()
+    response = client.post(f"/survey/{survey_id}/invitations", data={
+        "recipients": (io.BytesIO(recipient_csv(50_000)), "list.csv"),
+    }, content_type="multipart/form-data")
+    upload_seconds = time.perf_counter() - started
+    assert response.status_code == 302
+    assert upload_seconds < 5  # the request only spools the file
+
+    with app.app_context():
+        [batch] = InvitationBatch.query.all()
+        assert batch.status == "uploaded"
+        assert Invitation.query.count() == 0
+
+        assert invitation_sender.import_next() == batch.id
+        db.session.expire_all()
+        batch = db.session.get(InvitationBatch, batch.id)
+        assert (batch.status, batch.imported, batch.skipped) == ("sending", 50_000, 2)
+        tokens = [token for (token,) in db.session.query(Invitation.token)]
+        assert len(set(tokens)) == 50_000
+
+
+def test_sending_is_chunked_rate_limited_and_personalized(app, client, survey_id, monkeypatch):
+    from app.models.invitation import Invitation, InvitationBatch
+    from app.models.mail import OutboxMessage
+
+    monkeypatch.setattr(invitation_sender, "chunk_size", 50)
+    monkeypatch.setattr(invitation_sender, "rate_per_minute", 600)
+    client.post(f"/survey/{survey_id}/invitations", data={
+        "recipients": (io.BytesIO(recipient_csv(120)), "list.csv"),
+    }, content_type="multipart/form-data")
+
+    with app.app_context():
+        invitation_sender.import_next()
+        before = datetime.utcnow()
+        assert invitation_sender.send_next() == 0
+        assert OutboxMessage.query.count() == 50
+        wait = invitation_sender.send_next()
+        assert 4 <= wait <= 5  # 50 messages at 600 a minute
+        assert OutboxMessage.query.count() == 50
+
+        batch = InvitationBatch.query.one()
+        assert (batch.next_send_at - before).total_seconds() == pytest.approx(5, abs=1)
+
+        invitation = Invitation.query.filter_by(email="person7@example.com").one()
+        assert invitation.status == "queued"
+        [row] = [row for row in OutboxMessage.query.all() if row.recipients == ["person7@example.com"]]
+        body = row.message.decode("utf-8", "replace")
+        assert f"/i/{invitation.token}" in body
+        assert "Person 7" in body
+        assert not re.search(r"[0-9a-f]{16}[nt]\b", body)  # no marker left unreplaced
+        token = invitation.token
+
+    # The link, the open pixel and a submission are all attributed to the token
+    respondent = app.test_client()
+    assert respondent.get(f"/i/{token}/open.gif").status_code == 200
+    assert respondent.get(f"/i/{token}").status_code == 302
+    with app.app_context():
+        question_id = definition_for(survey_id).questions[0].id
+    respondent.post(f"/survey/{survey_id}/submit", data={f"question_{question_id}": "Lovely"})
+    with app.app_context():
+        invitation = Invitation.query.filter_by(token=token).one()
+        assert invitation.opened_at and invitation.clicked_at and invitation.completed_at
+
+
+def test_a_bad_subject_fails_its_own_batch_only(app, client, survey_id):
+    from app.models.invitation import InvitationBatch
+    from app.models.mail import OutboxMessage
+
+    for list_name, subject in (("first", "Hello\r\nBcc: everyone@example.com"), ("second", "")):
+        recipients = "".join(f"{list_name}{i}@example.com\n" for i in range(3)).encode()
+        client.post(f"/survey/{survey_id}/invitations", data={
+            "recipients": (io.BytesIO(recipients), "list.csv"), "subject": subject,
+        }, content_type="multipart/form-data")
+
+    with app.app_context():
+        first, second = InvitationBatch.query.order_by(InvitationBatch.id).all()
+        assert first.subject == "Hello Bcc: everyone@example.com"
+        # One that got in before subjects were cleaned up
+        first.subject = "Hello\nBcc: everyone@example.com"
+        db.session.commit()
+        invitation_sender.import_next()
+        invitation_sender.import_next()
+
+        assert invitation_sender.send_next() == 0
+        assert db.session.get(InvitationBatch, first.id).status == "failed"
+        assert OutboxMessage.query.count() == 0
+        invitation_sender.send_next()
+        assert OutboxMessage.query.count() == 3
@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app import db
+from app.logos import logo_pipeline
+
+
+@pytest.fixture
+def legacy(app, owner, tmp_path, monkeypatch):
+    """Two surveys with pre-pipeline logos in a stand-in static/survey_logos, plus an orphaned file."""
+    from app.models.survey import Survey
+
+    root = tmp_path / "survey_logos"
+    root.mkdir()
+    monkeypatch.setattr(logo_pipeline, "legacy_root", str(root))
+    ids = []
+    with app.app_context():
+        for name, size in (("first.png", (900, 300)), ("second.jpg", (200, 200))):
+            Image.new("RGB", size, (200, 30, 30)).save(root / name)
+            survey = Survey(title=name, user_id=owner, logo_filename=name)
+            survey.generate_slug()
+            db.session.add(survey)
+            db.session.flush()
+            ids.append(survey.id)
+        db.session.commit()
+    Image.new("RGB", (50, 50)).save(root / "orphan.png")
+    return root, ids
+
+
+def age(directory, seconds):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            os.utime(path, (time.time() - seconds,) * 2)
+
+
+def test_gc_never_touches_the_legacy_directory(app, legacy):
+    root, _ = legacy
+    age(root, 10 * 24 * 3600)
+    with app.app_context():
+        assert logo_pipeline.collect_garbage() == 0
+    assert sorted(os.listdir(root)) == ["first.png", "orphan.png", "second.jpg"]
+
+
+def test_reprocess_then_prune_legacy(app, legacy):
+    from app.models.survey import Survey
+
+    root, (first, second) = legacy
+    runner = app.test_cli_runner()
+    with app.app_context():
+        # `second` is left out of the reprocess: it keeps pointing at its original
+        db.session.get(Survey, second).logo_filename = None
+        db.session.commit()
+        result = runner.invoke(args=["logos", "reprocess"])
+        assert result.exit_code == 0, result.output
+        db.session.get(Survey, second).logo_filename = "second.jpg"
+        db.session.commit()
+
+        variants = db.session.get(Survey, first).logo_variants
+        assert variants["widths"] == [160, 320, 640]  # no full-width copy above the largest size
+        for width in variants["widths"]:
+            for ext in ("webp", "jpg"):
+                assert os.path.isfile(os.path.join(logo_pipeline.root, f"{variants['key']}-{width}.{ext}"))
+        assert sorted(os.listdir(root)) == ["first.png", "orphan.png", "second.jpg"]
+
+        result = runner.invoke(args=["logos", "prune-legacy", "--dry-run"])
+        assert result.output.splitlines() == ["first.png", "orphan.png", "2 file(s) would be removed"]
+        assert len(os.listdir(root)) == 3
+
+        result = runner.invoke(args=["logos", "prune-legacy"])
+        assert result.exit_code == 0, result.output
+    assert os.listdir(root) == ["second.jpg"]
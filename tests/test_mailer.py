@@ -0,0 +1,209 @@
+import os
+import re
+import socketserver
+import threading
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.emails import email_renderer
+from app.mailer import SMTPConnection, mail_dispatcher
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Just enough of an SMTP server: records each session's messages and answers DATA with `data_reply`."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStubHandler)
+        self.data_reply = "250 2.0.0 Ok: queued"
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    @property
+    def messages(self):
+        with self.lock:
+            return [message for session in self.sessions for message in session]
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        received = []
+        with self.server.lock:
+            self.server.sessions.append(received)
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 Ok")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    lines.append(data)
+                self.reply(self.server.data_reply)
+                if self.server.data_reply.startswith("250"):
+                    with self.server.lock:
+                        received.append(b"".join(lines))
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+@pytest.fixture
+def smtp():
+    server = SMTPStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def mail_app(request, make_app):
+    """The app on SQLite, and on PostgreSQL (where claims use SKIP LOCKED) when TEST_POSTGRES_URL is set."""
+    config = {"MAIL_SUPPRESS_SEND": False, "MAIL_RETRY_BASE_SECONDS": 30, "MAIL_MAX_ATTEMPTS": 3}
+    if request.param == "postgresql":
+        if not os.environ.get("TEST_POSTGRES_URL"):
+            pytest.skip("set TEST_POSTGRES_URL to run against PostgreSQL")
+        config["SQLALCHEMY_DATABASE_URI"] = os.environ["TEST_POSTGRES_URL"]
+    app = make_app(**config)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        if request.param == "postgresql":
+            db.drop_all()
+
+
+def connection_to(smtp):
+    host, port = smtp.server_address
+    settings = dict(mail_dispatcher.settings, server=host, port=port, use_tls=False, use_ssl=False,
+                    username=None, password=None, timeout=5)
+    return SMTPConnection(settings)
+
+
+def queue(count, subject="Hello"):
+    return mail_dispatcher.enqueue_many([
+        email_renderer.build(f"{subject} {i}", "sender@example.com", [f"user{i}@example.com"], f"<p>Message {i}</p>")
+        for i in range(count)
+    ])
+
+
+def outbox(message_id):
+    from app.models.mail import OutboxMessage
+
+    db.session.expire_all()
+    return db.session.get(OutboxMessage, message_id)
+
+
+def test_outbox_messages_are_sent_over_one_session(mail_app, smtp):
+    ids = queue(3)
+    connection = connection_to(smtp)
+    try:
+        assert mail_dispatcher.deliver_due(connection) == 3
+    finally:
+        connection.close()
+
+    assert len(smtp.sessions) == 1
+    assert [re.search(rb"Subject: (.*)\r\n", m).group(1) for m in smtp.messages] == [b"Hello 0", b"Hello 1", b"Hello 2"]
+    for message_id in ids:
+        row = outbox(message_id)
+        assert row.status == "sent"
+        assert row.sent_at is not None
+        assert row.message == b""  # the envelope stays, the bytes go
+    assert mail_dispatcher.counts() == {"sent": 3}
+
+
+def test_temporary_failure_is_retried_with_backoff(mail_app, smtp):
+    [message_id] = queue(1)
+    smtp.data_reply = "451 4.3.0 Try again later"
+    before = datetime.utcnow()
+    assert mail_dispatcher.deliver_due(connection_to(smtp)) == 1
+
+    row = outbox(message_id)
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert "451" in row.last_error
+    delay = (row.next_attempt_at - before).total_seconds()
+    assert 30 * 0.8 - 1 <= delay <= 30 * 1.2 + 1  # MAIL_RETRY_BASE_SECONDS with jitter
+    assert mail_dispatcher.deliver_due(connection_to(smtp)) == 0  # not due yet
+
+    # Once due, the next attempt goes through
+    smtp.data_reply = "250 Ok"
+    row.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    assert mail_dispatcher.deliver_due(connection_to(smtp)) == 1
+    row = outbox(message_id)
+    assert (row.status, row.attempts) == ("sent", 2)
+    assert len(smtp.messages) == 1
+
+
+def test_permanent_failure_marks_the_message_failed(mail_app, smtp):
+    [message_id] = queue(1)
+    smtp.data_reply = "550 5.1.1 No such user"
+    assert mail_dispatcher.deliver_due(connection_to(smtp)) == 1
+
+    row = outbox(message_id)
+    assert row.status == "failed"
+    assert row.attempts == 1
+    assert "550" in row.last_error
+    assert mail_dispatcher.deliver_due(connection_to(smtp)) == 0
+    assert smtp.messages == []
+
+
+def test_concurrent_workers_never_send_a_message_twice(mail_app, smtp, monkeypatch):
+    # On PostgreSQL the claim query runs FOR UPDATE SKIP LOCKED; SQLite has no
+    # row locks, so there this exercises the claim lock and the lease
+    ids = queue(40)
+    monkeypatch.setattr(mail_dispatcher, "batch_size", 3)
+    errors = []
+
+    def worker():
+        with mail_app.app_context():
+            connection = connection_to(smtp)
+            try:
+                while mail_dispatcher.deliver_due(connection):
+                    pass
+            except Exception as e:  # surfaced below; a thread can't fail the test itself
+                errors.append(e)
+            finally:
+                connection.close()
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    subjects = sorted(re.search(rb"Subject: (.*)\r\n", m).group(1) for m in smtp.messages)
+    assert subjects == sorted(f"Hello {i}".encode() for i in range(40))
+    assert all(outbox(message_id).attempts == 1 for message_id in ids)
+    assert len(smtp.sessions) > 1  # the work really was shared
+
+
+def test_claimed_rows_are_leased(mail_app):
+    queue(4)
+    first = mail_dispatcher._claim(2)
+    second = mail_dispatcher._claim(10)
+    assert len(first) == 2 and len(second) == 2
+    assert not {row[0] for row in first} & {row[0] for row in second}
+    assert mail_dispatcher._claim(10) == []
@@ -0,0 +1,32 @@
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def slug(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Shared page", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Anything to add?", qtype="paragraph", survey_id=survey.id))
+        db.session.commit()
+        return survey.slug
+
+
+def test_cookieless_visitors_share_one_page(app, client, slug):
+    anonymous = app.test_client()
+    for _ in range(2):  # rendered on the miss, served from the cache after
+        response = anonymous.get(f"/survey/{slug}/take")
+        assert response.status_code == 200
+        assert response.cache_control.public
+        assert "Cookie" not in response.vary
+        assert "Set-Cookie" not in response.headers
+    assert "Logout" not in response.get_data(as_text=True)
+
+    # Anyone with a session cookie gets a page of their own
+    response = client.get(f"/survey/{slug}/take")
+    assert response.cache_control.private and not response.cache_control.public
@@ -0,0 +1,43 @@
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def draft(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Draft", user_id=owner, created_with_package="basic")
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Anything to add?", qtype="paragraph", survey_id=survey.id))
+        db.session.commit()
+        return survey.id
+
+
+def published_state(app, survey_id):
+    from app.models.mail import OutboxMessage
+    from app.models.survey import Survey
+
+    with app.app_context():
+        return (db.session.get(Survey, survey_id).published,
+                sorted(recipient for row in OutboxMessage.query.all() for recipient in row.recipients))
+
+
+def test_publishing_queues_the_admin_and_owner_emails(app, client, draft, monkeypatch):
+    monkeypatch.setenv("SURVEYZIM_EMAIL", "hello@surveyzim.example")
+    response = client.post(f"/survey/{draft}/publish")
+    assert response.status_code == 302
+
+    assert published_state(app, draft) == (True, ["hello@surveyzim.example", "owner@example.com"])
+
+
+def test_publishing_without_a_sender_skips_the_emails(app, client, draft, monkeypatch, caplog):
+    monkeypatch.delenv("SURVEYZIM_EMAIL", raising=False)
+    response = client.post(f"/survey/{draft}/publish")
+    assert response.status_code == 302
+
+    assert published_state(app, draft) == (True, [])
+    assert "SURVEYZIM_EMAIL is not set" in caplog.text
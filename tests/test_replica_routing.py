@@ -0,0 +1,119 @@
+import shutil
+import sqlite3
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import event, select, update
+
+from app import db
+from app.database import REPLICA, replica_reads
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    """An app whose replica is a copy of the primary, with the survey renamed so reads show their source."""
+    app = make_app(DATABASE_REPLICA_URL=f"sqlite:///{tmp_path / 'replica.db'}")
+    from app.models.survey import Question, Survey
+    from app.models.user import User
+
+    with app.app_context():
+        user = User(username="owner", email="owner@example.com", payment_status="basic",
+                    word_limit=1500, plan_name="Basic")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.flush()
+        survey = Survey(title="Primary title", user_id=user.id, published=True, slug="t", max_responses=100)
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Why?", qtype="short", survey_id=survey.id))
+        db.session.commit()
+        survey_id = survey.id
+        db.engines[None].dispose()
+        db.engines[REPLICA].dispose()
+
+    shutil.copy(tmp_path / "primary.db", tmp_path / "replica.db")
+    with sqlite3.connect(tmp_path / "replica.db") as connection:
+        connection.execute("UPDATE survey SET title = 'Replica title'")
+
+    client = app.test_client()
+    client.post("/login", data={"email": "owner@example.com", "password": "password"})
+    return app, client, survey_id
+
+
+@pytest.fixture
+def statements(replicated):
+    """{"primary" | "replica": [statement, ...]} for everything executed while the test runs."""
+    app = replicated[0]
+    seen = defaultdict(list)
+    with app.app_context():
+        engines = {"primary": db.engines[None], "replica": db.engines[REPLICA]}
+    listeners = []
+    for name, engine in engines.items():
+        def before(conn, cursor, statement, parameters, context, executemany, name=name):
+            seen[name].append(statement)
+        event.listen(engine, "before_cursor_execute", before)
+        listeners.append((engine, before))
+    yield seen
+    for engine, before in listeners:
+        event.remove(engine, "before_cursor_execute", before)
+
+
+def test_replica_reads_views_select_from_the_replica(replicated, statements):
+    app, client, survey_id = replicated
+    anonymous = app.test_client()
+
+    html = anonymous.get("/survey/t/take").get_data(as_text=True)
+    assert "Replica title" in html
+    assert statements["replica"] and all(s.lstrip().startswith("SELECT") for s in statements["replica"])
+    assert statements["primary"] == []
+
+    statements.clear()
+    assert client.get(f"/survey/{survey_id}/analytics?exact=1").status_code == 200
+    assert any("FROM answer" in s for s in statements["replica"])
+
+
+def test_writes_and_locking_reads_go_to_the_primary(replicated, statements):
+    app, _, survey_id = replicated
+    from app.models.survey import Survey
+
+    @replica_reads
+    def work():
+        locked = db.session.execute(select(Survey.title).where(Survey.id == survey_id).with_for_update()).scalar()
+        assert locked == "Primary title"
+        db.session.rollback()
+        db.session.execute(update(Survey).where(Survey.id == survey_id).values(description="changed"))
+        db.session.commit()
+
+    with app.test_request_context():
+        work()
+    assert any(s.startswith("UPDATE survey") for s in statements["primary"])
+    assert len(statements["primary"]) == 2
+    assert statements["replica"] == []
+
+
+def test_reads_after_a_write_stay_on_the_primary(replicated, statements):
+    app, _, survey_id = replicated
+    from app.models.survey import Survey
+
+    @replica_reads
+    def work():
+        before = db.session.execute(select(Survey.title).where(Survey.id == survey_id)).scalar()
+        db.session.execute(update(Survey).where(Survey.id == survey_id).values(description="changed"))
+        after = db.session.execute(select(Survey.description).where(Survey.id == survey_id)).scalar()
+        return before, after
+
+    with app.test_request_context():
+        assert work() == ("Replica title", "changed")  # read its own write
+        db.session.rollback()
+    assert len(statements["replica"]) == 1
+    assert [s.split()[0] for s in statements["primary"]] == ["UPDATE", "SELECT"]
+
+
+def test_undecorated_views_never_touch_the_replica(replicated, statements):
+    _, client, survey_id = replicated
+
+    assert "Primary title" in client.get(f"/survey/{survey_id}").get_data(as_text=True)
+    assert client.get("/dashboard").status_code == 200
+    assert client.get("/question/1/json").status_code == 200
+    assert statements["primary"]
+    assert statements["replica"] == []
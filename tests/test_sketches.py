@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+
+from app import db, sketches
+from app.response_codec import definition_for
+from app.tallies import tally_summary
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Question, Survey
+
+    with app.app_context():
+        survey = Survey(title="Feedback", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        db.session.add(Question(text="Anything else?", qtype="paragraph", survey_id=survey.id))
+        db.session.commit()
+        survey_id = survey.id
+
+    client = app.test_client()
+    with app.app_context():
+        question_id = definition_for(survey_id).questions[0].id
+    for text in ("Great service", "Slow service", "Great value"):
+        client.post(f"/survey/{survey_id}/submit", data={f"question_{question_id}": text})
+    return survey_id
+
+
+@pytest.mark.parametrize("mode", ["exact", "approximate"])
+def test_annotate_only_reads(app, survey_id, mode):
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        compiled = definition_for(survey_id)
+        summary = tally_summary(compiled)
+        event.listen(db.engine, "before_cursor_execute", before)
+        try:
+            sketches.annotate(summary, compiled, mode)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before)
+
+    assert statements and all(s.lstrip().upper().startswith("SELECT") for s in statements), statements
+    assert summary["mode"] == mode
+    assert "unique_respondents" in summary  # approximate figures wait for the sketch flush
+
+
+def test_observations_accumulate_without_the_flush_thread(monkeypatch):
+    buffer = sketches.SketchBuffer()  # SKETCH_FLUSH_SECONDS 0: flushed at exit or by the CLI only
+    buffer.observe([(1, "10.0.0.1", "a")])
+    buffer.observe([(1, "10.0.0.2", "b")])
+    assert buffer._deltas[(1, sketches.RESPONDENTS)].estimate() == pytest.approx(2, abs=0.5)
+
+    # A forked child starts from nothing
+    monkeypatch.setattr(sketches.os, "getpid", lambda: -1)
+    buffer.observe([(1, "10.0.0.3", "c")])
+    assert buffer._deltas[(1, sketches.RESPONDENTS)].estimate() == pytest.approx(1, abs=0.5)
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+from sqlalchemy import func, select
+
+from app import db
+from app.analytics import survey_analytics
+from app.response_codec import definition_for
+from app.tallies import rebuild_survey, tally_summary
+
+
+@pytest.fixture
+def survey_id(app, owner):
+    from app.models.survey import Question, QuestionOption, Survey
+
+    with app.app_context():
+        survey = Survey(title="Tallied", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        choice = Question(text="Pick one", qtype="multiple_choice", survey_id=survey.id)
+        choice.options = [QuestionOption(text=text) for text in ("Red", "Green", "Blue")]
+        boxes = Question(text="Pick any", qtype="checkbox", survey_id=survey.id)
+        boxes.options = [QuestionOption(text=text) for text in ("Tea", "Coffee")]
+        scale = Question(text="Rate it", qtype="linear_scale", survey_id=survey.id,
+                         linear_scale_low=1, linear_scale_high=5)
+        db.session.add_all([choice, boxes, scale])
+        db.session.commit()
+        return survey.id
+
+
+def submit_many(app, survey_id, count):
+    client = app.test_client()
+    with app.app_context():
+        questions = definition_for(survey_id).questions
+    rng = random.Random(7)
+    for _ in range(count):
+        choice, boxes, scale = questions
+        data = {
+            f"question_{choice.id}": rng.choice(["Red", "Green", "Blue"]),
+            f"question_{boxes.id}": rng.sample(["Tea", "Coffee"], rng.randint(0, 2)),
+            f"question_{scale.id}": str(rng.randint(1, 5)),
+        }
+        assert client.post(f"/survey/{survey_id}/submit", data=data).status_code == 302
+
+
+def without_combinations(summary):
+    # The tallies don't know which options were picked together
+    return [{k: v for k, v in q.items() if k != "selections_per_respondent"} for q in summary["questions"]]
+
+
+def test_submits_spread_over_shards_and_reads_sum_them(app, survey_id):
+    from app.models.survey import AnswerTally, QuestionTally
+
+    app.config["TALLY_SHARDS"] = 4
+    submit_many(app, survey_id, 40)
+
+    with app.app_context():
+        shards = db.session.execute(
+            select(func.count(func.distinct(QuestionTally.shard))).where(QuestionTally.survey_id == survey_id)
+        ).scalar()
+        assert shards > 1
+        assert db.session.execute(select(func.max(AnswerTally.shard))).scalar() < 4
+
+        compiled = definition_for(survey_id)
+        tallied, exact = tally_summary(compiled), survey_analytics(compiled)
+        assert tallied["responses"] == 40
+        assert without_combinations(tallied) == without_combinations(exact)
+        assert rebuild_survey(survey_id, check_only=True) == 0
+
+
+def test_rebuild_folds_shards_into_one_row(app, survey_id):
+    from app.models.survey import QuestionTally
+
+    app.config["TALLY_SHARDS"] = 4
+    submit_many(app, survey_id, 20)
+
+    with app.app_context():
+        compiled = definition_for(survey_id)
+        before = tally_summary(compiled)
+        db.session.execute(
+            QuestionTally.__table__.update().where(QuestionTally.survey_id == survey_id)
+            .values(answered=QuestionTally.answered + 1)
+        )
+        db.session.commit()
+        assert rebuild_survey(survey_id) > 0
+
+        assert set(db.session.execute(select(QuestionTally.shard)).scalars()) == {0}
+        assert tally_summary(compiled) == before
@@ -0,0 +1,110 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app import db, text_index
+from app.text_index import decode_postings, encode_postings, tokenize
+
+CORPUS_SIZE = 100_000
+
+
+def test_postings_round_trip_small_and_large_gaps():
+    pairs = [(1, 1), (2, 3), (130, 1), (131, 200), (1_000_000, 2)]
+    blob = encode_postings(pairs)
+    assert decode_postings(blob) == dict(pairs)
+    assert len(encode_postings([(i, 1) for i in range(1, 101)])) == 200  # one byte per gap and per tf
+
+    # Appending continues the delta chain from the last id
+    head, tail = pairs[:2], pairs[2:]
+    assert decode_postings(encode_postings(head) + encode_postings(tail, head[-1][0])) == dict(pairs)
+
+
+def test_tokenize_drops_stopwords_and_single_letters():
+    assert tokenize("The staff were GREAT, and it's a 10/10 place!") == ["staff", "great", "it's", "10", "10", "place"]
+
+
+@pytest.fixture
+def corpus(app, owner):
+    """A paragraph question with CORPUS_SIZE answers drawn from a skewed vocabulary, loaded in bulk."""
+    from app.models.survey import Answer, Question, Survey, SurveyResponse
+
+    rng = random.Random(2026)
+    vocabulary = [f"word{i:03}" for i in range(400)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    filler = ["the", "and", "was", "a", "it"]
+    texts = []
+    for _ in range(CORPUS_SIZE):
+        words = rng.choices(vocabulary, weights, k=rng.randint(3, 12)) + rng.sample(filler, 2)
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+
+    with app.app_context():
+        survey = Survey(title="Open feedback", user_id=owner, published=True)
+        survey.generate_slug()
+        db.session.add(survey)
+        db.session.flush()
+        question = Question(text="Tell us more", qtype="paragraph", survey_id=survey.id)
+        db.session.add(question)
+        db.session.commit()
+        survey_id, question_id = survey.id, question.id
+
+        created = datetime.utcnow() - timedelta(hours=1)
+        db.session.execute(insert(SurveyResponse.__table__), [
+            {"id": i, "survey_id": survey_id, "created_at": created, "responses": {}}
+            for i in range(1, CORPUS_SIZE + 1)
+        ])
+        db.session.execute(insert(Answer.__table__), [
+            {"response_id": i, "survey_id": survey_id, "question_id": question_id, "text_value": text}
+            for i, text in enumerate(texts, start=1)
+        ])
+        db.session.commit()
+    return survey_id, question_id, texts
+
+
+def test_index_over_a_100k_answer_corpus(app, corpus):
+    from app.models.survey import TextIndexState, TextIndexTerm
+
+    survey_id, question_id, texts = corpus
+    app.config.update(TEXT_INDEX_BATCH_SIZE=25_000, TEXT_INDEX_LAG_SECONDS=0)
+    documents = [Counter(tokenize(text)) for text in texts]
+    doc_counts = Counter(term for document in documents for term in document)
+
+    with app.app_context():
+        # Incremental: two batches now, the remaining two on the next pass
+        started = time.perf_counter()
+        assert text_index.refresh(survey_id, max_batches=2) == 50_000
+        assert db.session.get(TextIndexState, survey_id).indexed_through == 50_000
+        assert text_index.refresh(survey_id) == 50_000
+        elapsed = time.perf_counter() - started
+        assert text_index.refresh(survey_id) == 0
+
+        # Top terms match a brute-force count
+        expected = sorted(doc_counts.items(), key=lambda item: (-item[1], item[0]))[:10]
+        assert [(row["term"], row["responses"]) for row in text_index.top_terms(question_id, 10)] == expected
+        assert "the" not in doc_counts
+
+        # Drill-down and multi-term search return exactly the matching responses, best first
+        for query in ("word007", "word003 word150", "word399 word398 word001"):
+            terms = tokenize(query)
+            matching = {i for i, document in enumerate(documents, start=1) if all(t in document for t in terms)}
+            result = text_index.search(question_id, query, per_page=len(matching) or 1)
+            assert result["total"] == len(matching)
+            assert {row["response_id"] for row in result["results"]} == matching
+            scores = [row["score"] for row in result["results"]]
+            assert scores == sorted(scores, reverse=True)
+            assert all(all(t in tokenize(row["text"]) for t in terms) for row in result["results"])
+        assert text_index.search(question_id, "word007 nosuchterm")["total"] == 0
+
+        # Compact storage: gaps and term frequencies mostly fit a byte each
+        postings, blob_bytes = db.session.execute(
+            select(func.sum(TextIndexTerm.doc_count), func.sum(func.length(TextIndexTerm.postings)))
+            .where(TextIndexTerm.question_id == question_id)
+        ).one()
+        assert postings == sum(doc_counts.values())
+        assert blob_bytes / postings < 2.6
+
+    print(f"indexed {CORPUS_SIZE:,} answers in {elapsed:.1f}s; {blob_bytes / postings:.2f} bytes per posting")
@@ -0,0 +1,42 @@
+import threading
+
+from app import workers
+from app.workers import PeriodicWorker
+
+
+class Ticker(PeriodicWorker):
+    thread_name = "test-ticker"
+
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self.ticked = threading.Event()
+        self.passes = 0
+
+    def tick(self):
+        self.passes += 1
+        self.ticked.set()
+        if self.passes == 1:
+            raise RuntimeError("a failed pass doesn't stop the thread")
+
+
+def test_periodic_worker_starts_once_per_process(monkeypatch):
+    off = Ticker(0)
+    off.ensure_started()
+    assert not off._worker.is_alive()
+
+    ticker = Ticker(0.01)
+    ticker.ensure_started()
+    first = ticker._worker._thread
+    ticker.ensure_started()
+    assert ticker._worker._thread is first
+    assert ticker.ticked.wait(1)
+    ticker.ticked.clear()
+    assert ticker.ticked.wait(1) and first.is_alive()
+
+    # A forked child inherits the object but not the thread
+    monkeypatch.setattr(workers.os, "getpid", lambda: -1)
+    assert not ticker._worker.is_alive()
+    ticker.ensure_started()
+    assert ticker._worker._thread is not first and ticker._worker.is_alive()
+    ticker.interval = 3600  # park both threads for the rest of the run